@@ -0,0 +1,9 @@
+/*
+ *  Calibration program: does nothing, so a run measures only QEMU startup
+ *  and the measurement harness.
+ */
+
+int main(int argc, char *argv[])
+{
+    return 0;
+}
@@ -0,0 +1,18 @@
+/*
+ *  Calibration program: a fixed busy loop of LOOP_ITERATIONS iterations, a
+ *  known workload to check the startup baseline subtraction against.
+ */
+
+#ifndef LOOP_ITERATIONS
+#define LOOP_ITERATIONS     10000000
+#endif
+
+int main(int argc, char *argv[])
+{
+    volatile unsigned long counter = 0;
+
+    for (unsigned long i = 0; i < LOOP_ITERATIONS; i++) {
+        counter++;
+    }
+    return 0;
+}
@@ -27,7 +27,9 @@
 #include <unistd.h>
 
 /* Number of electrons on the surface */
+#ifndef NUMBER_OF_ELECTRONS
 #define NUMBER_OF_ELECTRONS 1000
+#endif
 #define MAX_NUMBER_OF_ELECTRONS 2000000000
 
 /* Define Coulomb constant K, Electron charge Q, and PI */
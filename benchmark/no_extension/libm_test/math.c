@@ -30,7 +30,9 @@
 #include <time.h>
 #include <unistd.h>
 
+#ifndef RANDOM_DATA_LEN
 #define RANDOM_DATA_LEN 100
+#endif
 
 /**
  * Arrays for storing random inputs. For now, only random inputs between
@@ -33,7 +33,9 @@
 /* Length of an individual random string (including terminating zero) */
 #define RANDOM_STRING_LEN             8
 /* Number of elements of the array of random strings */
+#ifndef NUMBER_OF_RANDOM_STRINGS
 #define NUMBER_OF_RANDOM_STRINGS      10000
+#endif
 
 /* Number of repetitions to be performed each with different input */
 #define DEFAULT_REPETITION_COUNT      20
@@ -29,7 +29,9 @@
 #include <unistd.h>
 
 #define MAX_STRING_LENGHT              15
+#ifndef NUMBER_OF_RANDOM_STRINGS
 #define NUMBER_OF_RANDOM_STRINGS       100
+#endif
 #define DEFAULT_NUMBER_OF_REPETITIONS  30000
 #define MAX_NUMBER_OF_REPETITIONS      1000000000
 #define NUMBER_OF_CONTROL_PRINT_ITEMS  5
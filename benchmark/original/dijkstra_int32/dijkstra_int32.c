@@ -32,7 +32,9 @@
 #include <unistd.h>
 
 /* Number of columns and rows in all matrixes*/
+#ifndef DEFAULT_NODE_COUNT
 #define DEFAULT_NODE_COUNT      2000
+#endif
 #define MIN_NODE_COUNT          3
 #define MAX_NODE_COUNT          10000
 
@@ -31,7 +31,9 @@
 #include <unistd.h>
 
 /* Length of a long string to be searched (including terminating zero) */
+#ifndef HAYSTACK_LEN
 #define HAYSTACK_LEN                  30000
+#endif
 
 /* Number of repetitions to be performed each with different input */
 #define DEFAULT_REPETITION_COUNT      100
@@ -0,0 +1,68 @@
+/*
+ *  Calibration program: a fixed busy loop of LOOP_ITERATIONS iterations, a
+ *  known workload to check the startup baseline subtraction against.
+ */
+
+#ifndef LOOP_ITERATIONS
+#define LOOP_ITERATIONS     10000000
+#endif
+
+int mock_main(int argc, char *argv[])
+{
+    volatile unsigned long counter = 0;
+
+    for (unsigned long i = 0; i < LOOP_ITERATIONS; i++) {
+        counter++;
+    }
+    return 0;
+}
+
+int global_argc;
+char** global_argv;
+
+void mock_help() {
+    asm volatile (
+        "addi sp, sp, -16\n\t"  // 分配栈空间
+        "sd ra, 8(sp)\n\t"      // 保存 ra 寄存器的值到栈上
+    );
+    mock_main(global_argc, global_argv);
+    // printf("mock_help_start\n");
+    asm volatile (
+        "ld ra, 8(sp)\n\t"       // 从栈上恢复 ra 寄存器的值
+        "addi sp, sp, 16\n\t"    // 释放栈空间
+        "sjalrr  zero, 0(ra)\n\t"
+    );
+    // printf("mock_help_end\n");
+}
+
+void mock_func() {
+    // printf("mock_func_start\n");
+    asm volatile (
+        "li     t3, 0x7f7f7f7f\n\t"
+        "auipc  t1, 0\n\t"
+        "li     t2, 46\n\t"
+        "sict   t1, t2, t3\n\t"
+
+        "la     t0, mock_help\n\t"
+        "ssja   t0, zero, zero\n\t"
+
+        "auipc  t0, 0\n\t"
+        "li     t1, 22\n\t"
+        "ssra   t0, t1, zero\n\t"
+
+        "la     t3, mock_help\n\t"
+        "sjalrj  ra, 0(t3)\n\t"
+        "sict   zero, zero, zero\n\t"
+
+        "ld ra, 8(sp)\n\t"       // 从栈上恢复 ra 寄存器的值
+        "addi sp, sp, 16\n\t"    // 释放栈空间
+    );
+    // printf("mock_func_end\n");
+}
+
+int main(int argc, char* argv[]) {
+    global_argc = argc;
+    global_argv = argv;
+    mock_func();
+    return 0;
+}
\ No newline at end of file
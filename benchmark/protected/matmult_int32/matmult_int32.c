@@ -28,7 +28,9 @@
 #include <unistd.h>
 
 /* Number of columns and rows in all matrixes*/
+#ifndef DEFAULT_MATRIX_SIZE
 #define DEFAULT_MATRIX_SIZE     200
+#endif
 #define MIN_MATRIX_SIZE         2
 #define MAX_MATRIX_SIZE         200000
 
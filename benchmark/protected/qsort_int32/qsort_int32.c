@@ -28,7 +28,9 @@
 #include <unistd.h>
 
 /* Number of elements in the array to be sorted */
+#ifndef DEFAULT_ARRAY_LEN
 #define DEFAULT_ARRAY_LEN       300000
+#endif
 #define MIN_ARRAY_LEN           3
 #define MAX_ARRAY_LEN           30000000
 
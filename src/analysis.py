@@ -2,13 +2,137 @@ import csv
 import os
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+from robust_stats import *
+
+# The figure methods import rendering (matplotlib and seaborn) when they are called, so the report and the other
+# stages that only need the data do not load them
+
+
+CATEGORICAL_COLUMNS = ["Run ID", "Host", "File Name", "File Type"]
+
+# Host of rows that have none, e.g. the imported CSV history
+UNKNOWN_HOST = "unknown"
+
+
+def shrink(frame):
+    """
+    Converts the key columns of frame to categoricals and downcasts numeric columns to the smallest integer or
+    float type that holds them, in place. Returns frame.
+    """
+    for column in frame.columns:
+        if column in CATEGORICAL_COLUMNS:
+            frame[column] = frame[column].astype("category")
+        elif pd.api.types.is_numeric_dtype(frame[column]):
+            values = frame[column]
+            if len(values) and values.notna().all() and (values % 1 == 0).all():
+                low, high = values.min(), values.max()
+                frame[column] = values.astype(next(dtype for dtype in (np.int8, np.int16, np.int32, np.int64)
+                                                   if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max))
+            else:
+                frame[column] = values.astype(np.float32)
+    return frame
+
+
+def concat_chunks(chunks):
+    """
+    Concatenates shrunk chunks, keeping categorical columns categorical when their categories differ between chunks.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    categorical = {column: pd.api.types.union_categoricals([chunk[column] for chunk in chunks])
+                   for column in chunks[0].columns if isinstance(chunks[0][column].dtype, pd.CategoricalDtype)}
+    frame = pd.concat([chunk.drop(columns=list(categorical)) for chunk in chunks], ignore_index=True)
+    for column, values in categorical.items():
+        frame[column] = pd.Categorical(values)
+    return frame[chunks[0].columns]
+
+
+def _plain_index(data):
+    # Categorical group keys differ between chunks; plain levels let the partial results be added up
+    data.index = data.index.set_levels([level.astype(object) if isinstance(level, pd.CategoricalIndex) else level
+                                        for level in data.index.levels])
+    return data
+
+
+class StreamingAggregate:
+    ZERO_BUCKET = -(2 ** 31)
+
+    def __init__(self, metrics, relative_error=0.001):
+        """
+        Count, mean and quantiles of metrics per (File Name, File Type), accumulated chunk by chunk in memory that
+        does not grow with the number of iterations. Quantiles are nearest-rank values located in logarithmic buckets
+        to within relative_error; unlike pandas they are not interpolated between neighbouring samples.
+        """
+        self.metrics = list(metrics)
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.sums = None
+        self.counts = None
+        self.buckets = {metric: None for metric in self.metrics}
+
+
+    def add(self, chunk):
+        keys = ["File Name", "File Type"]
+        grouped = chunk.groupby(keys, observed=True)[self.metrics]
+        sums = _plain_index(grouped.sum().astype(float))
+        counts = _plain_index(grouped.count())
+        self.sums = sums if self.sums is None else self.sums.add(sums, fill_value=0)
+        self.counts = counts if self.counts is None else self.counts.add(counts, fill_value=0)
+        for metric in self.metrics:
+            values = chunk[metric].to_numpy(dtype=float, na_value=np.nan)
+            valid = ~np.isnan(values)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                buckets = np.where(values > 0, np.ceil(np.log(values) / np.log(self.gamma)), self.ZERO_BUCKET)
+            sizes = chunk.loc[valid, keys].assign(Bucket=buckets[valid].astype(np.int64)).groupby(keys + ["Bucket"], observed=True).size()
+            sizes = _plain_index(sizes)
+            self.buckets[metric] = sizes if self.buckets[metric] is None else self.buckets[metric].add(sizes, fill_value=0)
+
+
+    def quantile(self, metric, q):
+        """
+        Returns the q-quantile of metric per (File Name, File Type).
+        """
+        counts = self.buckets[metric].sort_index()
+        groups = counts.groupby(level=["File Name", "File Type"])
+        cumulative = groups.cumsum()
+        rank = q * (groups.transform("sum") - 1)
+        hits = counts[cumulative > rank].groupby(level=["File Name", "File Type"]).head(1)
+        buckets = hits.index.get_level_values("Bucket").to_numpy(dtype=float)
+        values = np.where(buckets == self.ZERO_BUCKET, 0.0, 2 * self.gamma ** buckets / (self.gamma + 1))
+        return pd.Series(values, index=hits.index.droplevel("Bucket"))
+
+
+    def cube(self):
+        """
+        Returns the same (file name x file type) by (metric x statistic) cube as PerformanceComparison.aggregate().
+        The cube is empty if no chunk was added.
+        """
+        if self.sums is None:
+            index = pd.MultiIndex.from_arrays([[], []], names=["File Name", "File Type"])
+            return pd.DataFrame(index=index, columns=pd.MultiIndex.from_product([self.metrics, ["count", "mean", "median", "q25", "q75"]]), dtype=float)
+        columns = {}
+        for metric in self.metrics:
+            for name, q in (("q25", 0.25), ("median", 0.5), ("q75", 0.75)):
+                columns[(metric, name)] = self.quantile(metric, q)
+            columns[(metric, "mean")] = self.sums[metric] / self.counts[metric]
+            columns[(metric, "count")] = self.counts[metric]
+        cube = pd.DataFrame(columns)
+        cube.index.names = ["File Name", "File Type"]
+        return cube.sort_index(axis=1)
+
 
 class PerformanceComparison:
-    def __init__(self, csv_file_path):
+    def __init__(self, csv_file_path, result_store=None, lazy=False, chunk_size=100000, config="default", backend=None):
         """
         Initializes the PerformanceComparison class by loading the CSV data.
+        Per-iteration data comes from result_store when it holds any, otherwise from the CSVs in data/csv.
+
+        :param lazy: Do not keep the per-iteration data in memory. Aggregates are computed from chunks of
+                     chunk_size rows, and figures load only the keys and the one metric they need, with lean dtypes.
+        :param chunk_size: Rows per chunk in lazy mode.
+        :param config: Build configuration to analyse (see compiler.BUILD_CONFIGS); 'default' is the plain build.
+        :param backend: Measurement backend whose store rows are analysed. Backends measure Elapsed Time differently,
+                        so they are never mixed; defaults to the backend of the most recent run.
         """
         self.relative_work_dir = "../build/"
         self.csv_file_path = csv_file_path
@@ -17,10 +141,31 @@ class PerformanceComparison:
 
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
         self.work_dir = os.path.join(self.script_dir)
-        self.before_process_csv_path = os.path.join(self.work_dir, "../data/csv/")
-
-        # Ensure data is integrated from multiple CSV files
-        self.__integrate_data()
+        # Figures go here; relative paths are relative to the script, like the CSV directories
+        self.plot_dir = os.path.join(self.work_dir, "../data/plt")
+        self.config = config
+        self.before_process_csv_path = self.__csv_dir(config)
+
+        self.result_store = result_store
+        self.lazy = lazy
+        self.chunk_size = chunk_size
+        self.integrated_data = None
+        self.backend = backend
+        if self.__uses_store() and backend is None:
+            self.backend = result_store.latest_backend(configs=[config])
+            if self.backend is not None:
+                print(f"Analysing the {self.backend} backend rows of the result store")
+        if lazy:
+            # Nothing is kept; aggregate() and the figures stream what they need
+            pass
+        elif self.__uses_store():
+            # Only the columns used by the analysis are read from the store
+            self.integrated_data = result_store.load(columns=["Run ID", "Host", "File Name", "File Type", "Iteration"] + self.headers[2:],
+                                                     configs=[config], backends=self.__backends())
+        else:
+            # Ensure data is integrated from multiple CSV files
+            self.__integrate_data()
+        self.cube = None
 
 
     def __write_to_csv(self, metrics, file_name, file_type):
@@ -32,149 +177,421 @@ class PerformanceComparison:
 
     def calculate_and_save_averages(self, file_type = "original"):
         """
-        Calculates and returns the average values of each metric for both original and protected file types.
+        Adds the suite summary row of file_type, kept under the file name 'Average', and saves the CSV. Each metric
+        is summarized by its median over the benchmarks, so one pathological benchmark does not dominate it.
         """
         # Remove previous 'Average' entries for the given file type
         self.data = self.data[~((self.data['File Name'] == 'Average') & (self.data['File Type'] == file_type))]
         
-        # Write the filtered data back to the CSV, effectively removing the old 'Average' entries
-        self.data.to_csv(self.csv_file_path, index=False)
-        # Initialize a dictionary to store the average metrics
-        average_metrics = {}
+        # Initialize a dictionary to store the median metrics
+        median_metrics = {}
         
-        # List of metrics to calculate averages for
+        # List of metrics to summarize
         metrics = ["Cycles", "Instructions", "Cache Misses", "Cache References", "Elapsed Time", "User Time", "System Time", "CPU Percentage", "Maximum resident set size (kbytes)"]
         
         for metric in metrics:
-            # Calculate average for original files
-            average_avg = self.data[self.data['File Type'] == file_type][metric].astype(float).mean()
-            average_metrics[metric] = average_avg
+            # Median over the benchmarks of this file type
+            median_metrics[metric] = median(self.data[self.data['File Type'] == file_type][metric].astype(float).dropna())
 
 
-        self.__write_to_csv(average_metrics, "Average", file_type)
-        self.data = pd.read_csv(self.csv_file_path)
+        # Append the new row in memory and write the CSV once, instead of rewriting it and reading it back
+        average_row = {"File Name": "Average", "File Type": file_type}
+        average_row.update(median_metrics)
+        self.data = pd.concat([self.data, pd.DataFrame([average_row])], ignore_index=True)
+        self.data.to_csv(self.csv_file_path, index=False)
 
 
-    def plot_comparison(self, metric):
+    def aggregate(self):
         """
-        Plots a bar chart comparison for the given metric between original and protected file types, using file names as x-axis labels,
-        and shows the performance degradation percentage. The y-axis is displayed on a logarithmic scale.
+        Returns the (file name x file type) by (metric x statistic) cube of median, mean, quartiles and count over the
+        per-iteration data. It is computed in a single groupby pass on first use and shared by all plots.
         """
-        print(metric)
-        # Ensuring that file names are unique and sorted for consistent plotting
-        file_names = sorted(set(self.data['File Name']))
-        
-        # Initialize a DataFrame to hold the metric values for original and protected types
-        comparison_data = pd.DataFrame(index=file_names, columns=['No_Extension', 'Original', 'Protected'])
-        
-        # Populate the DataFrame with metric values
-        for file_name in file_names:
-            no_extension_value = self.data[(self.data['File Name'] == file_name) & (self.data['File Type'] == 'no_extension')][metric].values
-            original_value = self.data[(self.data['File Name'] == file_name) & (self.data['File Type'] == 'original')][metric].values
-            protected_value = self.data[(self.data['File Name'] == file_name) & (self.data['File Type'] == 'protected')][metric].values
-            comparison_data.at[file_name, 'No_Extension'] = no_extension_value[0] if len(no_extension_value) > 0 else None
-            comparison_data.at[file_name, 'Original'] = original_value[0] if len(original_value) > 0 else None
-            comparison_data.at[file_name, 'Protected'] = protected_value[0] if len(protected_value) > 0 else None
+        if self.cube is None and self.lazy:
+            aggregate = None
+            for chunk in self.iter_chunks(["File Name", "File Type"] + self.headers[2:]):
+                if aggregate is None:
+                    aggregate = StreamingAggregate([metric for metric in self.headers[2:] if metric in chunk.columns])
+                aggregate.add(chunk)
+            if aggregate is None:
+                # No rows for this configuration (or backend): an empty cube with the usual columns
+                aggregate = StreamingAggregate(self.headers[2:])
+            self.cube = aggregate.cube()
+        elif self.cube is None and self.integrated_data.empty:
+            self.cube = StreamingAggregate(self.headers[2:]).cube()
+        elif self.cube is None:
+            metrics = [metric for metric in self.headers[2:] if metric in self.integrated_data.columns]
+            grouped = self.integrated_data.groupby(["File Name", "File Type"], observed=True)[metrics]
+            quantiles = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+            quantiles = quantiles.rename(columns={0.25: "q25", 0.5: "median", 0.75: "q75"}, level=1)
+            moments = grouped.agg(["mean", "count"])
+            self.cube = pd.concat([quantiles, moments], axis=1).sort_index(axis=1)
+        return self.cube
+
+
+    def iter_chunks(self, columns):
+        """
+        Yields the per-iteration data in shrunk chunks of at most chunk_size rows, reading only the given columns
+        (those that exist).
+        """
+        if self.__uses_store():
+            for chunk in self.result_store.iter_batches(columns, self.chunk_size, configs=[self.config], backends=self.__backends()):
+                yield shrink(chunk)
+            return
+        for file in sorted(os.listdir(self.before_process_csv_path)):
+            if not file.endswith(".csv"):
+                continue
+            file_name, file_type = file[:-4].rsplit('-', 1)
+            with pd.read_csv(os.path.join(self.before_process_csv_path, file), usecols=lambda column: column in columns,
+                             chunksize=self.chunk_size) as reader:
+                for chunk in reader:
+                    chunk['File Name'] = file_name
+                    chunk['File Type'] = file_type
+                    yield shrink(chunk[[column for column in columns if column in chunk.columns]])
+
+
+    def metric_data(self, metric):
+        """
+        Returns the per-iteration values of one metric with their keys (Run ID and Host when available, File Name,
+        File Type, Iteration). In lazy mode only these columns are read, chunk by chunk, with lean dtypes.
+        """
+        return self.iteration_data([metric])
+
+
+    def iteration_data(self, metrics):
+        """
+        Like metric_data, for several metrics at once.
+        """
+        keys = ["Run ID", "Host", "File Name", "File Type", "Iteration"]
+        if not self.lazy:
+            return self.integrated_data[[column for column in keys if column in self.integrated_data.columns] + list(metrics)]
+        return concat_chunks(self.iter_chunks(keys + list(metrics)))
+
+
+    def config_overhead(self, metric, configs, baseline="no_extension"):
+        """
+        Overhead (%) of every file type over the baseline from medians, per benchmark and build configuration,
+        so the configurations can be compared side by side. Returns a (File Name, Config) x File Type table, empty
+        if none of the configurations has data.
+
+        :param metric: The metric to compute the overhead on.
+        :param configs: Build configurations to include.
+        :param baseline: File type the others are compared with.
+        """
+        if self.__uses_store():
+            backend = self.backend or self.result_store.latest_backend(configs)
+            data = self.result_store.load(columns=["Config", "File Name", "File Type", metric], configs=configs,
+                                          backends=[backend] if backend is not None else None)
+        else:
+            frames = []
+            for config in configs:
+                csv_dir = self.__csv_dir(config)
+                if not os.path.isdir(csv_dir):
+                    continue
+                for file in os.listdir(csv_dir):
+                    if file.endswith(".csv"):
+                        file_name, file_type = file[:-4].rsplit('-', 1)
+                        frames.append(pd.read_csv(os.path.join(csv_dir, file), usecols=[metric]).assign(
+                            **{"Config": config, "File Name": file_name, "File Type": file_type}))
+            data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["Config", "File Name", "File Type", metric])
+        # Configurations that were not tested (or not with the baseline) are reported and left out
+        present = set(data.loc[data["File Type"] == baseline, "Config"])
+        missing = [config for config in configs if config not in present]
+        if missing:
+            print(f"* [Missing] no {baseline} {metric} data for build configurations: {', '.join(missing)}")
+        data = data[data["Config"].isin(present)]
+        if data.empty:
+            return pd.DataFrame(index=pd.MultiIndex.from_arrays([[], []], names=["File Name", "Config"]))
+        medians = data.groupby(["File Name", "Config", "File Type"])[metric].median().unstack("File Type")
+        return medians.drop(columns=baseline).div(medians[baseline], axis=0).sub(1) * 100
+
+
+    def metric_table(self, metric, statistic="median"):
+        """
+        Returns one statistic of a metric from the cube as a file name x file type table.
+        """
+        return self.aggregate()[(metric, statistic)].unstack("File Type").reindex(columns=['no_extension', 'original', 'protected'])
+
+
+    def paired_overhead(self, metric, baseline="no_extension", confidence=0.95, data=None):
+        """
+        Overhead of every file type over the baseline per benchmark, computed from paired samples: iteration i of
+        each file type (within the same run) was measured in the same randomized block. Host is a blocking factor:
+        the overhead is estimated per host and pooled, so a campaign spread over several machines is not biased
+        by their differences. The unpaired overhead from two independent medians is listed next to it for comparison.
+
+        :param metric: The metric to compute the overhead on.
+        :param baseline: File type the others are compared with.
+        :param confidence: Confidence level of the intervals.
+        :param data: Per-iteration data as returned by iteration_data, e.g. of one benchmark. Defaults to all of it.
+        """
+        data = self.metric_data(metric) if data is None else data
+        keys = [column for column in ["Run ID", "Host", "File Name", "Iteration"] if column in data.columns]
+        if "Host" in keys:
+            # Imported CSV history has no host; pivot_table would drop rows with a null key
+            data = data.assign(Host=data["Host"].astype(object).fillna(UNKNOWN_HOST))
+        duplicates = int(data.duplicated(subset=keys + ["File Type"]).sum())
+        if duplicates:
+            # e.g. per-iteration CSVs appended to by several runs, which have no Run ID to tell the runs apart
+            print(f"* [Duplicates] {duplicates} iterations of {metric} repeat a ({', '.join(keys)}, File Type) key; "
+                  f"only the first of each is paired")
+        pairs = data.pivot_table(index=keys, columns="File Type", values=metric, observed=True, aggfunc="first")
+        rows = []
+        for file_name, group in pairs.groupby(level="File Name"):
+            for file_type in [column for column in group.columns if column != baseline]:
+                paired = group[[baseline, file_type]].dropna()
+                if len(paired) < 2:
+                    continue
+                hosts = paired.index.get_level_values("Host") if "Host" in keys else None
+                overhead, low, high = paired_overhead_ci(paired[baseline], paired[file_type], confidence, blocks=hosts)
+                unpaired, unpaired_low, unpaired_high = unpaired_overhead_ci(group[baseline].dropna(), group[file_type].dropna(), confidence)
+                rows.append({"File Name": file_name, "File Type": file_type, "Pairs": len(paired),
+                             "Hosts": len(set(hosts)) if hosts is not None else 1,
+                             "Overhead (%)": overhead, "CI Low (%)": low, "CI High (%)": high,
+                             "Unpaired Overhead (%)": unpaired, "Unpaired CI Low (%)": unpaired_low, "Unpaired CI High (%)": unpaired_high})
+        return pd.DataFrame(rows)
+
+
+    def save_paired_overhead(self, metrics, output_csv="../data/paired_overhead.csv"):
+        """
+        Writes the paired overhead table of every metric to one CSV.
+        """
+        tables = [self.paired_overhead(metric).assign(Metric=metric) for metric in metrics]
+        pd.concat(tables, ignore_index=True).to_csv(os.path.join(self.work_dir, output_csv), index=False)
+
+
+    def ratio_overhead(self, metric, baseline="no_extension", confidence=0.95, resamples=2000, data=None):
+        """
+        Overhead of every file type over the baseline as the ratio of medians per benchmark with a bootstrap
+        confidence interval. All resamples are drawn at once per benchmark, so a suite takes well under a second.
+        Returns the table and the bootstrap ratios as {(file_name, file_type): array}, from which suite-wide
+        intervals are built (see suite_overhead).
+
+        :param metric: The metric to compute the overhead on.
+        :param baseline: File type the others are compared with.
+        :param confidence: Confidence level of the intervals.
+        :param resamples: Number of bootstrap resamples.
+        :param data: Per-iteration data as returned by iteration_data, e.g. of one benchmark. Defaults to all of it.
+        """
+        data = self.metric_data(metric) if data is None else data
+        alpha = (1 - confidence) / 2
+        rows = []
+        resampled = {}
+        for file_type in [file_type for file_type in data["File Type"].unique() if file_type != baseline]:
+            for file_name, group in data.groupby("File Name", observed=True):
+                candidate = group.loc[group["File Type"] == file_type, metric].dropna()
+                reference = group.loc[group["File Type"] == baseline, metric].dropna()
+                if len(candidate) < 2 or len(reference) < 2:
+                    continue
+                distribution = ratio_resamples(candidate, reference, resamples)
+                ratio = median(candidate) / median(reference)
+                resampled[(file_name, file_type)] = distribution
+                rows.append({"File Name": file_name, "File Type": file_type, "Ratio": ratio, "Overhead (%)": (ratio - 1) * 100,
+                             "CI Low (%)": (np.quantile(distribution, alpha) - 1) * 100,
+                             "CI High (%)": (np.quantile(distribution, 1 - alpha) - 1) * 100})
+        return pd.DataFrame(rows, columns=["File Name", "File Type", "Ratio", "Overhead (%)", "CI Low (%)", "CI High (%)"]), resampled
+
+
+    def suite_overhead(self, metric, baseline="no_extension", confidence=0.95, resamples=2000):
+        """
+        Per-benchmark ratio overhead (see ratio_overhead) followed, for every file type, by the suite-wide geometric
+        mean of the ratios (File Name "Geometric Mean") with an interval from the same resamples.
+
+        :param metric: The metric to compute the overhead on.
+        :param baseline: File type the others are compared with.
+        :param confidence: Confidence level of the intervals.
+        :param resamples: Number of bootstrap resamples.
+        """
+        table, resampled = self.ratio_overhead(metric, baseline, confidence, resamples)
+        rows = []
+        for file_type, group in table.groupby("File Type", sort=False):
+            rows += group.to_dict("records")
+            distributions = np.array([resampled[(file_name, file_type)] for file_name in group["File Name"]])
+            overhead, low, high = geometric_mean_overhead(group["Ratio"], distributions, confidence)
+            rows.append({"File Name": "Geometric Mean", "File Type": file_type,
+                         "Ratio": overhead / 100 + 1, "Overhead (%)": overhead, "CI Low (%)": low, "CI High (%)": high})
+        return pd.DataFrame(rows)
+
+
+    def save_suite_overhead(self, metrics, output_csv="../data/suite_overhead.csv"):
+        """
+        Writes the suite overhead table of every metric to one CSV.
+        """
+        tables = [self.suite_overhead(metric).assign(Metric=metric) for metric in metrics]
+        pd.concat(tables, ignore_index=True).to_csv(os.path.join(self.work_dir, output_csv), index=False)
+
+
+    def outliers(self, metric, threshold=3.5):
+        """
+        Returns the iterations whose metric is an outlier within its benchmark and file type by the modified z-score
+        (see robust_stats.outlier_mask), so they can be inspected rather than silently averaged in.
+        """
+        data = self.metric_data(metric)
+        mask = data.groupby(["File Name", "File Type"], observed=True)[metric].transform(
+            lambda values: pd.Series(outlier_mask(values, threshold), index=values.index))
+        return data[mask.astype(bool)]
+
+
+    def comparison_figure(self, metric):
+        """
+        Prepares the bar chart comparison of the given metric between the file types, with the performance degradation percentage.
+        Returns a (name, draw_function, args) figure description for render_figures.
+        """
+        from rendering import draw_comparison
+
+        # One row per file name, one column per file type: the medians over the iterations from the cube
+        comparison_data = self.metric_table(metric, "median")
+        comparison_data.columns = ['No_Extension', 'Original', 'Protected']
+        comparison_data = comparison_data.astype(float)
         
         # Calculate the performance degradation percentage
-        # comparison_data['Degradation (%) Original'] = ((comparison_data['Protected'] - comparison_data['Original']) / comparison_data['Original']) * 100
         comparison_data['Degradation (%) No_Extension vs Original'] = ((comparison_data['Original'] - comparison_data['No_Extension']) / comparison_data['No_Extension']) * 100
         comparison_data['Degradation (%) No_Extension vs Protected'] = ((comparison_data['Protected'] - comparison_data['No_Extension']) / comparison_data['No_Extension']) * 100
+        return f"Analysis of {metric}", draw_comparison, (metric, comparison_data)
 
-        
-        # Width of the bars in the bar chart
-        bar_width = 0.25
-        
-        # Plotting
-        plt.figure(figsize=(14, 8))
-        indices = np.arange(len(comparison_data))
-        plt.bar(indices - bar_width, comparison_data['No_Extension'], width=bar_width, label='No Extension', alpha=0.8)
-        plt.bar(indices, comparison_data['Original'], width=bar_width, label='Original', alpha=0.8)
-        plt.bar(indices + bar_width, comparison_data['Protected'], width=bar_width, label='Protected', alpha=0.8)
 
+    def boxplot_figure(self, metric):
+        """
+        Prepares the boxplot of the given metric for each unique file name (without type) and file type.
+        Returns a (name, draw_function, args) figure description for render_figures.
+        """
+        from rendering import draw_boxplot
 
-        
-        # Annotate performance degradation percentage
-        for idx, (index, row) in enumerate(comparison_data.iterrows()):
-            base_height = max(row[['No_Extension', 'Original', 'Protected']].dropna())
-            # if not pd.isnull(row['Degradation (%) Original']):
-            #     plt.text(idx, base_height * 1.05, f'{row["Degradation (%) Original"]:.2f}%', ha='center', va='bottom', rotation=75)
-            if not pd.isnull(row['Degradation (%) No_Extension vs Original']):
-                plt.text(idx - bar_width, base_height * 1.10, f'{row["Degradation (%) No_Extension vs Original"]:.2f}%', ha='center', va='bottom', color='blue', rotation=75)
-            if not pd.isnull(row['Degradation (%) No_Extension vs Protected']):
-                plt.text(idx + bar_width, base_height * 1.15, f'{row["Degradation (%) No_Extension vs Protected"]:.2f}%', ha='center', va='bottom', color='red', rotation=75)
-
-        # plt.text(-0.5, base_height * 2.5, 'Red %: Degradation from No Extension to Protected', color='red', fontsize=10, verticalalignment='top')
-        # plt.text(-0.5, base_height * 2.6, 'Blue %: Degradation from No Extension to Original', color='blue', fontsize=10, verticalalignment='top')
-
-
-        # Using logarithmic scale for y-axis if necessary
-        plt.yscale('log')
-
-        # Determine the position for the static annotation on a log scale
-        y_min, y_max = plt.ylim()
-        log_range = np.log10(y_max) - np.log10(y_min)  # Calculate the log range of the current plot
-        red_base_position = 10 ** (np.log10(y_max) - log_range * 0.03)
-        blue_base_position = 10 ** (np.log10(y_max) - log_range * 0.06)
-
-        plt.text(-1, red_base_position, 'Red %: Degradation from No Extension to Protected', color='red', fontsize=10, verticalalignment='top')
-        plt.text(-1, blue_base_position, 'Blue %: Degradation from No Extension to Original', color='blue', fontsize=10, verticalalignment='top')
-
-        # Adding plot details
-        plt.title(f'Comparison of {metric} Between Original and Protected Files')
-        plt.xlabel('File Name')
-        plt.ylabel(metric)
-        plt.xticks(indices, file_names, rotation=45, ha="right")
-        plt.legend()
-        plt.grid(True, which='both', axis='y', linestyle='--', linewidth=0.5)
-        plt.tight_layout()
-        # plt.show()
-        plt.savefig(f"data/plt/Analysis of {metric}.png", dpi=1080)
-
-
-    def plot_boxplot_comparison(self, metric):
+        # Unique file names (without types)
+        file_names = list(self.aggregate().index.get_level_values('File Name').unique().sort_values())
+
+        # Group once instead of masking the whole frame for every (file name, file type) pair
+        samples = {key: group.dropna().to_numpy() for key, group in self.metric_data(metric).groupby(['File Name', 'File Type'], observed=True)[metric]}
+        return f"Box Diagram of {metric}", draw_boxplot, (metric, file_names, samples)
+
+
+    def loss_distribution_figure(self, metric):
+        """
+        Prepares the distribution of performance loss percentage for 'original' and 'protected' compared to 'no_extension'.
+        Returns a (name, draw_function, args) figure description for render_figures.
+        """
+        from rendering import draw_loss_distribution
+
+        # Calculate performance loss percentage for each file name from the medians in the cube
+        medians = self.metric_table(metric, "median")
+        loss = medians[['original', 'protected']].sub(medians['no_extension'], axis=0).div(medians['no_extension'], axis=0) * 100
+        loss.columns = ["Degratation of " + file_type + " from no_extension" for file_type in loss.columns]
+        performance_loss_df = loss.reset_index().melt(id_vars='File Name', var_name='File Type', value_name='Loss Percentage')
+        return f"Distribution Visualization of {metric}", draw_loss_distribution, (performance_loss_df,)
+
+
+    def timeline(self, file_name, series):
+        """
+        Aligns the sampled time series of a benchmark (see PerformanceTester sample_interval) across iterations:
+        sample k of every iteration is matched with sample k of the others. Returns {file_type: DataFrame} with the
+        median time of each sample and the quartiles and median of the series over the iterations.
+
+        :param file_name: The benchmark.
+        :param series: A series of the result store, e.g. 'Cycles' (count per interval) or 'RSS (kbytes)'.
+        """
+        if not self.__uses_store():
+            raise ValueError("Timelines need a result store with sampled runs")
+        data = self.result_store.load_series(file_names=[file_name], configs=[self.config])
+        time_column = "RSS Time" if series.startswith("RSS") else "Counter Time"
+        timelines = {}
+        for file_type, group in data.groupby("File Type"):
+            rows = [(times, values) for times, values in zip(group[time_column], group[series]) if values is not None and len(values)]
+            if not rows:
+                continue
+            length = max(len(values) for _, values in rows)
+            times = np.full((len(rows), length), np.nan)
+            values = np.full((len(rows), length), np.nan)
+            for i, (row_times, row_values) in enumerate(rows):
+                times[i, :len(row_times)] = row_times
+                values[i, :len(row_values)] = row_values
+            q25, q50, q75 = np.nanquantile(values, [0.25, 0.5, 0.75], axis=0)
+            timelines[file_type] = pd.DataFrame({"Time": np.nanmedian(times, axis=0), "q25": q25, "median": q50, "q75": q75})
+        return timelines
+
+
+    def timeline_figure(self, file_name, series=("Cycles", "Instructions", "RSS (kbytes)")):
+        """
+        Prepares the aligned timelines of a benchmark for every file type, one panel per series.
+        Returns a (name, draw_function, args) figure description for render_figures.
+        """
+        from rendering import draw_timeline
+
+        timelines = {name: self.timeline(file_name, name) for name in series}
+        return f"Timeline of {file_name}", draw_timeline, (file_name, timelines)
+
+
+    def plot_timeline(self, file_name, series=("Cycles", "Instructions", "RSS (kbytes)"), profile="publication"):
+        """
+        Plots the aligned no_extension/original/protected timelines of a benchmark, to tell startup, steady state
+        and memory growth apart.
+        """
+        from rendering import render_figures
+
+        render_figures([self.timeline_figure(file_name, series)], profile, self.plot_dir, processes=1)
+
+
+    def plot_comparison(self, metric, profile="publication"):
+        """
+        Plots a bar chart comparison for the given metric between original and protected file types, using file names as x-axis labels,
+        and shows the performance degradation percentage. The y-axis is displayed on a logarithmic scale.
+        """
+        from rendering import render_figures
+
+        print(metric)
+        render_figures([self.comparison_figure(metric)], profile, self.plot_dir, processes=1)
+
+
+    def plot_boxplot_comparison(self, metric, profile="publication"):
         """
         Plots a boxplot for each unique file name (without type), showing the distribution of the given metric for 'no_extension', 'original', 'protected' file types. The y-axis is displayed on a logarithmic scale.
         """
+        from rendering import render_figures
+
         print(metric)
-        
-        # Unique file names (without types)
-        file_names = sorted(set(self.integrated_data['File Name']))
-
-        # Prepare figure
-        plt.figure(figsize=(len(file_names) * 2, 6))
-
-        # Define colors for each file type
-        colors = ['#D7191C', '#2C7BB6', '#FABE2C']
-        file_types = ['no_extension', 'original', 'protected']
-
-        positions = np.arange(len(file_names)) * 4  # Spacing between groups of box plots
-
-        for i, file_name in enumerate(file_names):
-            # Data for the current file name across all file types
-            for j, file_type in enumerate(file_types):
-                data = self.integrated_data[(self.integrated_data['File Name'] == file_name) & (self.integrated_data['File Type'] == file_type)][metric].dropna()
-                pos = positions[i] + j
-                box = plt.boxplot(data, positions=[pos], widths=0.5, patch_artist=True,
-                                boxprops=dict(facecolor=colors[j], color=colors[j]),
-                                medianprops=dict(color='black'),
-                                whiskerprops=dict(color=colors[j]),
-                                capprops=dict(color=colors[j]),
-                                flierprops=dict(markeredgecolor=colors[j], marker='o', markersize=5))
-            
-        # Customizing the plot
-        plt.xticks(positions + 1, file_names, rotation=45, ha="right")
-        plt.ylabel(metric)
-        plt.title(f'Comparison of {metric} Across File Types')
-        plt.yscale('log')
-
-        # Adding legend manually
-        for i, file_type in enumerate(file_types):
-            plt.plot([], c=colors[i], label=file_type.capitalize(), marker='s', linestyle='None', markersize=10)
-        plt.legend()
-
-        plt.tight_layout()
-        plt.savefig(f"data/plt/Box Diagram of {metric}.png", dpi=1080)
+        render_figures([self.boxplot_figure(metric)], profile, self.plot_dir, processes=1)
+
+
+    def visualize_performance_loss_distribution(self, metric, profile="publication"):
+        """
+        Visualizes the distribution of performance loss percentage for 'original' and 'protected' compared to 'no_extension'.
+        :param metric: The metric to evaluate performance loss on.
+        """
+        from rendering import render_figures
+
+        render_figures([self.loss_distribution_figure(metric)], profile, self.plot_dir, processes=1)
+
+
+    def render_all(self, metrics, profile="publication", processes=None):
+        """
+        Renders the box plot, loss distribution and comparison figures of every metric in a process pool.
+
+        :param metrics: Metrics to plot.
+        :param profile: Output profile, see rendering.PROFILES.
+        :param processes: Number of worker processes. Defaults to the number of cores.
+        """
+        from rendering import render_figures
+
+        figures = []
+        for metric in metrics:
+            figures.append(self.boxplot_figure(metric))
+            figures.append(self.loss_distribution_figure(metric))
+            figures.append(self.comparison_figure(metric))
+        render_figures(figures, profile, self.plot_dir, processes=processes)
+
+
+    def __csv_dir(self, config):
+        # Per-iteration CSVs of a build configuration are in data/csv/<config>/, those of the default build in data/csv/
+        if config == "default":
+            return os.path.join(self.work_dir, "../data/csv/")
+        return os.path.join(self.work_dir, "../data/csv/", config)
+
+
+    def __backends(self):
+        # Store filter of the analysed backend; None (no filter) when the store holds no rows for the configuration
+        return [self.backend] if self.backend is not None else None
+
+
+    def __uses_store(self):
+        return self.result_store is not None and not self.result_store.is_empty()
 
 
     def __integrate_data(self):
@@ -199,53 +616,3 @@ class PerformanceComparison:
 
         # Combine all data into a single DataFrame
         self.integrated_data = pd.concat(all_data, ignore_index=True)
-
-
-    def visualize_performance_loss_distribution(self, metric):
-        """
-        Visualizes the distribution of performance loss percentage for 'original' and 'protected' compared to 'no_extension'.
-        :param integrated_data: DataFrame containing integrated data with 'File Name', 'File Type', and the metric columns.
-        :param metric: The metric to evaluate performance loss on.
-        """
-        # Calculate performance loss percentage for each file name
-        performance_loss = []
-        file_names = self.integrated_data['File Name'].unique()
-        
-        for file_name in file_names:
-            no_ext_median = self.integrated_data[(self.integrated_data['File Name'] == file_name) & (self.integrated_data['File Type'] == 'no_extension')][metric].median()
-            for file_type in ['original', 'protected']:
-                file_median = self.integrated_data[(self.integrated_data['File Name'] == file_name) & (self.integrated_data['File Type'] == file_type)][metric].median()
-                loss_percentage = ((file_median - no_ext_median) / no_ext_median) * 100
-                performance_loss.append({'File Name': file_name, 'File Type':"Degratation of " + file_type + " from no_extension", 'Loss Percentage': loss_percentage})
-        
-        performance_loss_df = pd.DataFrame(performance_loss)
-        
-        # Plotting
-        plt.figure(figsize=(12, 6))
-        
-        # Histogram
-        plt.subplot(1, 2, 1)
-        sns.histplot(data=performance_loss_df, x='Loss Percentage', hue='File Type', kde=False, bins=20)
-        plt.title('Histogram of Loss Percentage')
-        plt.xlabel('Loss Percentage')
-        plt.ylabel('Frequency')
-
-                # Annotations of medians
-        medians_text = "Medium:\n"
-        for file_type in performance_loss_df['File Type'].unique():
-            median_val = performance_loss_df[performance_loss_df['File Type'] == file_type]['Loss Percentage'].median()
-            medians_text += f"{file_type}: {median_val:.2f}%\n"
-        
-        # Place medians in a text box on the plot
-        plt.gcf().text(0.2, 0.75, medians_text, fontsize=9, verticalalignment='center', bbox=dict(boxstyle="round,pad=0.5", fc="lightyellow", ec="black", lw=1, alpha=0.5))
-        
-        # Density Plot
-        plt.subplot(1, 2, 2)
-        ax = sns.kdeplot(data=performance_loss_df, x='Loss Percentage', hue='File Type', fill=True)
-        plt.title('Density Plot of Loss Percentage')
-        plt.xlabel('Loss Percentage')
-        plt.ylabel('Density')
-
-        plt.tight_layout()
-        plt.savefig(f"data/plt/Distribution Visualization of {metric}.png", dpi=1080)
-        # plt.show()
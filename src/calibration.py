@@ -0,0 +1,136 @@
+import json
+import os
+import subprocess
+import time
+from robust_stats import *
+
+
+# Calibration programs built by Compiler.compile_calibration: an empty main and a fixed busy loop
+EMPTY_PROGRAM = "calibration_empty"
+LOOP_PROGRAM = "calibration_loop"
+
+# Metrics that add up between harness, QEMU startup and workload; the others (CPU Percentage, Noise Score) are ratios
+ADDITIVE_METRICS = ["Cycles", "Instructions", "Cache Misses", "Cache References", "Elapsed Time", "User Time",
+                    "System Time", "Maximum resident set size (kbytes)"]
+
+
+def workload_metrics(metrics, baseline):
+    """
+    Returns metrics with the harness and QEMU startup baseline of the empty program subtracted from the additive
+    metrics. Values can come out slightly negative for benchmarks within the noise of the baseline.
+    """
+    return {key: value - baseline[key] if key in ADDITIVE_METRICS and key in baseline else value
+            for key, value in metrics.items()}
+
+
+def measured_like(calibration, backend, events):
+    """
+    Whether every file type of calibration was measured with backend and events. The harness overhead depends on
+    both, so a calibration only applies to campaigns that run the same way; files written before the backend was
+    recorded match nothing.
+    """
+    return all(file_calibration.get("backend") == backend and file_calibration.get("events") == list(events)
+               for file_calibration in calibration.values())
+
+
+def is_too_short(workload, noise, min_signal=10, metric="Elapsed Time"):
+    """
+    A benchmark is too short to measure reliably if its workload-only metric is below min_signal times the
+    run-to-run noise (scaled MAD) of the empty program.
+    """
+    return workload[metric] < min_signal * noise[metric]
+
+
+class HarnessCalibration:
+    def __init__(self, tester, iterations=30, min_signal=10, calibration_file="../data/calibration.json"):
+        """
+        Measures what the harness costs: the empty program gives QEMU startup plus perf/time overhead and the RSS
+        floor, a bare run of QEMU without perf gives the part of it that is QEMU startup, and the busy loop is a known
+        workload to check the subtraction with. The result is used by PerformanceTester(calibration=...) to report
+        workload-only metrics.
+
+        :param tester: PerformanceTester whose build_dir holds the calibration programs (e.g. "../build/calibration/"),
+                       with the backend and events of the campaign, so the programs run through the same command path.
+        :param iterations: Number of runs of every program.
+        :param min_signal: Minimum ratio of a benchmark's workload to the baseline noise, see is_too_short.
+        :param calibration_file: JSON file the calibration is saved to.
+        """
+        self.tester = tester
+        self.iterations = iterations
+        self.min_signal = min_signal
+        self.calibration_file = os.path.join(tester.work_dir, calibration_file)
+
+
+    def measure(self, file_types=("no_extension", "original", "protected")):
+        """
+        Runs the calibration programs of every file type and returns {file_type: calibration}; see calibrate.
+        """
+        return {file_type: self.calibrate(file_type) for file_type in file_types}
+
+
+    def calibrate(self, file_type):
+        """
+        Returns the calibration of one file type: median metrics of the empty program ("baseline"), their noise
+        as 1.4826 * MAD ("noise"), the loop's workload-only metrics ("loop_workload"), the elapsed time of QEMU
+        alone ("qemu_startup"), what perf and the harness add on top of it ("harness_overhead") and the RSS floor.
+        """
+        empty = self.__samples(EMPTY_PROGRAM, file_type)
+        loop = self.__samples(LOOP_PROGRAM, file_type)
+        if not empty or not loop:
+            raise RuntimeError(f"Calibration programs of {file_type} failed; build them with Compiler.compile_calibration")
+        baseline = summarize(empty)
+        noise = {metric: 1.4826 * mad([sample[metric] for sample in empty if metric in sample]) for metric in baseline}
+        qemu_startup = median([self.__run_bare(file_type) for _ in range(self.iterations)])
+        calibration = {
+            "backend": self.tester.backend,
+            "events": self.tester.events,
+            "iterations": self.iterations,
+            "min_signal": self.min_signal,
+            "baseline": baseline,
+            "noise": noise,
+            "loop_workload": workload_metrics(summarize(loop), baseline),
+            "qemu_startup": qemu_startup,
+            "harness_overhead": baseline["Elapsed Time"] - qemu_startup,
+            "rss_floor": baseline.get("Maximum resident set size (kbytes)"),
+        }
+        print(f"[Success] calibration {file_type}: QEMU startup {qemu_startup * 1000:.2f} ms, harness overhead "
+              f"{calibration['harness_overhead'] * 1000:.2f} ms, RSS floor {calibration['rss_floor']} kB")
+        return calibration
+
+
+    def save(self, calibration):
+        with open(self.calibration_file + ".tmp", "w") as f:
+            json.dump(calibration, f, indent=2, sort_keys=True)
+        os.replace(self.calibration_file + ".tmp", self.calibration_file)
+
+
+    def load(self):
+        """
+        Returns the saved calibration, or None if the suite has not been calibrated yet or the calibration was
+        measured with another backend or other events than the tester's.
+        """
+        if not os.path.exists(self.calibration_file):
+            return None
+        with open(self.calibration_file) as f:
+            calibration = json.load(f)
+        if not measured_like(calibration, self.tester.backend, self.tester.events):
+            measured = {(value.get("backend", "unknown"), ",".join(value.get("events", []))) for value in calibration.values()}
+            print(f"* [Flagged] {self.calibration_file} was measured with " + "; ".join(f"backend {backend}, events {events or 'unknown'}" for backend, events in sorted(measured))
+                  + f", not backend {self.tester.backend}, events {','.join(self.tester.events)}; workload metrics are not reported. Run calibrate with the same options")
+            return None
+        return calibration
+
+
+    def __samples(self, program, file_type):
+        self.tester.run_once(program, file_type)  # Warm-up run, not recorded
+        samples = [self.tester.run_once(program, file_type) for _ in range(self.iterations)]
+        return [sample for sample in samples if sample is not None]
+
+
+    def __run_bare(self, file_type):
+        # QEMU alone, without perf or time, timed the same way as the direct backend
+        qemu = self.tester.no_extension_qemu if file_type == "no_extension" else self.tester.sec_extension_qemu
+        binary = os.path.join(self.tester.work_dir, self.tester.relative_work_dir, file_type, EMPTY_PROGRAM)
+        start = time.perf_counter()
+        subprocess.run([qemu, binary], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=self.tester.work_dir)
+        return time.perf_counter() - start
@@ -0,0 +1,110 @@
+import json
+import os
+import uuid
+
+
+class CampaignJournal:
+    def __init__(self, path):
+        """
+        Append-only journal of the iterations completed by a test campaign, used to resume it after a crash.
+        Every record is one JSON line written with a single O_APPEND write and fsync'd, so a crash can at
+        most leave a partial last line, which is ignored on load.
+
+        :param path: Path of the journal file.
+        """
+        self.path = path
+        self.run_id = None
+        self.completed = {}
+        self.csv_offsets = {}
+        self.averages = set()
+        self.seed = None
+        self.load()
+
+
+    def start(self, run_id=None):
+        """
+        Starts a new campaign, discarding the previous journal.
+        """
+        self.run_id = run_id or uuid.uuid4().hex
+        self.completed = {}
+        self.csv_offsets = {}
+        self.averages = set()
+        self.seed = None
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(json.dumps({"type": "campaign", "run_id": self.run_id}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # Partial last line of an interrupted write
+                if not line.endswith(b"\n"):
+                    break
+                valid_bytes += len(line)
+                key = (record.get("file_name"), record.get("file_type"))
+                if record["type"] == "campaign":
+                    self.run_id = record["run_id"]
+                elif record["type"] == "iteration":
+                    self.completed.setdefault(key, {})[record["iteration"]] = record["metrics"]
+                    if "csv_offset" in record:
+                        self.csv_offsets[key] = record["csv_offset"]
+                elif record["type"] == "average":
+                    self.averages.add(key)
+                elif record["type"] == "schedule":
+                    self.seed = record["seed"]
+        # Drop a partial last line so that new records do not get appended to it
+        if valid_bytes < os.path.getsize(self.path):
+            os.truncate(self.path, valid_bytes)
+
+
+    def record_iteration(self, file_name, file_type, iteration, metrics, csv_offset=None):
+        """
+        Records a completed iteration with its metrics.
+
+        :param csv_offset: Number of lines the per-iteration CSV had before this campaign first wrote to it.
+        """
+        record = {"type": "iteration", "file_name": file_name, "file_type": file_type, "iteration": iteration, "metrics": metrics}
+        if csv_offset is not None:
+            record["csv_offset"] = csv_offset
+            self.csv_offsets[(file_name, file_type)] = csv_offset
+        self.__append(record)
+        self.completed.setdefault((file_name, file_type), {})[iteration] = metrics
+
+
+    def record_average(self, file_name, file_type):
+        self.__append({"type": "average", "file_name": file_name, "file_type": file_type})
+        self.averages.add((file_name, file_type))
+
+
+    def record_seed(self, seed):
+        """
+        Records the seed of the randomized-block schedule, so a resumed campaign keeps the same run order.
+        """
+        self.__append({"type": "schedule", "seed": seed})
+        self.seed = seed
+
+
+    def iterations(self, file_name, file_type):
+        """
+        Returns {iteration: metrics} of the completed iterations of a binary.
+        """
+        return self.completed.get((file_name, file_type), {})
+
+
+    def __append(self, record):
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(record) + "\n").encode())
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -1,52 +1,270 @@
+import fnmatch
+import hashlib
+import json
 import os
+import shutil
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Workload-size sweeps: benchmark -> (size macro, sizes, bytes per size unit, exponent), where the working set is
+# roughly bytes * size ** exponent. The size macros are wrapped in #ifndef in the sources so -D overrides them.
+STRING_SIZES = [25, 100, 400, 1600, 6400]
+SWEEPS = {
+    "matmult_int32": ("DEFAULT_MATRIX_SIZE", [16, 32, 64, 128, 256, 512], 3 * 4, 2),
+    "matmult_double": ("DEFAULT_MATRIX_SIZE", [16, 32, 64, 128, 256, 512], 3 * 8, 2),
+    "qsort_int32": ("DEFAULT_ARRAY_LEN", [1000, 4000, 16000, 64000, 256000, 1024000], 4, 1),
+    "qsort_double": ("DEFAULT_ARRAY_LEN", [1000, 4000, 16000, 64000, 256000, 1024000], 8, 1),
+    "dijkstra_int32": ("DEFAULT_NODE_COUNT", [64, 128, 256, 512, 1024, 2048], 4, 2),
+    "dijkstra_double": ("DEFAULT_NODE_COUNT", [64, 128, 256, 512, 1024, 2048], 8, 2),
+    "coulomb_float": ("NUMBER_OF_ELECTRONS", [250, 500, 1000, 2000, 4000], 24, 1),
+    "coulomb_double": ("NUMBER_OF_ELECTRONS", [250, 500, 1000, 2000, 4000], 48, 1),
+    "coulomb_longdouble": ("NUMBER_OF_ELECTRONS", [250, 500, 1000, 2000, 4000], 96, 1),
+    "qsort_string": ("NUMBER_OF_RANDOM_STRINGS", [1000, 4000, 10000, 40000, 160000], 8, 1),
+    "search_string": ("HAYSTACK_LEN", [1000, 8000, 30000, 120000, 480000], 1, 1),
+    "obscure_string": ("NUMBER_OF_RANDOM_STRINGS", STRING_SIZES, 2 * 16, 1),
+    "reorder_string": ("NUMBER_OF_RANDOM_STRINGS", STRING_SIZES, 2 * 16, 1),
+    "reverse_string": ("NUMBER_OF_RANDOM_STRINGS", STRING_SIZES, 2 * 16, 1),
+    "shuffle_string": ("NUMBER_OF_RANDOM_STRINGS", STRING_SIZES, 2 * 16, 1),
+    "toupper_string": ("NUMBER_OF_RANDOM_STRINGS", STRING_SIZES, 2 * 16, 1),
+}
+
+
+# Build matrix: config name -> options. opt is the -O level, march overrides the -march of Compiler.command,
+# lto enables -flto (linked with lld). Binaries go to build/<config>/<file_type>/. There is no static/dynamic libm pair:
+# riscv64-unknown-elf (newlib) always links statically.
+BUILD_CONFIGS = {
+    "O0": {"opt": "-O0"},
+    "O2": {"opt": "-O2"},
+    "O3": {"opt": "-O3"},
+    "Os": {"opt": "-Os"},
+    "O2-lto": {"opt": "-O2", "lto": True},
+    "O2-zba-zbb": {"opt": "-O2", "march": "rv64gc_zba_zbb_xs"},
+}
+
+
+def config_flags(config):
+    """
+    Returns the compiler flags of one BUILD_CONFIGS entry.
+    """
+    flags = [config.get("opt", "")]
+    if config.get("march"):
+        flags.append("-march=" + config["march"])  # clang uses the last -march, so this overrides the default
+    if config.get("lto"):
+        flags += ["-flto", "-fuse-ld=lld"]
+    return " ".join(flag for flag in flags if flag)
+
+
+# Folder of every file type holding the calibration programs (see calibration.py); they are built to
+# build/calibration/<file_type>/ instead of with the benchmarks
+CALIBRATION_FOLDER = "calibration"
 
 
 class Compiler:
-    def __init__(self):
-        self.output_dir = "../build/"
+    def __init__(self, output_dir="../build/"):
+        self.output_dir = output_dir
         self.target_dir = "../benchmark/"
         self.command = f"clang --gcc-toolchain=$HOME/tools/riscv -target riscv64-unknown-elf -march=rv64gc_xs -mabi=lp64d "
 
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
         self.work_dir = os.path.join(self.script_dir)
+        self.cache_manifest = self.output_dir + ".build_cache.json"
+        # Optional fnmatch patterns; only benchmarks whose name matches one of them are built
+        self.benchmarks = None
         self.success = []
         self.failed = []
+        self.cached = []
+        self.__toolchain_id = None
 
 
-    def compile(self, source_file,  file_type):
+    def compile(self, source_file,  file_type, output_key=None, flags=""):
         # print(source_file)
         output_executable = os.path.splitext(os.path.basename(source_file))[0]
         target_path = self.target_dir + file_type + "/" + source_file
-        output_path = self.output_dir + file_type + "/" + output_executable
+        if output_key is None:
+            output_key = file_type + "/" + output_executable
+        output_path = self.output_dir + output_key
+        os.makedirs(os.path.join(self.work_dir, os.path.dirname(output_path)), exist_ok=True)
+        if flags:
+            source_file = f"{source_file} ({flags})"
 
-        process = subprocess.Popen(self.command + target_path + " -o " + output_path + " -lm", stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True, cwd=self.work_dir, shell=True)
+        process = subprocess.Popen(self.command + flags + " " + target_path + " -o " + output_path + " -lm", stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True, cwd=self.work_dir, shell=True)
         stdout, stderr = process.communicate()
         # print(stderr)
         if process.returncode != 0:
             print("* [Failed] " + source_file + "compiled failed.")
             self.failed.append(source_file)
-        else:
-            print("[Success] " + source_file + "compiled success.")
-            self.success.append(source_file)
-        # self.__handle_output(stdout, stderr)
+            return False
+        print("[Success] " + source_file + "compiled success.")
+        self.success.append(source_file)
+        return True
     
 
-    def compile_all_benchmarks(self, file_type):
+    def compile_all_benchmarks(self, file_type, jobs=None):
+        """
+        Compiles every benchmark of the given file type. Sources whose cache key (source hash, clang command line
+        and toolchain identity) matches the manifest in build/ are skipped; the rest compile in parallel.
+
+        :param file_type: Type of the files ('no_extension', 'original' or 'protected').
+        :param jobs: Number of parallel compiler processes. Defaults to the number of cores.
+        """
+        targets = []
+        for source_file in self.__sources(file_type):
+            output_key = file_type + "/" + os.path.splitext(os.path.basename(source_file))[0]
+            targets.append((source_file, output_key, ""))
+        self.__build(targets, file_type, jobs)
+
+
+    def compile_sweep(self, file_type, sweeps=SWEEPS, jobs=None):
+        """
+        Builds every benchmark listed in sweeps once per workload size, overriding its size macro with -D.
+        Binaries go to build/sweep/<file_type>/<name>-n<size>.
+
+        :param file_type: Type of the files ('no_extension', 'original' or 'protected').
+        :param sweeps: Dictionary like SWEEPS mapping benchmark name to (macro, sizes, bytes, exponent).
+        :param jobs: Number of parallel compiler processes. Defaults to the number of cores.
+        """
+        targets = []
+        for source_file in self.__sources(file_type):
+            name = os.path.splitext(os.path.basename(source_file))[0]
+            if name in sweeps:
+                macro, sizes = sweeps[name][:2]
+                for size in sizes:
+                    targets.append((source_file, f"sweep/{file_type}/{name}-n{size}", f"-D{macro}={size}"))
+        self.__build(targets, file_type, jobs)
+
+
+    def compile_matrix(self, file_type, configs=BUILD_CONFIGS, jobs=None):
+        """
+        Builds every benchmark once per build configuration, all configurations in one parallel batch.
+        Binaries go to build/<config>/<file_type>/<name>.
+
+        :param file_type: Type of the files ('no_extension', 'original' or 'protected').
+        :param configs: Dictionary like BUILD_CONFIGS mapping config name to its options.
+        :param jobs: Number of parallel compiler processes. Defaults to the number of cores.
+        """
+        targets = []
+        for config, options in configs.items():
+            for source_file in self.__sources(file_type):
+                name = os.path.splitext(os.path.basename(source_file))[0]
+                targets.append((source_file, f"{config}/{file_type}/{name}", config_flags(options)))
+        self.__build(targets, file_type, jobs)
+
+
+    def compile_calibration(self, file_type, jobs=None):
+        """
+        Builds the calibration programs of the given file type with the same command as the benchmarks.
+        Binaries go to build/calibration/<file_type>/<name>.
+
+        :param file_type: Type of the files ('no_extension', 'original' or 'protected').
+        :param jobs: Number of parallel compiler processes. Defaults to the number of cores.
+        """
+        targets = []
+        for file_name in sorted(os.listdir(os.path.join(self.work_dir, self.target_dir, file_type, CALIBRATION_FOLDER))):
+            if file_name.endswith('.c'):
+                name = os.path.splitext(file_name)[0]
+                targets.append((os.path.join(CALIBRATION_FOLDER, file_name), f"{CALIBRATION_FOLDER}/{file_type}/{name}", ""))
+        self.__build(targets, file_type, jobs)
+
+
+    def __sources(self, file_type):
+        # Relative to the script like the other paths, so compiling works from any working directory
+        base_dir = os.path.join(self.work_dir, self.target_dir, file_type)
+        for folder_name in sorted(os.listdir(base_dir)):
+            folder_path = os.path.join(base_dir, folder_name)
+            if os.path.isdir(folder_path) and folder_name != CALIBRATION_FOLDER:
+                for file_name in sorted(os.listdir(folder_path)):
+                    if file_name.endswith('.c') and self.__selected(os.path.splitext(file_name)[0]):
+                        yield os.path.join(folder_name, file_name)
+
+
+    def __selected(self, name):
+        return self.benchmarks is None or any(fnmatch.fnmatch(name, pattern) for pattern in self.benchmarks)
+
+
+    def __build(self, targets, file_type, jobs):
+        """
+        Compiles (source_file, output_key, flags) targets, skipping those whose cache key matches the manifest.
+        """
         self.success = []
         self.failed = []
+        self.cached = []
         print("Start compile...")
-        base_dir = "benchmark/" + file_type
-        for folder_name in os.listdir(base_dir):
-            folder_path = os.path.join(base_dir, folder_name)
-            if os.path.isdir(folder_path):
-                for file_name in os.listdir(folder_path):
-                    if file_name.endswith('.c'):
-                        self.compile(os.path.join(folder_name, file_name), file_type)
+        manifest = self.load_manifest()
+        misses = {}
+        for source_file, output_key, flags in targets:
+            cache_key = self.cache_key(source_file, file_type, flags)
+            output_path = os.path.join(self.work_dir, self.output_dir, output_key)
+            if manifest.get(output_key) == cache_key and os.path.exists(output_path):
+                self.cached.append(f"{source_file} ({flags})" if flags else source_file)
+            else:
+                misses[output_key] = (source_file, flags, cache_key)
+
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+            results = executor.map(lambda item: self.compile(item[1][0], file_type, item[0], item[1][1]), misses.items())
+            for (output_key, (source_file, flags, cache_key)), compiled in zip(misses.items(), list(results)):
+                if compiled:
+                    manifest[output_key] = cache_key
+                else:
+                    manifest.pop(output_key, None)
+        self.save_manifest(manifest)
         self.print_result()
 
 
+    def toolchain_identity(self):
+        """
+        Identifies the clang binary by its resolved path, size, modification time and version string.
+        """
+        if self.__toolchain_id is None:
+            clang_path = shutil.which("clang")
+            if clang_path is None:
+                self.__toolchain_id = "clang-not-found"
+            else:
+                clang_path = os.path.realpath(clang_path)
+                stat = os.stat(clang_path)
+                version = subprocess.run([clang_path, "--version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+                self.__toolchain_id = f"{clang_path}:{stat.st_size}:{stat.st_mtime_ns}:{version}"
+        return self.__toolchain_id
+
+
+    def cache_key(self, source_file, file_type, flags=""):
+        """
+        Returns the content hash identifying one build: source bytes, the full command line and the toolchain.
+        """
+        target_path = os.path.join(self.work_dir, self.target_dir, file_type, source_file)
+        digest = hashlib.sha256()
+        with open(target_path, "rb") as f:
+            digest.update(f.read())
+        digest.update(os.path.expandvars(self.command + flags + " -lm").encode())
+        digest.update(self.toolchain_identity().encode())
+        return digest.hexdigest()
+
+
+    def load_manifest(self):
+        manifest_path = os.path.join(self.work_dir, self.cache_manifest)
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path) as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                return {}
+
+
+    def save_manifest(self, manifest):
+        # Write to a temporary file first so an interrupted run never leaves a truncated manifest
+        manifest_path = os.path.join(self.work_dir, self.cache_manifest)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+
     def print_result(self):
+        if self.cached:
+            print("up to date:")
+            print("\n".join(["- " + item for item in self.cached]))
+            print()
+
         if self.success:
             print("success:")
             print("\n".join(["- " + item for item in self.success]))
@@ -0,0 +1,389 @@
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import queue
+import random
+import secrets
+import socket
+import struct
+import tempfile
+import threading
+import time
+from performance_test import *
+
+
+# Largest hello a coordinator reads before the worker has shown the token
+MAX_HELLO_SIZE = 1 << 16
+
+
+def send_message(sock, message, payload=b""):
+    """
+    Sends one message: a 4-byte big-endian header length, the JSON header and an optional raw payload whose size
+    is given in the header.
+    """
+    header = json.dumps(dict(message, size=len(payload))).encode()
+    sock.sendall(struct.pack("!I", len(header)) + header + payload)
+
+
+def receive_message(sock, max_size=None):
+    """
+    Receives one message sent with send_message. Returns (message, payload), or (None, b"") if the peer closed
+    the connection. With max_size, a larger header or payload raises ValueError instead of being read.
+    """
+    length = _receive_exactly(sock, 4)
+    if length and max_size is not None and struct.unpack("!I", length)[0] > max_size:
+        raise ValueError("Message header too large")
+    header = _receive_exactly(sock, struct.unpack("!I", length)[0]) if length else None
+    if header is None:
+        return None, b""
+    message = json.loads(header)
+    if max_size is not None and message["size"] > max_size:
+        raise ValueError("Message payload too large")
+    payload = _receive_exactly(sock, message["size"]) if message["size"] else b""
+    if payload is None:
+        return None, b""
+    return message, payload
+
+
+def _receive_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(min(size - len(data), 1 << 20))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class Coordinator:
+    def __init__(self, tester, file_types, iterations, seed=None, host="127.0.0.1", port=5555, idle_timeout=300, token=None,
+                 job_timeout=600, hello_timeout=30):
+        """
+        Shards a campaign over workers connecting on (host, port). Each job is one randomized block (every file type
+        of one benchmark at one iteration), so the pairs of a block are measured on the same host. Binaries are
+        shipped by content hash and only when the worker does not have them yet; results are merged into the
+        tester's result store tagged with the worker's host. Workers must present the shared token in their hello;
+        other connections are closed.
+
+        :param tester: PerformanceTester whose binaries, build configuration and result store are used. A result
+                       store is required, since the per-iteration CSVs have no host column.
+        :param file_types: File types to test.
+        :param iterations: Number of iterations per binary.
+        :param seed: Seed of the randomized blocks. Defaults to a random one; it is recorded with the run.
+        :param host: Address to listen on. Defaults to this machine only; give the address of an interface (or
+                     0.0.0.0) to accept remote workers.
+        :param port: Port to listen on; 0 picks a free one (see address).
+        :param idle_timeout: Seconds without any connected worker after which serve() gives up on the remaining blocks.
+        :param token: Shared secret the workers authenticate with. Defaults to a random one, printed by serve().
+        :param job_timeout: Seconds a worker may stay silent while it runs a block, including its warm-up and binary
+                            transfers; the block is then queued again and the worker dropped.
+        :param hello_timeout: Seconds a new connection has to send its hello.
+        """
+        if tester.result_store is None:
+            raise ValueError("Distributed runs need a result store to record the host of every iteration")
+        self.tester = tester
+        self.file_types = list(file_types)
+        self.iterations = iterations
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+        self.idle_timeout = idle_timeout
+        self.token = token or secrets.token_hex(16)
+        self.job_timeout = job_timeout
+        self.hello_timeout = hello_timeout
+        self.listener = socket.create_server((host, port))
+        self.address = self.listener.getsockname()[:2]
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.completed = 0
+        self.total = 0
+        self.workers = 0
+        self.file_names = set()
+
+
+    def blocks(self):
+        """
+        Returns the job list: one {"file_name", "runs": [[file_type, iteration], ...]} block per benchmark and
+        iteration, in the order of PerformanceTester.schedule_jobs().
+        """
+        binaries = {file_type: set(self.tester.benchmark_names(file_type)) for file_type in self.file_types}
+        file_names = sorted(set().union(*binaries.values()))
+        blocks = {}
+        for file_name, file_type, iteration in self.tester.schedule_jobs(file_names, self.file_types, self.iterations, self.seed):
+            if file_name in binaries[file_type]:
+                blocks.setdefault((file_name, iteration), {"file_name": file_name, "runs": []})["runs"].append([file_type, iteration])
+        return list(blocks.values())
+
+
+    def serve(self, alive=None):
+        """
+        Accepts workers until every block has been measured, then tells the workers to stop and flushes the store.
+        A block whose worker disconnects is queued again for the other workers. If no worker is connected for
+        idle_timeout seconds, or none can come any more (alive() returns False), the remaining blocks are given up
+        and their benchmarks count as failed.
+
+        :param alive: Optional callable telling whether workers may still connect, e.g. whether local worker
+                      processes are running.
+        """
+        self.tester.success = []
+        self.tester.failed = []
+        self.tester.check_environment()
+        self.tester.result_store.save_metadata("schedule", {"seed": self.seed, "file_types": self.file_types,
+                                                            "iterations": self.iterations, "distributed": True})
+        blocks = self.blocks()
+        self.total = len(blocks)
+        self.file_names = {block["file_name"] for block in blocks}
+        for block in blocks:
+            self.pending.put(block)
+        print(f"Coordinator listening on {self.address[0]}:{self.address[1]}, {self.total} blocks, seed {self.seed}")
+        print(f"Worker token: {self.token}")
+
+        self.listener.settimeout(0.5)
+        threads = []
+        idle_since = time.monotonic()
+        while not self.done.is_set() and self.total:
+            try:
+                connection, _ = self.listener.accept()
+                connection.settimeout(self.hello_timeout)
+                with self.lock:
+                    self.workers += 1  # Counted here, so a worker is never missed between accept and its thread
+                thread = threading.Thread(target=self.__serve_worker, args=(connection,), daemon=True)
+                thread.start()
+                threads.append(thread)
+            except socket.timeout:
+                pass
+            with self.lock:
+                workers = self.workers
+            if workers:
+                idle_since = time.monotonic()
+            elif (alive is not None and not alive()) or time.monotonic() - idle_since > self.idle_timeout:
+                self.__abandon()
+        for thread in threads:
+            thread.join()
+        self.listener.close()
+        self.tester.result_store.flush()
+        self.tester.print_result()
+
+
+    def __abandon(self):
+        """
+        Gives up on the blocks still queued when no worker is left to run them.
+        """
+        abandoned = set()
+        while not self.pending.empty():
+            abandoned.add(self.pending.get()["file_name"])
+        with self.lock:
+            print(f"* [Failed] no worker left, {self.total - self.completed} blocks not measured")
+            for file_name in sorted(abandoned - set(self.tester.failed)):
+                print("* [Failed] " + file_name)
+                self.tester.failed.append(file_name)
+            self.tester.success = sorted(self.file_names - set(self.tester.failed))
+            self.done.set()
+
+
+    def __serve_worker(self, connection):
+        try:
+            self.__serve_connection(connection)
+        finally:
+            with self.lock:
+                self.workers -= 1
+
+
+    def __serve_connection(self, connection):
+        with connection:
+            peer = connection.getpeername()[0]
+            try:
+                hello, _ = receive_message(connection, MAX_HELLO_SIZE)
+            except (OSError, ValueError):
+                hello = None
+            if hello is None or hello.get("type") != "hello" or not hmac.compare_digest(str(hello.get("token")), self.token):
+                print(f"* [Rejected] connection from {peer}: no hello with the worker token")
+                return
+            # From here on a silent worker is dropped after job_timeout and its block requeued
+            connection.settimeout(self.job_timeout)
+            host = hello["host"]
+            print(f"Worker {host} connected from {peer}")
+            # Every worker checks its own machine settings; they are recorded per host with the run
+            environment = hello.get("environment")
+            if environment is not None:
+                self.tester.result_store.save_metadata(f"environment-{host}", environment)
+                if environment["deviations"]:
+                    print(f"* [Flagged] environment of {host} differs from its baseline: " + ", ".join(environment["deviations"]))
+            while True:
+                try:
+                    block = self.pending.get(timeout=0.5)
+                except queue.Empty:
+                    if self.done.is_set():
+                        try:
+                            send_message(connection, {"type": "done"})
+                        except OSError:
+                            pass  # The worker is gone already
+                        return
+                    continue  # Blocks may still come back from a worker that fails
+                try:
+                    result = self.__run_block(connection, block)
+                except socket.timeout:
+                    print(f"* [Requeued] {block['file_name']} (worker {host} silent for {self.job_timeout} s)")
+                    self.pending.put(block)
+                    return
+                except (OSError, ValueError):
+                    result = None
+                if result is None or result.get("type") != "result":
+                    print(f"* [Requeued] {block['file_name']} (worker {host} disconnected)")
+                    self.pending.put(block)
+                    return
+                self.__merge(block, result)
+
+
+    def __run_block(self, connection, block):
+        file_name = block["file_name"]
+        paths = {file_type: os.path.join(self.tester.work_dir, self.tester.relative_work_dir, file_type, file_name)
+                 for file_type, _ in block["runs"]}
+        hashes = {file_type: self.tester.result_store.binary_hash(path) for file_type, path in paths.items()}
+        send_message(connection, {"type": "job", "file_name": file_name, "runs": block["runs"], "binaries": hashes})
+        message, _ = receive_message(connection)
+        # The worker asks again for binaries that arrived corrupted
+        while message is not None and message["type"] == "need":
+            for digest in message["hashes"]:
+                path = next(paths[file_type] for file_type, value in hashes.items() if value == digest)
+                with open(path, "rb") as f:
+                    send_message(connection, {"type": "blob", "hash": digest}, f.read())
+            message, _ = receive_message(connection)
+        return message
+
+
+    def __merge(self, block, result):
+        file_name = block["file_name"]
+        with self.lock:
+            for file_type, iteration, metrics in result["results"]:
+                if metrics is None:
+                    if file_name not in self.tester.failed:
+                        print("* [Failed] " + file_name)
+                        self.tester.failed.append(file_name)
+                    continue
+                binary_path = os.path.join(self.tester.work_dir, self.tester.relative_work_dir, file_type, file_name)
+                self.tester.result_store.append(file_name, file_type, iteration, metrics, binary_path, self.tester.config,
+                                                result["host"], result["backend"])
+            self.completed += 1
+            if self.completed == self.total:
+                self.tester.success = sorted(self.file_names - set(self.tester.failed))
+                self.done.set()
+
+
+class Worker:
+    def __init__(self, address, cache_dir, host=None, backend="direct", events=None, warm_up_iterations=20, attempts=3,
+                 token=None):
+        """
+        Runs the blocks sent by a Coordinator. Binaries are kept in cache_dir/objects/<sha256>, so each build is
+        transferred once per worker, and linked to cache_dir/<file_type>/<file_name> for the tester.
+        Like the local runners, a worker checks its machine settings before the first block (they are sent to the
+        coordinator) and warms up every file type before measuring it, with the first benchmark it receives.
+
+        :param address: (host, port) of the coordinator.
+        :param cache_dir: Directory holding the received binaries.
+        :param host: Host tag of the results. Defaults to the host name.
+        :param backend: Measurement backend of the PerformanceTester.
+        :param events: perf events of the PerformanceTester.
+        :param warm_up_iterations: Warm-up runs per file type.
+        :param attempts: Transfers of a binary before the worker gives up on a block whose binary arrives corrupted.
+        :param token: Shared secret printed by the coordinator.
+        """
+        self.address = tuple(address)
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.objects_dir = os.path.join(self.cache_dir, "objects")
+        self.host = host or socket.gethostname()
+        self.tester = PerformanceTester(build_dir=self.cache_dir + "/", backend=backend, events=events, environment=EnvironmentManager())
+        self.warm_up_iterations = warm_up_iterations
+        self.attempts = attempts
+        self.token = token
+        self.warmed_up = set()
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+
+    def run(self):
+        try:
+            self.__run()
+        except OSError as error:
+            # e.g. the coordinator dropped this worker after its job timeout; its block runs elsewhere
+            print(f"* [Failed] connection to the coordinator lost: {error}")
+
+
+    def __run(self):
+        with socket.create_connection(self.address) as sock:
+            send_message(sock, {"type": "hello", "host": self.host, "token": self.token,
+                                "environment": self.tester.environment.check()})
+            while True:
+                message, _ = receive_message(sock)
+                if message is None or message["type"] == "done":
+                    return
+                if not self.__receive_binaries(sock, message["binaries"]):
+                    # Closing the connection makes the coordinator queue the block again for another worker
+                    print(f"* [Failed] binaries of {message['file_name']} could not be received")
+                    return
+                file_name = message["file_name"]
+                for file_type, digest in message["binaries"].items():
+                    self.__link(os.path.join(self.objects_dir, digest), os.path.join(self.cache_dir, file_type, file_name))
+                for file_type, _ in message["runs"]:
+                    if file_type not in self.warmed_up:
+                        self.tester.warm_up(file_name, file_type, self.warm_up_iterations)
+                        self.warmed_up.add(file_type)
+                results = [[file_type, iteration, self.tester.run_once(file_name, file_type)] for file_type, iteration in message["runs"]]
+                send_message(sock, {"type": "result", "host": self.host, "backend": self.tester.backend, "results": results})
+
+
+    def __receive_binaries(self, sock, binaries):
+        """
+        Asks for the binaries missing from the cache and stores them. Binaries that arrive corrupted are asked for
+        again, up to attempts transfers. Returns False if one never arrived intact or the coordinator disconnected.
+        """
+        missing = sorted({digest for digest in binaries.values() if not os.path.exists(os.path.join(self.objects_dir, digest))})
+        for _ in range(self.attempts):
+            send_message(sock, {"type": "need", "hashes": missing})
+            corrupted = []
+            for _ in missing:
+                message, payload = receive_message(sock)
+                if message is None:
+                    return False
+                if hashlib.sha256(payload).hexdigest() != message["hash"]:
+                    print(f"* [Retry] binary {message['hash']} arrived corrupted")
+                    corrupted.append(message["hash"])
+                    continue
+                path = os.path.join(self.objects_dir, message["hash"])
+                with open(path + ".tmp", "wb") as f:
+                    f.write(payload)
+                os.chmod(path + ".tmp", 0o755)
+                os.replace(path + ".tmp", path)
+            missing = corrupted
+            if not missing:
+                return True
+        return False
+
+
+    def __link(self, target, link):
+        os.makedirs(os.path.dirname(link), exist_ok=True)
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink(target, link)
+
+
+def _local_worker(address, cache_dir, host, backend, events, token):
+    Worker(address, cache_dir, host, backend, events, token=token).run()
+
+
+def run_local(tester, file_types, iterations=100, workers=2, seed=None):
+    """
+    Local stand-in for a multi-host campaign: a coordinator on 127.0.0.1 and workers in separate processes on this
+    machine, each with its own binary cache and host tag (<hostname>-local<i>).
+    """
+    coordinator = Coordinator(tester, file_types, iterations, seed, host="127.0.0.1", port=0)
+    with tempfile.TemporaryDirectory() as cache_root:
+        processes = [multiprocessing.Process(target=_local_worker, args=(coordinator.address, os.path.join(cache_root, str(i)),
+                                                                        f"{socket.gethostname()}-local{i}", tester.backend, tester.events,
+                                                                        coordinator.token))
+                     for i in range(workers)]
+        for process in processes:
+            process.start()
+        coordinator.serve(alive=lambda: any(process.is_alive() for process in processes))
+        for process in processes:
+            process.join()
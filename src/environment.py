@@ -0,0 +1,199 @@
+import glob
+import json
+import os
+import platform
+import socket
+
+
+CPU_DIR = "/sys/devices/system/cpu"
+ASLR_PATH = "/proc/sys/kernel/randomize_va_space"
+CGROUP_DIR = "/sys/fs/cgroup"
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _write(path, value):
+    """
+    Writes value to a sysfs/procfs file. Returns False (and prints why) if it is not writable, e.g. without root.
+    """
+    try:
+        with open(path, "w") as f:
+            f.write(str(value))
+        return True
+    except OSError as error:
+        print(f"* [Environment] cannot write {path}: {error.strerror}")
+        return False
+
+
+def parse_cpu_list(cpu_list):
+    """
+    Parses a kernel CPU list such as "2-5,8" into a sorted list of core ids.
+    """
+    cores = set()
+    for part in cpu_list.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cores.update(range(int(start), int(end) + 1))
+        else:
+            cores.add(int(part))
+    return sorted(cores)
+
+
+def benchmark_cores():
+    """
+    Returns the cores reserved for benchmarking: the kernel's isolated CPUs (isolcpus) if any, otherwise every CPU
+    in the current affinity mask. PerformanceTester runs on these unless it is given cores.
+    """
+    isolated = parse_cpu_list(_read(f"{CPU_DIR}/isolated") or "")
+    return isolated or sorted(os.sched_getaffinity(0))
+
+
+class EnvironmentManager:
+    def __init__(self, governor="performance", turbo=False, aslr=False, cores=None,
+                 baseline_file="../data/environment_baseline.json", strict=False):
+        """
+        Checks, sets and records the machine settings that add noise to measurements: CPU frequency governor,
+        turbo/boost, address space layout randomisation and cpuset isolation of the benchmark cores.
+
+        :param governor: Wanted scaling governor of the benchmark cores.
+        :param turbo: Wanted turbo/boost state.
+        :param aslr: Wanted ASLR state.
+        :param cores: Cores the benchmarks run on. Defaults to benchmark_cores(), those PerformanceTester uses by default.
+        :param baseline_file: JSON file with the environment of the baseline campaign.
+        :param strict: Refuse to run (raise RuntimeError) instead of flagging when the environment differs from the baseline.
+        """
+        self.governor = governor
+        self.turbo = turbo
+        self.aslr = aslr
+        self.cores = sorted(cores) if cores else benchmark_cores()
+        self.script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.work_dir = os.path.join(self.script_dir)
+        self.baseline_file = os.path.join(self.work_dir, baseline_file)
+        self.strict = strict
+
+
+    def snapshot(self):
+        """
+        Returns the current settings as a JSON-serialisable dictionary. Settings that cannot be read are None.
+        """
+        governors = {_read(f"{CPU_DIR}/cpu{core}/cpufreq/scaling_governor") for core in self.cores}
+        isolated = _read(f"{CPU_DIR}/isolated")
+        return {
+            "host": socket.gethostname(),
+            "kernel": platform.release(),
+            "cpu_model": self.__cpu_model(),
+            "cores": self.cores,
+            "governor": governors.pop() if len(governors) == 1 else sorted(governors, key=str),
+            "turbo": self.__turbo(),
+            "aslr": None if _read(ASLR_PATH) is None else _read(ASLR_PATH) != "0",
+            "isolated": isolated or "",
+            "cores_isolated": bool(isolated) and set(self.cores) <= set(parse_cpu_list(isolated)),
+            "smt": _read(f"{CPU_DIR}/smt/control"),
+        }
+
+
+    def apply(self, cpuset=None):
+        """
+        Sets the governor of the benchmark cores, turbo and ASLR to the wanted state; needs root.
+        Settings that cannot be changed are reported and left as they are.
+
+        :param cpuset: Name of a cgroup v2 cpuset to create as an isolated partition of the benchmark cores and move
+                       this process into, for machines booted without isolcpus.
+        """
+        for core in self.cores:
+            path = f"{CPU_DIR}/cpu{core}/cpufreq/scaling_governor"
+            if os.path.exists(path) and _read(path) != self.governor:
+                _write(path, self.governor)
+        if os.path.exists(f"{CPU_DIR}/intel_pstate/no_turbo"):
+            _write(f"{CPU_DIR}/intel_pstate/no_turbo", 0 if self.turbo else 1)
+        elif os.path.exists(f"{CPU_DIR}/cpufreq/boost"):
+            _write(f"{CPU_DIR}/cpufreq/boost", 1 if self.turbo else 0)
+        if os.path.exists(ASLR_PATH):
+            _write(ASLR_PATH, 2 if self.aslr else 0)
+        if cpuset:
+            path = os.path.join(CGROUP_DIR, cpuset)
+            try:
+                os.makedirs(path, exist_ok=True)
+            except OSError as error:
+                print(f"* [Environment] cannot create cpuset {path}: {error.strerror}")
+                return
+            if _write(os.path.join(path, "cpuset.cpus"), ",".join(map(str, self.cores))):
+                _write(os.path.join(path, "cpuset.cpus.partition"), "isolated")
+                _write(os.path.join(path, "cgroup.procs"), os.getpid())
+
+
+    def differences(self, environment, baseline):
+        """
+        Returns the settings that differ between environment and baseline as {setting: (baseline, current)}.
+        The host identity and the wanted-state checks are compared; the core list is not, since it may change.
+        """
+        keys = ["host", "kernel", "cpu_model", "governor", "turbo", "aslr", "cores_isolated", "smt"]
+        return {key: (baseline.get(key), environment.get(key)) for key in keys if baseline.get(key) != environment.get(key)}
+
+
+    def unwanted(self, environment):
+        """
+        Returns the settings that differ from the wanted state as {setting: (wanted, current)}; unreadable settings are skipped.
+        """
+        wanted = {"governor": self.governor, "turbo": self.turbo, "aslr": self.aslr}
+        return {key: (value, environment[key]) for key, value in wanted.items()
+                if environment[key] is not None and environment[key] != value}
+
+
+    def check(self):
+        """
+        Takes a snapshot and compares it with the baseline (saving it as the baseline if there is none yet) and with
+        the wanted state. Returns the snapshot with "deviations" (from the baseline) and "unwanted" (settings not in
+        the wanted state) entries; raises RuntimeError in strict mode if the environment differs from the baseline.
+        """
+        environment = self.snapshot()
+        if os.path.exists(self.baseline_file):
+            with open(self.baseline_file) as f:
+                deviations = self.differences(environment, json.load(f))
+        else:
+            self.save_baseline(environment)
+            deviations = {}
+        unwanted = self.unwanted(environment)
+        for key, (expected, current) in list(deviations.items()) + list(unwanted.items()):
+            print(f"* [Environment] {key}: expected {expected}, found {current}")
+        if deviations and self.strict:
+            raise RuntimeError("Environment differs from the baseline: " + ", ".join(deviations))
+        environment["deviations"] = {key: list(values) for key, values in deviations.items()}
+        environment["unwanted"] = {key: list(values) for key, values in unwanted.items()}
+        return environment
+
+
+    def save_baseline(self, environment=None):
+        environment = environment or self.snapshot()
+        environment.pop("deviations", None)
+        environment.pop("unwanted", None)
+        with open(self.baseline_file + ".tmp", "w") as f:
+            json.dump(environment, f, indent=2, sort_keys=True)
+        os.replace(self.baseline_file + ".tmp", self.baseline_file)
+
+
+    def __turbo(self):
+        no_turbo = _read(f"{CPU_DIR}/intel_pstate/no_turbo")
+        if no_turbo is not None:
+            return no_turbo == "0"
+        boost = _read(f"{CPU_DIR}/cpufreq/boost")
+        if boost is not None:
+            return boost == "1"
+        boosts = {_read(path) for path in glob.glob(f"{CPU_DIR}/cpufreq/policy*/boost")}
+        return boosts == {"1"} if boosts else None
+
+
+    def __cpu_model(self):
+        for line in (_read("/proc/cpuinfo") or "").splitlines():
+            if line.startswith("model name"):
+                return line.split(":", 1)[1].strip()
+        return platform.machine()
+
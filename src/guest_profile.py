@@ -0,0 +1,155 @@
+import bisect
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import pandas as pd
+
+
+# TCG plugins loaded for a profile, relative to the QEMU build directory they were built in
+PLUGINS = {
+    "insn": "tests/plugin/libinsn.so",
+    "hotblocks": "contrib/plugins/libhotblocks.so",
+    "hotpages": "contrib/plugins/libhotpages.so",
+}
+
+# hotblocks only prints its 20 hottest blocks; the limit is fixed in the plugin and cannot be passed as an argument
+HOTBLOCKS_LIMIT = 20
+
+# Histogram row holding the guest instructions of the blocks hotblocks did not report
+OTHER_BLOCKS = f"(outside the top {HOTBLOCKS_LIMIT} blocks)"
+
+
+def function_symbols(binary):
+    """
+    Returns (sorted start addresses, function names) of the text symbols of a guest ELF, read with llvm-nm.
+    RISC-V mapping symbols ($x...) are skipped.
+    """
+    output = subprocess.run(["llvm-nm", "-n", "--defined-only", binary], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            text=True, check=True).stdout
+    addresses, names = [], []
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) != 3 or fields[1] not in "TtWw" or fields[2].startswith("$"):
+            continue
+        address = int(fields[0], 16)
+        if addresses and addresses[-1] == address:
+            continue  # Aliases: keep the first name
+        addresses.append(address)
+        names.append(fields[2])
+    return addresses, names
+
+
+def qemu_build_dir(qemu):
+    """
+    Returns the build directory of a QEMU binary (a path or a name looked up in PATH), where the TCG plugins built
+    with it live. Symlinks are resolved, so an installed link into a build tree finds that tree.
+    """
+    path = shutil.which(os.path.expandvars(qemu))
+    if path is None:
+        raise FileNotFoundError(f"QEMU binary {qemu} not found")
+    return os.path.dirname(os.path.realpath(path))
+
+
+def parse_plugin_log(log):
+    """
+    Parses the output of the insn, hotblocks and hotpages plugins from one QEMU log.
+    Returns (total guest instructions or None, blocks DataFrame, pages DataFrame).
+    """
+    insns = re.findall(r"insns: (\d+)", log)
+    blocks, pages = [], []
+    for line in log.splitlines():
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) == 4 and fields[0].startswith("0x") and fields[1].isdigit():
+            # hotblocks: pc, tcount, icount, ecount
+            blocks.append({"PC": int(fields[0], 16), "Translations": int(fields[1]), "Block Instructions": int(fields[2]),
+                           "Executions": int(fields[3])})
+        elif len(fields) == 5 and fields[0].startswith("0x"):
+            # hotpages: Addr, RCPUs, Reads, WCPUs, Writes
+            pages.append({"Page": fields[0], "Reads": int(fields[2]), "Writes": int(fields[4])})
+    blocks = pd.DataFrame(blocks, columns=["PC", "Translations", "Block Instructions", "Executions"])
+    pages = pd.DataFrame(pages, columns=["Page", "Reads", "Writes"])
+    return (int(insns[-1]) if insns else None), blocks, pages
+
+
+class GuestProfiler:
+    def __init__(self, plugin_dir, plugins=None):
+        """
+        Runs guest binaries under QEMU TCG plugins and attributes the executed guest instructions to functions.
+
+        :param plugin_dir: QEMU build directory the plugins were built in; must match the QEMU binary used
+                           (see qemu_build_dir).
+        :param plugins: Dictionary of plugin name -> .so path relative to plugin_dir. Defaults to PLUGINS.
+        """
+        self.plugin_dir = os.path.expandvars(plugin_dir)
+        self.plugins = plugins or PLUGINS
+        missing = [plugin for plugin in self.plugins.values() if not os.path.exists(os.path.join(self.plugin_dir, plugin))]
+        if missing:
+            raise FileNotFoundError(f"TCG plugins {', '.join(missing)} not built in {self.plugin_dir}")
+
+
+    def run(self, qemu, binary, cwd=None):
+        """
+        Runs binary under qemu with all plugins loaded. Returns (total guest instructions, blocks, pages),
+        or None if the run failed.
+        """
+        with tempfile.NamedTemporaryFile(suffix=".log") as log:
+            argv = [qemu]
+            for plugin in self.plugins.values():
+                argv += ["-plugin", os.path.join(self.plugin_dir, plugin)]
+            argv += ["-d", "plugin", "-D", log.name, binary]
+            process = subprocess.run(argv, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, cwd=cwd)
+            if process.returncode != 0:
+                print(process.stderr.strip())
+                return None
+            with open(log.name) as f:
+                return parse_plugin_log(f.read())
+
+
+    def function_histogram(self, binary, blocks, total=None):
+        """
+        Sums executed guest instructions (block size times executions) per function of binary.
+        hotblocks only reports its HOTBLOCKS_LIMIT hottest blocks, so the functions cover the hot part of the program
+        only. With the total guest instructions of the run (insn plugin), the rest is added as an OTHER_BLOCKS row,
+        so the histogram adds up to the whole run.
+        """
+        addresses, names = function_symbols(binary)
+        functions = []
+        for pc in blocks["PC"]:
+            index = bisect.bisect_right(addresses, pc) - 1
+            functions.append(names[index] if index >= 0 else hex(pc))
+        blocks = blocks.assign(**{"Function": functions, "Guest Instructions": blocks["Block Instructions"] * blocks["Executions"]})
+        histogram = blocks.groupby("Function")[["Guest Instructions", "Executions"]].sum().sort_values("Guest Instructions", ascending=False)
+        if total:
+            histogram.loc[OTHER_BLOCKS] = [total - histogram["Guest Instructions"].sum(), None]
+        return histogram
+
+
+def coverage(histogram):
+    """
+    Percentage of the guest instructions of a histogram with an OTHER_BLOCKS row that the reported hot blocks hold,
+    or None without that row.
+    """
+    if OTHER_BLOCKS not in histogram.index:
+        return None
+    total = histogram["Guest Instructions"].sum()
+    return (1 - histogram.loc[OTHER_BLOCKS, "Guest Instructions"] / total) * 100 if total else None
+
+
+def function_diff(histograms, totals, baseline="original", candidate="protected"):
+    """
+    Per-function difference in executed guest instructions between two builds of the same benchmark, matched by name.
+    Share of Overhead (%) is the function's part of the total instruction increase reported by the insn plugin; the
+    OTHER_BLOCKS row holds the part hotblocks did not attribute to any function.
+
+    :param histograms: Dictionary file_type -> function histogram.
+    :param totals: Dictionary file_type -> total guest instructions.
+    """
+    diff = pd.concat({file_type: histograms[file_type]["Guest Instructions"] for file_type in (baseline, candidate)}, axis=1).fillna(0)
+    diff.columns = [f"Guest Instructions {baseline}", f"Guest Instructions {candidate}"]
+    diff["Delta"] = diff.iloc[:, 1] - diff.iloc[:, 0]
+    diff["Delta (%)"] = diff["Delta"] / diff.iloc[:, 0].where(diff.iloc[:, 0] != 0) * 100
+    total_delta = (totals[candidate] or 0) - (totals[baseline] or 0)
+    diff["Share of Overhead (%)"] = diff["Delta"] / total_delta * 100 if total_delta else float("nan")
+    return diff.sort_values("Delta", ascending=False).rename_axis("Function").reset_index()
@@ -1,48 +1,383 @@
 #! python3
-from performance_test import *
-from compiler import *
-from analysis import *
+import argparse
+import os
+import sys
 
-def compile():
-    compiler = Compiler()
-    compiler.compile_all_benchmarks("no_extension")
-    compiler.compile_all_benchmarks("original")
-    compiler.compile_all_benchmarks("protected")
-    
+# Stages import their modules when they run: compile needs no pandas, test no matplotlib/seaborn, and worker
+# processes only pay for what their stage uses.
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT_DIR, "data")
+BUILD_DIR = os.path.join(ROOT_DIR, "build")
+FILE_TYPES = ["no_extension", "original", "protected"]
+METRICS = ["Cache Misses", "Cache References", "Cycles", "Instructions", "Elapsed Time", "Maximum resident set size (kbytes)"]
+OVERHEAD_METRICS = ["Cycles", "Instructions", "Elapsed Time"]
+# Environment variable holding the shared secret of coordinator and workers, so it does not show up in ps
+TOKEN_VARIABLE = "XSEC_WORKER_TOKEN"
+
+
+def _dir(path):
+    # Directories are passed on with a trailing slash, since the tester and compiler append to them
+    return os.path.join(os.path.abspath(path), "")
+
+
+def _store(path):
+    from result_store import ResultStore
+
+    return ResultStore(path) if path else None
+
+
+def _averages_csv(path, config):
+    return os.path.splitext(path)[0] + f"-{config}.csv" if config != "default" else path
+
+
+def compile(file_types=FILE_TYPES, benchmarks=None, jobs=None, build_dir=BUILD_DIR, matrix=None, sweep=False, calibration=False):
+    from compiler import Compiler, BUILD_CONFIGS
+
+    compiler = Compiler(_dir(build_dir))
+    compiler.benchmarks = benchmarks
+    for file_type in file_types:
+        if calibration:
+            compiler.compile_calibration(file_type, jobs)
+        elif sweep:
+            compiler.compile_sweep(file_type, jobs=jobs)
+        elif matrix is not None:
+            compiler.compile_matrix(file_type, {config: BUILD_CONFIGS[config] for config in matrix or BUILD_CONFIGS}, jobs)
+        else:
+            compiler.compile_all_benchmarks(file_type, jobs)
+
+
+def prepare_environment(apply=False, cpuset=None, cores=None, strict=False):
+    # Checks the cores a test run with the same --cores uses; strict returns 1 if a check failed
+    from environment import EnvironmentManager
+
+    environment = EnvironmentManager(cores=cores, strict=strict)
+    if apply:
+        # Needs root; pins the governor, disables turbo and ASLR before a campaign
+        environment.apply(cpuset)
+    try:
+        result = environment.check()
+    except RuntimeError as error:
+        print(f"* [Failed] {error}")
+        return 1
+    if strict and result["unwanted"]:
+        print("* [Failed] settings not in the wanted state: " + ", ".join(result["unwanted"]))
+        return 1
+    return 0
+
+
+def calibrate(file_types=FILE_TYPES, iterations=30, build_dir=BUILD_DIR, backend="direct", events=None):
+    # Measures QEMU startup, harness overhead and the RSS floor with the calibration programs; test() then also
+    # reports workload-only metrics when it runs with the same backend and events
+    from calibration import HarnessCalibration
+    from performance_test import PerformanceTester
 
-def test():
-    tester = PerformanceTester()
+    compile(file_types, build_dir=build_dir, calibration=True)
+    calibration = HarnessCalibration(PerformanceTester(backend=backend, events=events, build_dir=_dir(os.path.join(build_dir, "calibration")),
+                                                       retries=2), iterations)
+    calibration.save(calibration.measure(file_types))
+
+
+def test(file_types=FILE_TYPES, benchmarks=None, iterations=100, cores=None, seed=None, resume=False, adaptive=False,
+         configs=None, workers=None, retries=2, backend="direct", build_dir=BUILD_DIR, output="performance_data.csv",
+         store=os.path.join(DATA_DIR, "results"), journal=os.path.join(DATA_DIR, "campaign.journal"), sample_interval=None,
+         events=None):
+    from performance_test import PerformanceTester
+    from result_store import ResultStore
+    from campaign import CampaignJournal
+    from environment import EnvironmentManager
+    from calibration import HarnessCalibration
+
+    def tester(config=None, result_store=None, journal=None):
+        tester = PerformanceTester(output, result_store, backend, events, build_dir=_dir(build_dir), journal=journal, retries=retries,
+                                   environment=EnvironmentManager(cores=cores), config=config, calibration=calibration,
+                                   sample_interval=sample_interval)
+        tester.benchmarks = benchmarks
+        return tester
+
+    # None unless calibrate ran with this backend and these events
+    calibration = HarnessCalibration(PerformanceTester(backend=backend, events=events, build_dir=_dir(os.path.join(build_dir, "calibration")))).load()
+    if configs:
+        # Build matrix; every configuration gets its own averages CSV and Config in the store
+        result_store = _store(store)
+        for config in configs:
+            matrix_tester = tester(config, result_store)
+            matrix_tester.reset_and_prepare_csv()
+            matrix_tester.test_all_benchmarks_parallel(file_types, iterations, cores, seed)
+    elif workers:
+        # Coordinator and workers as processes on this machine, e.g. to try out a distributed campaign
+        from distributed import run_local
+
+        run_local(tester(result_store=_store(store)), file_types, iterations, workers, seed)
+    elif adaptive:
+        adaptive_tester = tester(result_store=_store(store))
+        adaptive_tester.reset_and_prepare_csv()
+        for file_type in file_types:
+            adaptive_tester.test_all_benchmarks(file_type, adaptive=True)
+    else:
+        campaign = CampaignJournal(journal)
+        if resume:
+            campaign_tester = tester(result_store=ResultStore(store, run_id=campaign.run_id) if store else None, journal=campaign)
+            campaign_tester.resume()
+        else:
+            campaign_tester = tester(result_store=_store(store), journal=campaign)
+            campaign.start(campaign_tester.result_store.run_id if campaign_tester.result_store is not None else None)
+            campaign_tester.reset_and_prepare_csv()
+        campaign_tester.test_all_benchmarks_parallel(file_types, iterations, cores, seed)
+
+
+def coordinate(port=5555, file_types=FILE_TYPES, benchmarks=None, iterations=100, seed=None,
+               store=os.path.join(DATA_DIR, "results"), host="127.0.0.1", token=None, job_timeout=600):
+    from performance_test import PerformanceTester
+    from environment import EnvironmentManager
+    from distributed import Coordinator
+
+    tester = PerformanceTester(result_store=_store(store), environment=EnvironmentManager())
+    tester.benchmarks = benchmarks
+    Coordinator(tester, file_types, iterations, seed, host, port, token=token, job_timeout=job_timeout).serve()
+
+
+def work(coordinator_host, port=5555, cache_dir=os.path.join(BUILD_DIR, "worker-cache"), backend="direct", token=None):
+    from distributed import Worker
+
+    Worker((coordinator_host, port), cache_dir, backend=backend, token=token).run()
+
+
+def sweep(file_types=FILE_TYPES, iterations=20):
+    from compiler import Compiler
+    from performance_test import PerformanceTester
+    from scaling import ScalingAnalysis
+
+    compiler = Compiler()
+    tester = PerformanceTester("sweep_data.csv", build_dir="../build/sweep/", iteration_csv_dir="../data/sweep/")
+    tester.warm_up_file = "coulomb_double-n1000"
+    for file_type in file_types:
+        compiler.compile_sweep(file_type)
     tester.reset_and_prepare_csv()
-    tester.test_all_benchmarks("no_extension")
-    tester.test_all_benchmarks("original")
-    tester.test_all_benchmarks("protected")
-
-
-def analysis():
-    analyser = PerformanceComparison("data/performance_data.csv")
-    analyser.plot_boxplot_comparison("Cache Misses")
-    analyser.plot_boxplot_comparison("Cache References")
-    analyser.plot_boxplot_comparison("Cycles")
-    analyser.plot_boxplot_comparison("Instructions")
-    analyser.plot_boxplot_comparison("Elapsed Time")
-    analyser.plot_boxplot_comparison("Maximum resident set size (kbytes)")
-    
-    analyser.visualize_performance_loss_distribution("Cache Misses")
-    analyser.visualize_performance_loss_distribution("Cache References")
-    analyser.visualize_performance_loss_distribution("Cycles")
-    analyser.visualize_performance_loss_distribution("Instructions")
-    analyser.visualize_performance_loss_distribution("Elapsed Time")
-    analyser.visualize_performance_loss_distribution("Maximum resident set size (kbytes)")
-
-    analyser.plot_comparison("Cache Misses")
-    analyser.plot_comparison("Cache References")
-    analyser.plot_comparison("Cycles")
-    analyser.plot_comparison("Instructions")
-    analyser.plot_comparison("Elapsed Time")
-    analyser.plot_comparison("Maximum resident set size (kbytes)")
-    
+    tester.test_all_benchmarks_parallel(file_types, iterations)
+    ScalingAnalysis("../data/sweep/").plot("Cycles")
+
+
+def profile(file_types=("original", "protected"), benchmarks=None, build_dir=BUILD_DIR, plugin_dir=None):
+    from performance_test import PerformanceTester
+
+    tester = PerformanceTester(build_dir=_dir(build_dir), plugin_dir=plugin_dir)
+    tester.benchmarks = benchmarks
+    tester.profile_all_benchmarks(file_types)
+
+
+def import_history(store=os.path.join(DATA_DIR, "results"), csv_dir=os.path.join(DATA_DIR, "csv")):
+    from result_store import ResultStore
+
+    ResultStore(store).import_csv_history(csv_dir)
+
+
+def analysis(profile="publication", lazy=False, metrics=METRICS, config="default", output_dir=os.path.join(DATA_DIR, "plt"),
+             averages=os.path.join(DATA_DIR, "performance_data.csv"), store=os.path.join(DATA_DIR, "results"), timelines=None,
+             backend=None):
+    # lazy=True streams the history in chunks instead of holding every iteration in memory
+    from analysis import PerformanceComparison
+
+    analyser = PerformanceComparison(_averages_csv(averages, config), _store(store), lazy=lazy, config=config, backend=backend)
+    analyser.plot_dir = os.path.abspath(output_dir)
+    analyser.render_all(metrics, profile)
+    for file_name in timelines or []:
+        analyser.plot_timeline(file_name, profile=profile)
+
+
+def report(metrics=OVERHEAD_METRICS, configs=None, config="default", output_dir=os.path.join(DATA_DIR, "report"),
+           averages=os.path.join(DATA_DIR, "performance_data.csv"), store=os.path.join(DATA_DIR, "results"),
+           baseline="no_extension", csv=False, backend=None):
+    # report.html and report.json; benchmark sections whose data did not change come from the cache in output_dir
+    from analysis import PerformanceComparison
+    from report import ReportGenerator
+
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    analyser = PerformanceComparison(_averages_csv(averages, config), _store(store), lazy=True, config=config, backend=backend)
+    ReportGenerator(analyser, output_dir, metrics, baseline).generate()
+    if csv:
+        analyser.save_paired_overhead(metrics, os.path.join(output_dir, "paired_overhead.csv"))
+        analyser.save_suite_overhead(metrics, os.path.join(output_dir, "suite_overhead.csv"))
+    if configs:
+        analyser.config_overhead(metrics[0], configs, baseline).to_csv(os.path.join(output_dir, "config_overhead.csv"))
+
+
+def regression(store=os.path.join(DATA_DIR, "results"), run_id=None, metric="Cycles", threshold=2.0, alpha=0.01, config="default",
+               baseline_file=os.path.join(DATA_DIR, "regression_baseline.json"), pin_baseline=None, output=None):
+    # Merge gate: prints the verdict JSON and returns its exit code (see regression.EXIT_CODES)
+    import json
+    from regression import RegressionDetector, EXIT_CODES
+    from result_store import ResultStore
+
+    detector = RegressionDetector(ResultStore(store), metric, threshold, alpha, baseline_file=baseline_file, config=config)
+    if pin_baseline:
+        detector.pin_baseline(pin_baseline)
+        return 0
+    verdict = detector.check(run_id)
+    print(json.dumps(verdict, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(verdict, f, indent=2)
+    return EXIT_CODES[verdict["verdict"]]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build, measure and analyse the xsec benchmarks under QEMU.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def common(command, file_types=FILE_TYPES, filters=True):
+        command.add_argument("--file-types", nargs="+", default=list(file_types), choices=FILE_TYPES, metavar="FILE_TYPE",
+                             help=f"File types to process (default: {' '.join(file_types)})")
+        if filters:
+            command.add_argument("--benchmarks", nargs="+", metavar="PATTERN", help="Only benchmarks matching these fnmatch patterns")
+
+    def data(command):
+        command.add_argument("--averages", default=os.path.join(DATA_DIR, "performance_data.csv"), help="Averages CSV")
+        command.add_argument("--store", default=os.path.join(DATA_DIR, "results"), help="Result store directory")
+        command.add_argument("--no-store", dest="store", action="store_const", const=None, help="Use the per-iteration CSVs")
+        command.add_argument("--config", default="default", help="Build configuration to analyse")
+        command.add_argument("--backend", choices=["direct", "shell", "perf_event", "unknown"],
+                             help="Measurement backend of the store rows to analyse (default: that of the latest run)")
+
+    command = commands.add_parser("compile", help="Build the benchmarks")
+    common(command)
+    command.add_argument("--jobs", type=int, help="Parallel compiler processes (default: number of cores)")
+    command.add_argument("--build-dir", default=BUILD_DIR)
+    command.add_argument("--matrix", nargs="*", metavar="CONFIG", help="Build these configurations of compiler.BUILD_CONFIGS (all if none given)")
+    command.add_argument("--sweep", action="store_true", help="Build the workload-size sweep")
+    command.add_argument("--calibration", action="store_true", help="Build the calibration programs")
+
+    command = commands.add_parser("test", help="Measure the benchmarks")
+    common(command)
+    command.add_argument("--iterations", type=int, default=100)
+    command.add_argument("--cores", type=int, nargs="+", help="Cores to run on (default: isolated cores or affinity mask)")
+    command.add_argument("--seed", type=int, help="Seed of the randomized schedule")
+    command.add_argument("--resume", action="store_true", help="Resume the campaign recorded in the journal")
+    command.add_argument("--adaptive", action="store_true", help="Run each binary until its confidence interval is narrow enough")
+    command.add_argument("--configs", nargs="+", metavar="CONFIG", help="Test these build configurations")
+    command.add_argument("--workers", type=int, help="Run as a local coordinator with this many worker processes")
+    command.add_argument("--retries", type=int, default=2)
+    command.add_argument("--backend", default="direct", choices=["direct", "shell", "perf_event"])
+    command.add_argument("--events", nargs="+", metavar="EVENT", help="perf events to count (default: perf_events.DEFAULT_EVENTS)")
+    command.add_argument("--build-dir", default=BUILD_DIR)
+    command.add_argument("--output", default="performance_data.csv", help="Averages CSV, relative to data/")
+    command.add_argument("--store", default=os.path.join(DATA_DIR, "results"), help="Result store directory")
+    command.add_argument("--no-store", dest="store", action="store_const", const=None, help="Write per-iteration CSVs instead")
+    command.add_argument("--journal", default=os.path.join(DATA_DIR, "campaign.journal"))
+    command.add_argument("--sample-interval", type=int, metavar="MS", help="Also sample counters and RSS every MS milliseconds")
+
+    command = commands.add_parser("analyze", help="Render the figures")
+    data(command)
+    command.add_argument("--metrics", nargs="+", default=METRICS)
+    command.add_argument("--profile", default="publication", choices=["preview", "svg", "publication"],
+                         help="Output profile, see rendering.PROFILES")
+    command.add_argument("--lazy", action="store_true", help="Stream the data in chunks instead of loading it")
+    command.add_argument("--output-dir", default=os.path.join(DATA_DIR, "plt"))
+    command.add_argument("--timelines", nargs="+", metavar="BENCHMARK", help="Also plot the sampled timelines of these benchmarks")
+
+    command = commands.add_parser("report", help="Write the HTML/JSON overhead report")
+    data(command)
+    command.add_argument("--metrics", nargs="+", default=OVERHEAD_METRICS)
+    command.add_argument("--baseline", default="no_extension", choices=FILE_TYPES, help="File type the others are compared with")
+    command.add_argument("--configs", nargs="+", metavar="CONFIG", help="Also compare these build configurations")
+    command.add_argument("--csv", action="store_true", help="Also write the paired and suite overhead tables as CSV")
+    command.add_argument("--output-dir", default=os.path.join(DATA_DIR, "report"))
+
+    command = commands.add_parser("calibrate", help="Measure the harness and QEMU startup overhead")
+    common(command, filters=False)
+    command.add_argument("--iterations", type=int, default=30)
+    command.add_argument("--build-dir", default=BUILD_DIR)
+    command.add_argument("--backend", default="direct", choices=["direct", "shell", "perf_event"],
+                         help="Backend of the campaigns the calibration is for")
+    command.add_argument("--events", nargs="+", metavar="EVENT", help="perf events of the campaigns the calibration is for")
+
+    command = commands.add_parser("environment", help="Check (and with --apply set) the machine settings")
+    command.add_argument("--apply", action="store_true", help="Set governor, turbo and ASLR; needs root")
+    command.add_argument("--cpuset", help="Also isolate the benchmark cores in this cgroup v2 cpuset")
+    command.add_argument("--cores", type=int, nargs="+", help="Cores the test run uses (default: isolated cores or affinity mask)")
+    command.add_argument("--strict", action="store_true",
+                         help="Exit with 1 if the settings differ from the baseline or from the wanted state")
+
+    command = commands.add_parser("coordinate", help="Distribute a campaign over workers")
+    common(command)
+    command.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: this machine only; 0.0.0.0 for all interfaces)")
+    command.add_argument("--port", type=int, default=5555)
+    command.add_argument("--token", default=os.environ.get(TOKEN_VARIABLE),
+                         help=f"Shared secret of the workers (default: ${TOKEN_VARIABLE}, or a random one that is printed)")
+    command.add_argument("--job-timeout", type=float, default=600, help="Seconds before the block of a silent worker is requeued")
+    command.add_argument("--iterations", type=int, default=100)
+    command.add_argument("--seed", type=int)
+    command.add_argument("--store", default=os.path.join(DATA_DIR, "results"))
+
+    command = commands.add_parser("work", help="Run blocks for a coordinator")
+    command.add_argument("host", help="Coordinator host")
+    command.add_argument("--port", type=int, default=5555)
+    command.add_argument("--cache-dir", default=os.path.join(BUILD_DIR, "worker-cache"))
+    command.add_argument("--backend", default="direct", choices=["direct", "shell", "perf_event"])
+    command.add_argument("--token", default=os.environ.get(TOKEN_VARIABLE),
+                         help=f"Token printed by the coordinator (default: ${TOKEN_VARIABLE})")
+
+    command = commands.add_parser("sweep", help="Build and measure the workload-size sweep")
+    common(command, filters=False)
+    command.add_argument("--iterations", type=int, default=20)
+
+    command = commands.add_parser("profile", help="Profile the benchmarks with QEMU TCG plugins")
+    common(command, ("original", "protected"))
+    command.add_argument("--build-dir", default=BUILD_DIR)
+    command.add_argument("--plugin-dir", help="QEMU build tree of the TCG plugins (default: that of each file type's QEMU)")
+
+    command = commands.add_parser("regression", help="Check the protected-variant overhead of a run for regressions",
+                                  description="Exit codes: 0 pass, 1 regression, 3 no baseline, 4 unknown run.")
+    command.add_argument("--store", default=os.path.join(DATA_DIR, "results"))
+    command.add_argument("--run-id", help="Run to check (default: the most recent)")
+    command.add_argument("--metric", default="Cycles")
+    command.add_argument("--threshold", type=float, default=2.0, help="Overhead increase in percentage points")
+    command.add_argument("--alpha", type=float, default=0.01)
+    command.add_argument("--config", default="default", help="Build configuration to check")
+    command.add_argument("--baseline-file", default=os.path.join(DATA_DIR, "regression_baseline.json"),
+                         help="JSON file with the pinned baseline runs")
+    command.add_argument("--pin-baseline", metavar="RUN_ID", help="Pin RUN_ID as the baseline and exit")
+    command.add_argument("--output", help="Also write the verdict JSON to this file")
+
+    command = commands.add_parser("import-history", help="Import the per-iteration CSVs into the result store")
+    command.add_argument("--store", default=os.path.join(DATA_DIR, "results"))
+    command.add_argument("--csv-dir", default=os.path.join(DATA_DIR, "csv"))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "compile":
+        compile(args.file_types, args.benchmarks, args.jobs, args.build_dir, args.matrix, args.sweep, args.calibration)
+    elif args.command == "test":
+        test(args.file_types, args.benchmarks, args.iterations, args.cores, args.seed, args.resume, args.adaptive, args.configs,
+             args.workers, args.retries, args.backend, args.build_dir, args.output, args.store, args.journal, args.sample_interval,
+             args.events)
+    elif args.command == "analyze":
+        analysis(args.profile, args.lazy, args.metrics, args.config, args.output_dir, args.averages, args.store, args.timelines, args.backend)
+    elif args.command == "report":
+        report(args.metrics, args.configs, args.config, args.output_dir, args.averages, args.store, args.baseline, args.csv, args.backend)
+    elif args.command == "calibrate":
+        calibrate(args.file_types, args.iterations, args.build_dir, args.backend, args.events)
+    elif args.command == "environment":
+        return prepare_environment(args.apply, args.cpuset, args.cores, args.strict)
+    elif args.command == "coordinate":
+        coordinate(args.port, args.file_types, args.benchmarks, args.iterations, args.seed, args.store, args.host, args.token,
+                   args.job_timeout)
+    elif args.command == "work":
+        work(args.host, args.port, args.cache_dir, args.backend, args.token)
+    elif args.command == "sweep":
+        sweep(args.file_types, args.iterations)
+    elif args.command == "profile":
+        profile(args.file_types, args.benchmarks, args.build_dir, args.plugin_dir)
+    elif args.command == "regression":
+        return regression(args.store, args.run_id, args.metric, args.threshold, args.alpha, args.config, args.baseline_file,
+                          args.pin_baseline, args.output)
+    elif args.command == "import-history":
+        import_history(args.store, args.csv_dir)
+    return 0
+
 
 if __name__ == '__main__':
-    # compile()
-    # test()
-    analysis()
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import ctypes
+import errno
+import os
+import signal
+import struct
+import time
+
+
+PERF_TYPE_HARDWARE = 0
+PERF_TYPE_SOFTWARE = 1
+PERF_TYPE_HW_CACHE = 3
+
+PERF_FORMAT_TOTAL_TIME_ENABLED = 1 << 0
+PERF_FORMAT_TOTAL_TIME_RUNNING = 1 << 1
+
+# perf_event_attr flag bits
+ATTR_DISABLED = 1 << 0
+ATTR_INHERIT = 1 << 1
+ATTR_EXCLUDE_KERNEL = 1 << 5
+ATTR_EXCLUDE_HV = 1 << 6
+ATTR_ENABLE_ON_EXEC = 1 << 12
+
+PERF_FLAG_FD_CLOEXEC = 1 << 3
+
+SYS_PERF_EVENT_OPEN = {"x86_64": 298, "aarch64": 241, "riscv64": 241, "ppc64le": 319, "s390x": 331}
+
+# Events already reported as missing, so a campaign prints every failure once rather than once per run
+_reported_missing = set()
+
+
+def _hw_cache(cache, op, result):
+    return cache | (op << 8) | (result << 16)
+
+
+# perf event name -> (type, config, metric name)
+EVENTS = {
+    "cycles": (PERF_TYPE_HARDWARE, 0, "Cycles"),
+    "instructions": (PERF_TYPE_HARDWARE, 1, "Instructions"),
+    "cache-references": (PERF_TYPE_HARDWARE, 2, "Cache References"),
+    "cache-misses": (PERF_TYPE_HARDWARE, 3, "Cache Misses"),
+    "branch-instructions": (PERF_TYPE_HARDWARE, 4, "Branch Instructions"),
+    "branch-misses": (PERF_TYPE_HARDWARE, 5, "Branch Misses"),
+    "L1-dcache-load-misses": (PERF_TYPE_HW_CACHE, _hw_cache(0, 0, 1), "L1 Dcache Load Misses"),
+    "LLC-load-misses": (PERF_TYPE_HW_CACHE, _hw_cache(2, 0, 1), "LLC Load Misses"),
+    "dTLB-load-misses": (PERF_TYPE_HW_CACHE, _hw_cache(3, 0, 1), "dTLB Load Misses"),
+    "iTLB-load-misses": (PERF_TYPE_HW_CACHE, _hw_cache(4, 0, 1), "iTLB Load Misses"),
+    "cpu-clock": (PERF_TYPE_SOFTWARE, 0, "CPU Clock"),
+    "task-clock": (PERF_TYPE_SOFTWARE, 1, "Task Clock"),
+    "page-faults": (PERF_TYPE_SOFTWARE, 2, "Page Faults"),
+    "context-switches": (PERF_TYPE_SOFTWARE, 3, "Context Switches"),
+    "cpu-migrations": (PERF_TYPE_SOFTWARE, 4, "CPU Migrations"),
+}
+
+DEFAULT_EVENTS = ["cycles", "instructions", "cache-misses", "cache-references"]
+
+# Used when the hardware PMU is unavailable, e.g. inside most VMs
+SOFTWARE_EVENTS = ["task-clock", "context-switches", "cpu-migrations", "page-faults"]
+
+# Counted alongside the configured events for the per-run noise score
+NOISE_EVENTS = ["cpu-migrations"]
+
+
+class PerfEventAttr(ctypes.Structure):
+    # PERF_ATTR_SIZE_VER0 layout; the kernel accepts any published size
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("size", ctypes.c_uint32),
+        ("config", ctypes.c_uint64),
+        ("sample_period", ctypes.c_uint64),
+        ("sample_type", ctypes.c_uint64),
+        ("read_format", ctypes.c_uint64),
+        ("flags", ctypes.c_uint64),
+        ("wakeup_events", ctypes.c_uint32),
+        ("bp_type", ctypes.c_uint32),
+        ("config1", ctypes.c_uint64),
+    ]
+
+
+class PerfEventCounter:
+    def __init__(self, events=None, groups=None, exclude_kernel=False):
+        """
+        Counts perf events of a child process by calling perf_event_open directly.
+
+        :param events: Event names from EVENTS, counted in one group. Defaults to DEFAULT_EVENTS.
+        :param groups: List of event name lists; each list is scheduled on the PMU as one group.
+                       Overrides events.
+        :param exclude_kernel: Count user space only.
+        """
+        self.groups = groups or [list(events or DEFAULT_EVENTS)]
+        self.exclude_kernel = exclude_kernel
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.syscall_number = SYS_PERF_EVENT_OPEN.get(os.uname().machine)
+
+
+    def measure(self, argv, cwd=None):
+        """
+        Runs argv and counts its events, including those of its threads and child processes.
+        An event the kernel refuses to count with the kernel included (perf_event_paranoid >= 2) is counted in user
+        space only. Falls back to SOFTWARE_EVENTS when no hardware event can be opened. Events that cannot be opened
+        or were never scheduled are reported with the reason and left out of the counters; raises RuntimeError
+        if no event at all can be opened.
+
+        Returns (exit code, rusage, elapsed seconds, {metric: scaled value}, multiplexing ratio), where the
+        multiplexing ratio is the smallest fraction of the run any counted event was actually counted, or None
+        when no event was counted.
+        """
+        self.errors = {}
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Child: wait until the counters are attached, then exec; counting starts at exec
+            try:
+                os.close(write_fd)
+                os.read(read_fd, 1)
+                devnull = os.open(os.devnull, os.O_WRONLY)
+                os.dup2(devnull, 1)
+                if cwd:
+                    os.chdir(cwd)
+                os.execvp(argv[0], argv)
+            finally:
+                os._exit(127)
+
+        os.close(read_fd)
+        fds = []
+        try:
+            fds = self.__open_groups(pid, self.groups)
+            wants_hardware = any(EVENTS[name][0] != PERF_TYPE_SOFTWARE for group in self.groups for name in group)
+            if wants_hardware and not any(EVENTS[name][0] != PERF_TYPE_SOFTWARE for name, _ in fds):
+                self.__close(fds)
+                fds = self.__open_groups(pid, [SOFTWARE_EVENTS])
+        except BaseException:
+            self.__close(fds)
+            fds = []
+            raise
+        finally:
+            if fds:
+                start = time.perf_counter()
+                os.write(write_fd, b"x")
+                os.close(write_fd)
+            else:
+                # Nothing to count with: the child is not started
+                os.close(write_fd)
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+        if not fds:
+            raise RuntimeError("perf_event_open failed for every event: " + self.__describe(self.errors))
+        _, status, rusage = os.wait4(pid, 0)
+        elapsed = time.perf_counter() - start
+
+        counters = {}
+        multiplexing_ratio = None
+        for name, fd in fds:
+            value, enabled, running = struct.unpack("QQQ", os.read(fd, 24))
+            if running == 0:
+                if enabled:
+                    self.errors.setdefault(name, "never scheduled on the PMU")
+                continue
+            # Scale for the time the event was multiplexed out
+            counters[EVENTS[name][2]] = value * enabled / running
+            multiplexing_ratio = min(multiplexing_ratio or 1.0, running / enabled)
+        self.__close(fds)
+        self.__report_missing({name: error for name, error in self.errors.items() if EVENTS[name][2] not in counters})
+        return os.waitstatus_to_exitcode(status), rusage, elapsed, counters, multiplexing_ratio
+
+
+    def __open_groups(self, pid, groups):
+        fds = []
+        for group in groups:
+            leader = -1
+            for name in group:
+                fd = self.__open(name, pid, leader)
+                if fd < 0:
+                    continue
+                if leader == -1:
+                    leader = fd
+                fds.append((name, fd))
+        return fds
+
+
+    def __open(self, name, pid, group_fd):
+        if self.syscall_number is None:
+            self.errors[name] = f"no perf_event_open syscall number for {os.uname().machine}"
+            return -1
+        event_type, config, _ = EVENTS[name]
+        attr = PerfEventAttr()
+        attr.type = event_type
+        attr.size = ctypes.sizeof(PerfEventAttr)
+        attr.config = config
+        attr.read_format = PERF_FORMAT_TOTAL_TIME_ENABLED | PERF_FORMAT_TOTAL_TIME_RUNNING
+        attr.flags = ATTR_INHERIT | ATTR_EXCLUDE_HV
+        if self.exclude_kernel:
+            attr.flags |= ATTR_EXCLUDE_KERNEL
+        if group_fd == -1:
+            # Only the leader is enabled on exec; members follow it
+            attr.flags |= ATTR_DISABLED | ATTR_ENABLE_ON_EXEC
+        fd = self.__syscall(attr, pid, group_fd)
+        error = ctypes.get_errno()
+        if fd < 0 and error in (errno.EACCES, errno.EPERM) and not attr.flags & ATTR_EXCLUDE_KERNEL:
+            # perf_event_paranoid >= 2 only allows counting user space
+            attr.flags |= ATTR_EXCLUDE_KERNEL
+            fd = self.__syscall(attr, pid, group_fd)
+            error = ctypes.get_errno()
+        if fd < 0:
+            hint = ", see /proc/sys/kernel/perf_event_paranoid" if error in (errno.EACCES, errno.EPERM) else ""
+            self.errors[name] = f"{os.strerror(error)} (errno {error}){hint}"
+        return fd
+
+
+    def __syscall(self, attr, pid, group_fd):
+        ctypes.set_errno(0)
+        return self.libc.syscall(ctypes.c_long(self.syscall_number), ctypes.byref(attr), ctypes.c_long(pid), ctypes.c_long(-1),
+                                 ctypes.c_long(group_fd), ctypes.c_ulong(PERF_FLAG_FD_CLOEXEC))
+
+
+    def __report_missing(self, errors):
+        # Missing events are left out of the counters, so they show up as N/A instead of as a clean measurement
+        new = {name: error for name, error in errors.items() if name not in _reported_missing}
+        if new:
+            print("* [Missing] perf events not counted: " + self.__describe(new))
+            _reported_missing.update(new)
+
+
+    def __describe(self, errors):
+        return "; ".join(f"{name}: {error}" for name, error in errors.items())
+
+
+    def __close(self, fds):
+        for _, fd in fds:
+            os.close(fd)
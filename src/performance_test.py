@@ -1,90 +1,624 @@
 import csv
+import fnmatch
+import itertools
+import json
+import multiprocessing
 import os
+import random
 import re
+import statistics
 import subprocess
-import pandas as pd
+import time
+import numpy as np
+from perf_events import *
+from environment import *
+from robust_stats import *
+from calibration import *
+from sampling import *
+
+
+_worker_tester = None
+
+
+def _pin_worker(tester, core_queue):
+    """
+    Pool initializer: pins the worker process to one core taken from the queue, so every worker owns its own CPU.
+    """
+    global _worker_tester
+    os.sched_setaffinity(0, {core_queue.get()})
+    _worker_tester = tester
+
+
+def _run_block(block):
+    # The runs of a block go back to back on this worker's core, so its pairs share the machine state
+    return [(job, _worker_tester.run_once(job[0], job[1])) for job in block]
+
 
 class PerformanceTester:
-    def __init__(self, output_csv="performance_data.csv"):
-        self.sec_extension_command = "/usr/bin/time -v perf stat -e cycles,instructions,cache-misses,cache-references qemu-riscv64 "
-        self.no_extension_command = "/usr/bin/time -v perf stat -e cycles,instructions,cache-misses,cache-references $HOME/tools/evaluation/qemu/build/qemu-riscv64 "
-        self.relative_work_dir = "../build/"
-        self.output_csv = "../data/" + output_csv
+    def __init__(self, output_csv="performance_data.csv", result_store=None, backend="direct", events=None,
+                 build_dir="../build/", iteration_csv_dir="../data/csv/", journal=None, retries=0, environment=None,
+                 config=None, calibration=None, sample_interval=None, plugin_dir=None):
+        self.sec_extension_command = "/usr/bin/time -v perf stat -e cycles,instructions,cache-misses,cache-references,cpu-migrations qemu-riscv64 "
+        self.no_extension_command = "/usr/bin/time -v perf stat -e cycles,instructions,cache-misses,cache-references,cpu-migrations $HOME/tools/evaluation/qemu/build/qemu-riscv64 "
+        self.sec_extension_qemu = "qemu-riscv64"
+        self.no_extension_qemu = os.path.expandvars("$HOME/tools/evaluation/qemu/build/qemu-riscv64")
+        # "direct" execs perf with an argv list and reads rusage from wait4, "shell" goes through /bin/sh and /usr/bin/time -v,
+        # "perf_event" counts in-process with perf_event_open
+        self.backend = backend
+        # Event names from perf_events.EVENTS, used by the "direct" and "perf_event" backends
+        self.events = list(events or DEFAULT_EVENTS)
+        self.relative_work_dir = build_dir
+        self.iteration_csv_dir = iteration_csv_dir
+        # Build configuration (see compiler.BUILD_CONFIGS); its binaries, per-iteration CSVs and averages live in
+        # <config> subdirectories / suffixed files, and result store rows carry it in the Config column
+        self.config = config or "default"
+        if config:
+            self.relative_work_dir = os.path.join(build_dir, config) + "/"
+            self.iteration_csv_dir = os.path.join(iteration_csv_dir, config) + "/"
+            output_csv = os.path.splitext(output_csv)[0] + f"-{config}.csv"
+        self.warm_up_file = "coulomb_double"
+        # Optional fnmatch patterns; only benchmarks matching one of them are tested or profiled
+        self.benchmarks = None
+        # Statistic the averages CSV holds per binary: 'median', 'trimmed_mean' or 'mean' (see robust_stats.summarize)
+        self.statistic = "median"
+        # QEMU build tree holding the TCG plugins used by profile(). Plugins only load into the QEMU they were built
+        # with, so by default every file type uses the build directory of its own QEMU binary
+        self.plugin_dir = plugin_dir
+        self.profile_dir = "../data/profile/"
+        self.output_csv = os.path.join("../data/", output_csv)
+        self.workload_csv = os.path.splitext(self.output_csv)[0] + "-workload.csv"
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
         self.work_dir = os.path.join(self.script_dir)
 
-        self.headers = ["File Name", "File Type", "Cycles", "Instructions", "Cache Misses", "Cache References", "Elapsed Time", "User Time", "System Time", "CPU Percentage", "Maximum resident set size (kbytes)"]
+        self.headers = ["File Name", "File Type", "Cycles", "Instructions", "Cache Misses", "Cache References", "Elapsed Time", "User Time", "System Time", "CPU Percentage", "Maximum resident set size (kbytes)", "Noise Score"]
+
+        # Optional ResultStore; when set, per-iteration rows go to it instead of data/csv
+        self.result_store = result_store
+        # Optional CampaignJournal; completed iterations are recorded in it and skipped when resuming
+        self.journal = journal
+        # Extra attempts for a failing iteration before the benchmark counts as failed
+        self.retries = retries
+        # Optional EnvironmentManager; the machine settings are checked against the baseline and recorded before testing
+        self.environment = environment
+        # Optional calibration (HarnessCalibration.load()); averages are then also written with the harness and QEMU
+        # startup baseline subtracted to workload_csv, and benchmarks too short to measure are flagged
+        self.calibration = calibration
+        if calibration is not None and not measured_like(calibration, backend, self.events):
+            raise ValueError(f"The calibration was not measured with backend {backend} and events {','.join(self.events)}")
+        # Sampling mode: with an interval in milliseconds, the direct backend also records counters (perf stat -I) and
+        # the RSS of QEMU at that interval during every run; the series go to the result store (see load_series)
+        self.sample_interval = sample_interval
+        if sample_interval and (backend != "direct" or result_store is None):
+            raise ValueError("Sampling needs the direct backend and a result store")
+        if sample_interval and not children_supported():
+            raise RuntimeError("Sampling needs /proc/<pid>/task/<tid>/children to find QEMU (kernel built with CONFIG_PROC_CHILDREN)")
 
         self.success = []
         self.failed = []
 
     def test(self, file_name, file_type, iterations):
         """
-        Tests a given file multiple times, computes the average of the performance metrics, and writes the results to the CSV file.
+        Tests a given file multiple times, summarizes the performance metrics (see statistic), and writes the results to the CSV file.
         
         :param file_name: Name of the file to test.
         :param file_type: Type of the file ('original' or 'protected').
         :param iterations: Number of iterations to run the test and compute the average.
         """
-        # Initialize dictionary to sum up the metrics
-        metrics_sum = {
-            "Cycles": 0, "Instructions": 0, "Cache Misses": 0, "Cache References": 0,
-            "Elapsed Time": 0.0, "User Time": 0.0, "System Time": 0.0,
-            "CPU Percentage": 0, "Maximum resident set size (kbytes)": 0
-        }
-        successful_runs = 0
-        
-        command = ""
-        if file_type == "no_extension":
-            command = self.no_extension_command
-        else:
-            command = self.sec_extension_command
+        # Collect the metrics of every run for summarizing later
+        samples = []
+        completed = self.journal.iterations(file_name, file_type) if self.journal else {}
 
         for _ in range(iterations):
-            # Execute the test command
-            process = subprocess.Popen(command + self.relative_work_dir + file_type + "/" + file_name, 
-                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=self.work_dir, shell=True)
-            stdout, stderr = process.communicate()
-
-            if process.returncode == 0:
-                # Parse the performance metrics from stderr
-                result = self.__parse_output(stdout, stderr)
-                successful_runs += 1
-                
-                cleaned_result = {key: float(value.replace(',', '')) for key, value in result.items() if value != "N/A"}
-                self.__save_iteration_data_to_csv(file_name, file_type, _+1, cleaned_result)
-                
-                # Sum up the metrics for averaging later
-                for key, value in result.items():
-                    if value != "N/A":
-                        metrics_sum[key] += float(value.replace(',', ''))
+            if _+1 in completed:
+                cleaned_result = completed[_+1]  # Already measured before the campaign was interrupted
+            else:
+                cleaned_result = self.run_once(file_name, file_type)
+                if cleaned_result is not None:
+                    self.__record_iteration(file_name, file_type, _+1, cleaned_result)
+            if cleaned_result is not None:
+                samples.append(cleaned_result)
             else:
                 print("* [Failed] " + file_name)
                 self.failed.append(file_name)
                 return  # Stop testing this file after a failure
         
         # Only proceed if there were successful test runs
-        if successful_runs > 0:
-            # Calculate average of the metrics
-            avg_metrics = {key: value / successful_runs for key, value in metrics_sum.items()}
+        if samples:
+            # Robust summary of the metrics, so a preempted iteration does not skew it
+            avg_metrics = self.__summarize(file_name, samples)
             
             print("[Success] " + file_name)
             self.success.append(file_name)
             
             # Write the averaged metrics to CSV
-            self.__write_to_csv(avg_metrics, file_name, file_type)
+            self.__write_average(avg_metrics, file_name, file_type)
         
 
-    def test_all_benchmarks(self, file_type):
+    def test_adaptive(self, file_name, file_type, metrics=("Cycles", "Elapsed Time"), relative_width=0.01,
+                      min_iterations=10, max_iterations=100, confidence=0.95):
+        """
+        Tests a given file until the bootstrap confidence interval of the median of every chosen metric is narrower
+        than relative_width times the median, bounded by min_iterations and max_iterations. Results are written
+        the same way as test() writes them.
+
+        :param file_name: Name of the file to test.
+        :param file_type: Type of the file ('no_extension', 'original' or 'protected').
+        :param metrics: Metrics whose median must be estimated precisely before stopping.
+        :param relative_width: Maximum CI width relative to the median, e.g. 0.01 for 1%.
+        :param min_iterations: Iterations to run before checking the stopping rule.
+        :param max_iterations: Hard upper bound on iterations.
+        :param confidence: Confidence level of the interval.
+        """
+        samples = []
+        completed = self.journal.iterations(file_name, file_type) if self.journal else {}
+        for iteration in range(1, max_iterations + 1):
+            cleaned_result = completed.get(iteration) or self.run_once(file_name, file_type)
+            if cleaned_result is None:
+                print("* [Failed] " + file_name)
+                self.failed.append(file_name)
+                return
+            if iteration not in completed:
+                self.__record_iteration(file_name, file_type, iteration, cleaned_result)
+            samples.append(cleaned_result)
+            if iteration >= min_iterations and self.__is_precise(samples, metrics, relative_width, confidence):
+                break
+
+        avg_metrics = self.__summarize(file_name, samples)
+        print(f"[Success] {file_name} ({len(samples)} iterations)")
+        self.success.append(file_name)
+        self.__write_average(avg_metrics, file_name, file_type)
+
+
+    def __summarize(self, file_name, samples):
+        """
+        Summarizes the iterations of a binary with self.statistic and reports the MAD outliers of the timing metrics.
+        """
+        for metric in ["Cycles", "Elapsed Time"]:
+            values = [sample[metric] for sample in samples if metric in sample]
+            outliers = int(outlier_mask(values).sum()) if values else 0
+            if outliers:
+                print(f"* [Outliers] {file_name}: {outliers} of {len(values)} iterations in {metric}")
+        return summarize(samples, self.statistic)
+
+
+    def __is_precise(self, samples, metrics, relative_width, confidence):
+        for metric in metrics:
+            values = [sample[metric] for sample in samples if metric in sample]
+            if not values:
+                continue
+            median = np.median(values)
+            low, high = median_ci(values, confidence)
+            if median == 0 or (high - low) / abs(median) > relative_width:
+                return False
+        return True
+
+
+    def warm_up_until_stable(self, file_name, file_type, metric="Elapsed Time", window=5, tolerance=0.02,
+                             max_iterations=50):
+        """
+        Runs warm-up iterations until the series stabilises: the median of the last window of runs differs from
+        the median of the window before it by less than tolerance (relative). Returns the number of runs used.
+
+        :param file_name: Name of the test file.
+        :param file_type: Type of test file ('no_extension', 'original' or 'protected').
+        :param metric: Metric whose series is watched.
+        :param window: Number of runs per comparison window.
+        :param tolerance: Maximum relative change between consecutive window medians.
+        :param max_iterations: Upper bound on warm-up runs.
+        """
+        print(f"Starting warm-up for {file_name} (until {metric} stabilises)...")
+        series = []
+        for _ in range(max_iterations):
+            result = self.run_once(file_name, file_type)
+            if result is not None and metric in result:
+                series.append(result[metric])
+            if len(series) >= 2 * window:
+                previous = np.median(series[-2 * window:-window])
+                current = np.median(series[-window:])
+                if previous != 0 and abs(current - previous) / abs(previous) < tolerance:
+                    break
+        print(f"Warm-up completed after {len(series)} runs.")
+        return len(series)
+
+
+    def run_once(self, file_name, file_type):
+        """
+        Runs a single iteration of a benchmark and returns its parsed metrics, or None if the run failed
+        on every one of the 1 + retries attempts.
+
+        :param file_name: Name of the file to test.
+        :param file_type: Type of the file ('no_extension', 'original' or 'protected').
+        """
+        for attempt in range(self.retries + 1):
+            result = self.__run_attempt(file_name, file_type)
+            if result is not None:
+                return result
+            if attempt < self.retries:
+                print(f"* [Retry] {file_name} ({file_type}), attempt {attempt + 2} of {self.retries + 1}")
+        return None
+
+
+    def __run_attempt(self, file_name, file_type):
+        if self.backend == "direct":
+            return self.__run_direct(file_name, file_type)
+        if self.backend == "perf_event":
+            return self.__run_perf_event(file_name, file_type)
+
+        command = ""
+        if file_type == "no_extension":
+            command = self.no_extension_command
+        else:
+            command = self.sec_extension_command
+
+        # Execute the test command
+        process = subprocess.Popen(command + self.relative_work_dir + file_type + "/" + file_name, 
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=self.work_dir, shell=True)
+        stdout, stderr = process.communicate()
+        if process.returncode != 0:
+            return None
+
+        # Parse the performance metrics from stderr
+        result = self.__parse_output(stdout, stderr)
+        return self.__add_noise_score({key: float(value.replace(',', '')) for key, value in result.items() if value != "N/A"})
+
+
+    def __run_direct(self, file_name, file_type):
+        """
+        Runs perf stat -x directly (no shell, no /usr/bin/time) and takes RSS and user/system time from wait4's rusage,
+        which covers perf and the reaped qemu process.
+        """
+        qemu = self.no_extension_qemu if file_type == "no_extension" else self.sec_extension_qemu
+        binary = os.path.join(self.work_dir, self.relative_work_dir, file_type, file_name)
+        interval = ["-I", str(self.sample_interval)] if self.sample_interval else []
+        argv = ["perf", "stat", "-x", ","] + interval + ["-e", ",".join(self.events + [event for event in NOISE_EVENTS if event not in self.events]), qemu, binary]
+
+        start = time.perf_counter()
+        process = subprocess.Popen(argv, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, cwd=self.work_dir)
+        sampler = RssSampler(process.pid, self.sample_interval / 1000).start() if self.sample_interval else None
+        stderr = process.stderr.read()
+        _, status, rusage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        process.stderr.close()
+        process.returncode = os.waitstatus_to_exitcode(status)
+        rss = sampler.stop() if sampler else None
+        if process.returncode != 0:
+            return None
+
+        if not self.sample_interval:
+            return self.__add_noise_score(self.__collect_metrics(self.__parse_perf_csv(stderr), rusage, elapsed))
+        # perf stat -I prints no totals; they are the sums of the intervals
+        series = parse_interval_csv(stderr)
+        counters = {metric: float(values.sum()) for metric, values in series.items() if metric != "Counter Time"}
+        metrics = self.__add_noise_score(self.__collect_metrics(counters, rusage, elapsed))
+        series.update(rss)
+        metrics[SERIES_KEY] = series
+        return metrics
+
+
+    def __run_perf_event(self, file_name, file_type):
+        """
+        Counts the configured events with perf_event_open in this process, no perf binary involved.
+        Adds the multiplexing ratio so runs where events were time-shared on the PMU can be spotted.
+        """
+        qemu = self.no_extension_qemu if file_type == "no_extension" else self.sec_extension_qemu
+        binary = os.path.join(self.work_dir, self.relative_work_dir, file_type, file_name)
+        returncode, rusage, elapsed, counters, multiplexing_ratio = PerfEventCounter(groups=[self.events, NOISE_EVENTS]).measure([qemu, binary], cwd=self.work_dir)
+        if returncode != 0:
+            return None
+        metrics = self.__collect_metrics(counters, rusage, elapsed)
+        if multiplexing_ratio is not None:
+            metrics["Multiplexing Ratio"] = multiplexing_ratio
+        return self.__add_noise_score(metrics)
+
+
+    def __collect_metrics(self, counters, rusage, elapsed):
+        measured = {
+            "Elapsed Time": elapsed,
+            "User Time": rusage.ru_utime,
+            "System Time": rusage.ru_stime,
+            "CPU Percentage": float(round((rusage.ru_utime + rusage.ru_stime) / elapsed * 100)),
+            "Maximum resident set size (kbytes)": float(rusage.ru_maxrss),
+            "Involuntary Context Switches": float(rusage.ru_nivcsw),
+        }
+        measured.update(counters)
+        # Keep the column order of the shell backend so per-iteration CSV headers stay the same; extra events go last
+        ordered = {key: measured.pop(key) for key in self.headers[2:] if key in measured}
+        ordered.update(measured)
+        return ordered
+
+
+    def __add_noise_score(self, metrics):
+        """
+        Adds the noise score of a run: involuntary context switches plus CPU migrations per second, i.e. how often
+        other work preempted or moved the benchmark. 0 on a quiet, isolated core.
+        """
+        if "Involuntary Context Switches" in metrics and metrics.get("Elapsed Time"):
+            disturbances = metrics["Involuntary Context Switches"] + metrics.get("CPU Migrations", 0)
+            metrics["Noise Score"] = disturbances / metrics["Elapsed Time"]
+        return metrics
+
+
+    def __parse_perf_csv(self, output):
+        """
+        Parses `perf stat -x ,` output (value,unit,event,...). Hybrid CPUs report one line per core type
+        (e.g. cpu_core/cycles/), which are summed.
+        """
+        counters = {}
+        for line in output.splitlines():
+            fields = line.split(",")
+            if len(fields) < 3:
+                continue
+            event = fields[2].split(":")[0]
+            if "/" in event:
+                event = event.strip("/").split("/")[-1]
+            if event in EVENTS:
+                try:
+                    value = float(fields[0])
+                except ValueError:
+                    continue  # <not counted> or <not supported>
+                metric = EVENTS[event][2]
+                counters[metric] = counters.get(metric, 0.0) + value
+        return counters
+
+
+    def compare_backends(self, file_name, file_type, iterations=20):
+        """
+        Runs a file with both backends and prints the mean and standard deviation of Elapsed Time for each,
+        to quantify the harness overhead removed by the direct backend.
+
+        :param file_name: Name of the file to test.
+        :param file_type: Type of the file ('no_extension', 'original' or 'protected').
+        :param iterations: Number of runs per backend.
+        """
+        backend = self.backend
+        summary = {}
+        for candidate in ["shell", "direct"]:
+            self.backend = candidate
+            elapsed = [result["Elapsed Time"] for result in (self.run_once(file_name, file_type) for _ in range(iterations))
+                       if result is not None and "Elapsed Time" in result]
+            if len(elapsed) > 1:
+                summary[candidate] = (statistics.mean(elapsed), statistics.stdev(elapsed))
+                print(f"{candidate}: mean {summary[candidate][0]:.6f}s, stdev {summary[candidate][1]:.6f}s ({len(elapsed)} runs)")
+        self.backend = backend
+        return summary
+
+
+    def profile(self, file_name, file_types=("original", "protected")):
+        """
+        Profiles a benchmark at guest level with QEMU TCG plugins and writes, to profile_dir, the per-function guest
+        instruction histogram and hot pages of every file type plus the per-function diff of the last file type
+        against the first. Functions are attributed from the hottest blocks only (see guest_profile.HOTBLOCKS_LIMIT);
+        the remaining instructions are kept as one separate row. Returns the diff, or None if a run failed.
+
+        :param file_name: Name of the file to profile.
+        :param file_types: The baseline and the candidate file type.
+        """
+        from guest_profile import GuestProfiler, HOTBLOCKS_LIMIT, coverage, function_diff, qemu_build_dir  # pandas is only needed here, not for timing runs
+
+        output_dir = os.path.join(self.work_dir, self.profile_dir)
+        os.makedirs(output_dir, exist_ok=True)
+        histograms = {}
+        totals = {}
+        for file_type in file_types:
+            qemu = self.no_extension_qemu if file_type == "no_extension" else self.sec_extension_qemu
+            binary = os.path.join(self.work_dir, self.relative_work_dir, file_type, file_name)
+            profiler = GuestProfiler(self.plugin_dir or qemu_build_dir(qemu))
+            result = profiler.run(qemu, binary, cwd=self.work_dir)
+            if result is None:
+                print("* [Failed] " + file_name + " (" + file_type + ")")
+                self.failed.append(file_name)
+                return None
+            totals[file_type], blocks, pages = result
+            histograms[file_type] = profiler.function_histogram(binary, blocks, totals[file_type])
+            histograms[file_type].to_csv(os.path.join(output_dir, f"{file_name}-{file_type}-functions.csv"))
+            pages.to_csv(os.path.join(output_dir, f"{file_name}-{file_type}-pages.csv"), index=False)
+            covered = coverage(histograms[file_type])
+            if covered is not None:
+                print(f"{file_name} ({file_type}): {totals[file_type]} guest instructions, {covered:.1f}% of them in the top "
+                      f"{HOTBLOCKS_LIMIT} blocks attributed to functions")
+            else:
+                print(f"* [Partial] {file_name} ({file_type}): no instruction total from the insn plugin; the functions cover the "
+                      f"top {HOTBLOCKS_LIMIT} blocks only, with unknown coverage")
+
+        diff = function_diff(histograms, totals, file_types[0], file_types[-1])
+        diff.to_csv(os.path.join(output_dir, f"{file_name}-diff.csv"), index=False)
+        print("[Success] " + file_name)
+        self.success.append(file_name)
+        return diff
+
+
+    def profile_all_benchmarks(self, file_types=("original", "protected")):
         self.success = []
         self.failed = []
-        self.warm_up("coulomb_double", file_type, 20)
+        for file_name in self.benchmark_names(file_types[-1]):
+            self.profile(file_name, file_types)
+        self.print_result()
+
+
+    def benchmark_names(self, file_type):
+        """
+        Returns the sorted names of the built benchmarks of a file type that match self.benchmarks.
+        """
+        base_dir = os.path.join(self.work_dir, self.relative_work_dir, file_type)
+        if not os.path.isdir(base_dir):
+            return []
+        return sorted(file_name for file_name in os.listdir(base_dir)
+                      if self.benchmarks is None or any(fnmatch.fnmatch(file_name, pattern) for pattern in self.benchmarks))
+
+
+    def test_all_benchmarks(self, file_type, adaptive=False, iterations=100):
+        self.success = []
+        self.failed = []
+        self.check_environment()
+        if adaptive:
+            self.warm_up_until_stable(self.warm_up_file, file_type)
+        else:
+            self.warm_up(self.warm_up_file, file_type, 20)
         print("Start test...")
-        base_dir = "build/" + file_type
-        for file_name in os.listdir(base_dir):
-            self.test(file_name, file_type, 100)
+        for file_name in self.benchmark_names(file_type):
+            if adaptive:
+                self.test_adaptive(file_name, file_type)
+            else:
+                self.test(file_name, file_type, iterations)
+        if self.result_store is not None:
+            self.result_store.flush()
         self.print_result()
 
+    def check_environment(self, cores=None):
+        """
+        Checks the machine settings with the EnvironmentManager (raising in strict mode if they differ from the
+        baseline) and records them next to the results: in the result store for the current run, otherwise
+        next to the output CSV.
+
+        :param cores: Cores the run uses; the per-core settings are checked on these.
+        """
+        if self.environment is None:
+            return None
+        if cores:
+            self.environment.cores = sorted(cores)
+        environment = self.environment.check()
+        self.__save_metadata("environment", environment)
+        if environment["deviations"]:
+            print("* [Flagged] environment differs from the baseline: " + ", ".join(environment["deviations"]))
+        return environment
+
+
+    def __save_metadata(self, kind, data):
+        # Run-level information goes to the result store for the current run, otherwise next to the output CSV
+        if self.result_store is not None:
+            self.result_store.save_metadata(kind, data)
+        else:
+            path = os.path.splitext(os.path.join(self.work_dir, self.output_csv))[0] + f".{kind}.json"
+            with open(path, "w") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+
+
+    def available_cores(self):
+        """
+        Returns the cores reserved for benchmarking, see environment.benchmark_cores.
+        """
+        return benchmark_cores()
+
+
+    def schedule_jobs(self, file_names, file_types, iterations, seed=None):
+        """
+        Builds the (file_name, file_type, iteration) job list. For every iteration of a benchmark the file types
+        are queued back to back as one block, so iteration i of each file type forms a pair. Runners execute a block
+        sequentially on one core, so the runs of a pair are measured close together under the same machine state.
+        Without a seed the order inside a block is rotated between iterations; with a seed every block is shuffled
+        independently (randomized blocks), reproducibly from the seed.
+
+        :param file_names: Names of the binaries to test.
+        :param file_types: File types to interleave.
+        :param iterations: Number of iterations per (file_name, file_type).
+        :param seed: Seed of the block shuffles.
+        """
+        rng = random.Random(seed) if seed is not None else None
+        jobs = []
+        for iteration in range(1, iterations + 1):
+            shift = iteration % len(file_types)
+            rotated_types = file_types[shift:] + file_types[:shift]
+            for file_name in file_names:
+                block = list(rotated_types)
+                if rng is not None:
+                    rng.shuffle(block)
+                for file_type in block:
+                    jobs.append((file_name, file_type, iteration))
+        return jobs
+
+
+    def test_all_benchmarks_parallel(self, file_types, iterations=100, cores=None, seed=None):
+        """
+        Tests every binary of the given file types in a worker pool, one worker pinned to each core.
+        Per-iteration CSV rows are written in iteration order, exactly as test() writes them.
+        The run order follows schedule_jobs() with randomized blocks; the seed is recorded with the run. Each block
+        runs on one worker, so the file types of a pair never run concurrently on different cores.
+
+        :param file_types: File types to test, e.g. ['no_extension', 'original', 'protected'].
+        :param iterations: Number of iterations per binary.
+        :param cores: Explicit list of cores to run on. Defaults to available_cores().
+        :param seed: Seed of the randomized blocks. Defaults to the journal's seed when resuming, otherwise a random one.
+        """
+        self.success = []
+        self.failed = []
+        file_types = list(file_types)
+        cores = list(cores) if cores else self.available_cores()
+        self.check_environment(cores)
+        for file_type in file_types:
+            self.warm_up(self.warm_up_file, file_type, 20)
+
+        binaries = {file_type: set(self.benchmark_names(file_type)) for file_type in file_types}
+        file_names = sorted(set().union(*binaries.values()))
+        if seed is None:
+            seed = self.journal.seed if self.journal is not None and self.journal.seed is not None else random.SystemRandom().randrange(2 ** 32)
+        if self.journal is not None and self.journal.seed != seed:
+            self.journal.record_seed(seed)
+        self.__save_metadata("schedule", {"seed": seed, "file_types": file_types, "iterations": iterations})
+        print(f"Randomized-block schedule, seed {seed}")
+        jobs = [job for job in self.schedule_jobs(file_names, file_types, iterations, seed) if job[0] in binaries[job[1]]]
+        if self.journal is not None:
+            # Skip iterations completed before the campaign was interrupted
+            jobs = [job for job in jobs if job[2] not in self.journal.iterations(job[0], job[1])]
+
+        print(f"Start test on cores {cores}...")
+        pending = {}
+        next_iteration = {}
+        samples = {}
+        broken = set()
+        if self.journal is not None:
+            for file_name in file_names:
+                for file_type in file_types:
+                    completed = self.journal.iterations(file_name, file_type)
+                    if completed:
+                        key = (file_name, file_type)
+                        next_iteration[key] = max(completed) + 1
+                        samples[key] = [completed[iteration] for iteration in sorted(completed)]
+        core_queue = multiprocessing.Queue()
+        for core in cores:
+            core_queue.put(core)
+        blocks = [list(block) for _, block in itertools.groupby(jobs, key=lambda job: (job[0], job[2]))]
+        with multiprocessing.Pool(len(cores), initializer=_pin_worker, initargs=(self, core_queue)) as pool:
+            for block in pool.imap_unordered(_run_block, blocks):
+                for (file_name, file_type, iteration), result in block:
+                    key = (file_name, file_type)
+                    if key in broken:
+                        continue
+                    if result is None:
+                        print("* [Failed] " + file_name)
+                        self.failed.append(file_name)
+                        broken.add(key)
+                        continue
+                    pending.setdefault(key, {})[iteration] = result
+                    self.__flush_iterations(key, pending, next_iteration, samples)
+
+        for file_name in file_names:
+            for file_type in file_types:
+                key = (file_name, file_type)
+                if key in broken or next_iteration.get(key, 1) <= iterations:
+                    continue
+                avg_metrics = self.__summarize(file_name, samples[key])
+                print("[Success] " + file_name)
+                self.success.append(file_name)
+                self.__write_average(avg_metrics, file_name, file_type)
+        if self.result_store is not None:
+            self.result_store.flush()
+        self.print_result()
+
+
+    def __flush_iterations(self, key, pending, next_iteration, samples):
+        """
+        Writes the contiguous run of finished iterations for key to its per-iteration CSV, keeping rows in order.
+        """
+        file_name, file_type = key
+        iteration = next_iteration.get(key, 1)
+        while iteration in pending[key]:
+            result = pending[key].pop(iteration)
+            self.__record_iteration(file_name, file_type, iteration, result)
+            samples.setdefault(key, []).append(result)
+            iteration += 1
+        next_iteration[key] = iteration
+
+
     def warm_up(self, file_name, file_type, iterations):
         """
         Performs warm-up tests to minimize the impact of caching and other system states on test results.
@@ -93,10 +627,10 @@ class PerformanceTester:
         :param file_type: Type of test file (original or protected).
         :param iterations: The number of iterations for the warm-up test.
         """
-        warm_up_command = self.sec_extension_command + self.relative_work_dir + file_type + "/" + file_name
         print(f"Starting warm-up for {file_name} ({iterations} iterations)...")
         for _ in range(iterations):
-            subprocess.run(warm_up_command, shell=True, cwd=self.work_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            # Same QEMU and backend as the measured runs, so no_extension warms up its own binary
+            self.run_once(file_name, file_type)
         print("Warm-up completed.")
 
 
@@ -126,7 +660,9 @@ class PerformanceTester:
             "User Time": r"([\d.]+) seconds user",
             "System Time": r"([\d.]+) seconds sys",
             "CPU Percentage": r"Percent of CPU this job got: ([\d]+)%",
-            "Maximum resident set size (kbytes)": r"Maximum resident set size \(kbytes\): (\d+)"
+            "Maximum resident set size (kbytes)": r"Maximum resident set size \(kbytes\): (\d+)",
+            "Involuntary Context Switches": r"Involuntary context switches: (\d+)",
+            "CPU Migrations": r"(\d+(?:,\d+)*)\s+cpu-migrations"
         }
 
         results = {}
@@ -146,31 +682,143 @@ class PerformanceTester:
             writer.writerow(row)
 
     
+    def __write_average(self, metrics, file_name, file_type):
+        if self.journal is not None:
+            if (file_name, file_type) in self.journal.averages:
+                return  # Written before the campaign was interrupted
+            self.__write_to_csv(metrics, file_name, file_type)
+            self.__write_workload(metrics, file_name, file_type)
+            self.journal.record_average(file_name, file_type)
+        else:
+            self.__write_to_csv(metrics, file_name, file_type)
+            self.__write_workload(metrics, file_name, file_type)
+
+
+    def __write_workload(self, metrics, file_name, file_type):
+        if self.calibration is None or file_type not in self.calibration:
+            return
+        calibration = self.calibration[file_type]
+        workload = workload_metrics(metrics, calibration["baseline"])
+        too_short = is_too_short(workload, calibration["noise"], calibration["min_signal"])
+        if too_short:
+            print(f"* [Too short] {file_name} ({file_type}): workload {workload['Elapsed Time'] * 1000:.2f} ms is within "
+                  f"{calibration['min_signal']}x the harness noise")
+        row = [file_name, file_type] + [workload.get(h, "N/A") for h in self.headers[2:]] + [too_short]
+        with open(os.path.join(self.work_dir, self.workload_csv), "a", newline="") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(row)
+
+
+    def __record_iteration(self, file_name, file_type, iteration, metrics):
+        # Time series of sampling mode are split off here and only kept in the store, not in the journal or CSVs
+        series = metrics.pop(SERIES_KEY, None)
+        if series is not None:
+            self.result_store.append_series(file_name, file_type, iteration, series, self.sample_interval, self.config)
+        # The journal is written first; resume() restores the CSV or store from it if the sink write is lost
+        if self.journal is not None:
+            csv_offset = None
+            if self.result_store is None and (file_name, file_type) not in self.journal.csv_offsets:
+                csv_offset = self.__count_csv_lines(file_name, file_type)
+            self.journal.record_iteration(file_name, file_type, iteration, metrics, csv_offset)
+        self.__write_iteration(file_name, file_type, iteration, metrics)
+
+
+    def __write_iteration(self, file_name, file_type, iteration, metrics):
+        if self.result_store is None:
+            self.__save_iteration_data_to_csv(file_name, file_type, iteration, metrics)
+        else:
+            binary_path = os.path.join(self.work_dir, self.relative_work_dir, file_type, file_name)
+            self.result_store.append(file_name, file_type, iteration, metrics, binary_path, self.config, backend=self.backend)
+
+
     def __save_iteration_data_to_csv(self, file_name, file_type,iteration, metrics):
         """
         Saves the metrics of a single iteration to a CSV file named after the file being tested.
+        Rows follow the header of an existing file; metrics it lacks are added as new columns (see __extend_csv_header).
         
         :param file_name: Name of the file being tested.
         :param iteration: The iteration number of the current test.
         :param metrics: A dictionary containing the performance metrics for the current iteration.
         """
         
-        csv_file_path = os.path.join(self.work_dir, f"../data/csv/{file_name}-{file_type}.csv")
-        file_exists = os.path.isfile(csv_file_path)
-        
+        csv_file_path = os.path.join(self.work_dir, self.iteration_csv_dir, f"{file_name}-{file_type}.csv")
+        header = None
+        if os.path.isfile(csv_file_path):
+            with open(csv_file_path, newline='') as csvfile:
+                header = next(csv.reader(csvfile), None)
+        if header is not None and any(key not in header for key in metrics):
+            header = self.__extend_csv_header(csv_file_path, header, [key for key in metrics if key not in header])
+
         with open(csv_file_path, 'a', newline='') as csvfile:
             writer = csv.writer(csvfile)
-            if not file_exists:
+            if header is None:
                 # If the file does not exist, write the header first
                 header = ['Iteration'] + list(metrics.keys())
                 writer.writerow(header)
             
-            # Write the metrics for the current iteration
-            row = [iteration] + list(metrics.values())
+            # Write the metrics for the current iteration, in the column order of the file
+            row = [iteration] + [metrics.get(column, "") for column in header[1:]]
             writer.writerow(row)
 
 
+    def __extend_csv_header(self, csv_file_path, header, columns):
+        """
+        Migrates a per-iteration CSV written before the given metrics were collected (e.g. one without the Noise Score
+        columns): the columns are appended to the header and left empty in the existing rows. The line count stays
+        the same, so journal offsets remain valid. Returns the new header.
+        """
+        with open(csv_file_path, newline='') as csvfile:
+            rows = list(csv.reader(csvfile))[1:]
+        header = header + columns
+        with open(csv_file_path + ".tmp", "w", newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(header)
+            writer.writerows(row + [""] * (len(header) - len(row)) for row in rows)
+        os.replace(csv_file_path + ".tmp", csv_file_path)
+        return header
+
+
+    def __count_csv_lines(self, file_name, file_type):
+        csv_file_path = os.path.join(self.work_dir, self.iteration_csv_dir, f"{file_name}-{file_type}.csv")
+        if not os.path.exists(csv_file_path):
+            return 0
+        with open(csv_file_path) as f:
+            return sum(1 for _ in f)
+
+
+    def resume(self):
+        """
+        Prepares to resume the campaign recorded in the journal: per-iteration CSVs are cut back to their state
+        before the campaign and rewritten from the journal (or the run's rows in the result store are rewritten),
+        so no half-written or duplicated iterations remain. Completed iterations are then skipped by the test methods.
+        """
+        if self.journal is None or self.journal.run_id is None:
+            raise ValueError("No campaign to resume" + (f": {self.journal.path} records none" if self.journal is not None else ""))
+        print(f"Resuming campaign {self.journal.run_id}...")
+        if self.result_store is not None:
+            self.result_store.discard_run(self.result_store.run_id)
+        for (file_name, file_type), completed in self.journal.completed.items():
+            if self.result_store is None:
+                csv_file_path = os.path.join(self.work_dir, self.iteration_csv_dir, f"{file_name}-{file_type}.csv")
+                offset = self.journal.csv_offsets.get((file_name, file_type), 0)
+                if os.path.exists(csv_file_path):
+                    with open(csv_file_path) as f:
+                        kept = [line for _, line in zip(range(offset), f)]
+                    with open(csv_file_path + ".tmp", "w") as f:
+                        f.writelines(kept)
+                    os.replace(csv_file_path + ".tmp", csv_file_path)
+                    if offset == 0:
+                        os.remove(csv_file_path)
+            for iteration in sorted(completed):
+                self.__write_iteration(file_name, file_type, iteration, completed[iteration])
+        if self.result_store is not None:
+            self.result_store.flush()
+        print(f"{sum(len(completed) for completed in self.journal.completed.values())} completed iterations restored.")
+
+
     def reset_and_prepare_csv(self):
+        os.makedirs(os.path.join(self.work_dir, self.iteration_csv_dir), exist_ok=True)
+
         # Delete old CSV file if it exists
         csv_path = os.path.join(self.work_dir, self.output_csv)
         if os.path.exists(csv_path):
@@ -180,3 +828,7 @@ class PerformanceTester:
         with open(csv_path, "w", newline="") as csvfile:
             writer = csv.writer(csvfile)
             writer.writerow(self.headers)
+        if self.calibration is not None:
+            with open(os.path.join(self.work_dir, self.workload_csv), "w", newline="") as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(self.headers + ["Too Short"])
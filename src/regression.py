@@ -0,0 +1,211 @@
+import json
+import math
+import os
+import sys
+import numpy as np
+import pandas as pd
+from result_store import *
+
+
+# Exit codes of the command line check; a merge gate must not pass when there was nothing to compare
+EXIT_CODES = {"pass": 0, "fail": 1, "no baseline": 3, "unknown run": 4}
+
+
+def mann_whitney_u(x, y):
+    """
+    Two-sided Mann-Whitney U test with tie correction (normal approximation).
+    Returns (U of x, p-value, rank-biserial effect size); the effect size is positive when x tends to be larger than y.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n1, n2 = len(x), len(y)
+    values, inverse, counts = np.unique(np.concatenate([x, y]), return_inverse=True, return_counts=True)
+    # Average rank of each distinct value
+    ranks = (np.cumsum(counts) - (counts - 1) / 2)[inverse]
+    u1 = ranks[:n1].sum() - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    ties = np.sum(counts ** 3 - counts)
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return u1, 1.0, 0.0
+    z = (abs(u1 - n1 * n2 / 2) - 0.5) / sigma
+    p_value = min(1.0, math.erfc(max(z, 0) / math.sqrt(2)))
+    return u1, p_value, 2 * u1 / (n1 * n2) - 1
+
+
+def change_points(series, min_size=2, penalty=None):
+    """
+    Binary segmentation for shifts in the mean of series. A split is kept when it reduces the squared error by
+    more than the penalty (default: BIC-style 2 * sigma^2 * log(n), sigma from the median absolute difference).
+    Returns the sorted indices where a new segment starts.
+    """
+    series = np.asarray(series, dtype=float)
+    n = len(series)
+    if n < 2 * min_size:
+        return []
+    if penalty is None:
+        sigma = np.median(np.abs(np.diff(series))) / (0.6745 * math.sqrt(2)) if n > 1 else 0
+        penalty = 2 * max(sigma, 1e-12) ** 2 * math.log(n)
+
+    def cost(segment):
+        return np.sum((segment - segment.mean()) ** 2)
+
+    found = []
+    segments = [(0, n)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2 * min_size:
+            continue
+        total = cost(series[start:end])
+        best_gain, best_split = 0, None
+        for split in range(start + min_size, end - min_size + 1):
+            gain = total - cost(series[start:split]) - cost(series[split:end])
+            if gain > best_gain:
+                best_gain, best_split = gain, split
+        if best_split is not None and best_gain > penalty:
+            found.append(best_split)
+            segments += [(start, best_split), (best_split, end)]
+    return sorted(found)
+
+
+class RegressionDetector:
+    def __init__(self, result_store, metric="Cycles", threshold=2.0, alpha=0.01, baseline_runs=5,
+                 baseline_file="../data/regression_baseline.json", config="default"):
+        """
+        Compares the protected-variant overhead of a run against per-benchmark baselines from the result history.
+        Only earlier runs measured with the same backend as the candidate serve as baselines.
+
+        :param result_store: ResultStore holding the iteration history.
+        :param metric: Metric the overhead is computed on.
+        :param threshold: Overhead increase, in percentage points, that counts as a regression.
+        :param alpha: Significance level of the Mann-Whitney test.
+        :param baseline_runs: Number of most recent earlier runs pooled as the baseline when none is pinned.
+        :param baseline_file: JSON file with pinned baseline run ids per benchmark.
+        :param config: Build configuration whose history is checked.
+        """
+        self.result_store = result_store
+        self.metric = metric
+        self.threshold = threshold
+        self.alpha = alpha
+        self.baseline_runs = baseline_runs
+        self.script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.work_dir = os.path.join(self.script_dir)
+        self.baseline_file = os.path.join(self.work_dir, baseline_file)
+        columns = ["Run ID", "Timestamp", "Backend", "File Name", "File Type", metric]
+        self.data = result_store.load(columns=columns, configs=[config]) if not result_store.is_empty() else pd.DataFrame(columns=columns)
+
+
+    def relative_samples(self):
+        """
+        Returns per-iteration protected values divided by the median no_extension value of the same run and benchmark,
+        as overhead percentages, with one row per (Run ID, File Name, iteration).
+        """
+        data = self.data.dropna(subset=[self.metric])
+        reference = data[data['File Type'] == 'no_extension'].groupby(['Run ID', 'File Name'])[self.metric].median()
+        protected = data[data['File Type'] == 'protected'].join(reference.rename('Reference'), on=['Run ID', 'File Name'])
+        protected = protected.dropna(subset=['Reference'])
+        protected['Overhead (%)'] = (protected[self.metric] / protected['Reference'] - 1) * 100
+        return protected[['Run ID', 'Timestamp', 'Backend', 'File Name', 'Overhead (%)']]
+
+
+    def pin_baseline(self, run_id):
+        """
+        Pins run_id as the baseline of every benchmark it contains.
+        """
+        baselines = self.__load_baselines()
+        samples = self.relative_samples()
+        for file_name in samples[samples['Run ID'] == run_id]['File Name'].unique():
+            baselines[file_name] = [run_id]
+        with open(self.baseline_file + ".tmp", "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        os.replace(self.baseline_file + ".tmp", self.baseline_file)
+
+
+    def check(self, run_id=None):
+        """
+        Tests the candidate run (default: the most recent) against the baselines and returns the verdict dictionary.
+        A benchmark regresses when its overhead grew by more than threshold points and the shift is significant.
+        The verdict is 'fail' if any benchmark regressed, 'unknown run' if the candidate has no protected and
+        no_extension iterations in the history, 'no baseline' if none of its benchmarks has one, and 'pass' otherwise.
+        """
+        samples = self.relative_samples()
+        run_order = samples.groupby('Run ID')['Timestamp'].min().sort_values()
+        if run_id is None and not run_order.empty:
+            run_id = run_order.index[-1]
+        if run_id not in run_order.index:
+            return self.__verdict(run_id, None, "unknown run", [])
+        # Elapsed Time is measured differently by every backend, so only runs of the candidate's backend are compared
+        backends = samples.groupby('Run ID')['Backend'].first()
+        backend = backends[run_id]
+        run_order = run_order[backends[run_order.index].to_numpy() == backend]
+        earlier_runs = list(run_order.index[:list(run_order.index).index(run_id)])
+        baselines = self.__load_baselines()
+
+        benchmarks = []
+        for file_name, group in samples.groupby('File Name'):
+            candidate = group[group['Run ID'] == run_id]['Overhead (%)']
+            pinned = [run for run in baselines.get(file_name, []) if backends.get(run) == backend]
+            baseline_ids = pinned or [run for run in earlier_runs if run in set(group['Run ID'])][-self.baseline_runs:]
+            baseline = group[group['Run ID'].isin(baseline_ids)]['Overhead (%)']
+            if candidate.empty:
+                continue
+            if baseline.empty:
+                benchmarks.append({"file_name": file_name, "status": "no baseline", "baseline_runs": [],
+                                   "candidate_overhead": round(float(candidate.median()), 4)})
+                continue
+
+            _, p_value, effect_size = mann_whitney_u(candidate, baseline)
+            delta = candidate.median() - baseline.median()
+            status = "ok"
+            if p_value < self.alpha and delta > self.threshold:
+                status = "regression"
+            elif p_value < self.alpha and delta < -self.threshold:
+                status = "improvement"
+
+            # Change points over the per-run median overhead history
+            history = group.groupby('Run ID')['Overhead (%)'].median().reindex(run_order.index).dropna()
+            benchmarks.append({
+                "file_name": file_name,
+                "status": status,
+                "baseline_runs": list(baseline_ids),
+                "baseline_overhead": round(float(baseline.median()), 4),
+                "candidate_overhead": round(float(candidate.median()), 4),
+                "delta": round(float(delta), 4),
+                "p_value": float(p_value),
+                "effect_size": round(float(effect_size), 4),
+                "change_points": [history.index[i] for i in change_points(history.values)],
+            })
+
+        if any(benchmark["status"] == "regression" for benchmark in benchmarks):
+            verdict = "fail"
+        elif all(benchmark["status"] == "no baseline" for benchmark in benchmarks):
+            verdict = "no baseline"
+        else:
+            verdict = "pass"
+        return self.__verdict(run_id, backend, verdict, benchmarks)
+
+
+    def __verdict(self, run_id, backend, verdict, benchmarks):
+        return {
+            "run_id": run_id,
+            "backend": backend,
+            "metric": self.metric,
+            "threshold": self.threshold,
+            "alpha": self.alpha,
+            "verdict": verdict,
+            "regressions": [benchmark["file_name"] for benchmark in benchmarks if benchmark["status"] == "regression"],
+            "benchmarks": benchmarks,
+        }
+
+
+    def __load_baselines(self):
+        if not os.path.exists(self.baseline_file):
+            return {}
+        with open(self.baseline_file) as f:
+            return json.load(f)
+
+
+if __name__ == '__main__':
+    # Kept for existing CI jobs; the command line lives in main.py (main.py regression)
+    from main import main
+
+    sys.exit(main(["regression"] + sys.argv[1:]))
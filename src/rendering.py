@@ -0,0 +1,246 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib.figure import Figure
+
+
+# Output profiles: a quick preview for iterating on the analysis, and print resolution for publication
+PROFILES = {
+    "preview": {"format": "png", "dpi": 96},
+    "svg": {"format": "svg", "dpi": 96},
+    "publication": {"format": "png", "dpi": 300},
+}
+
+# Part of the render cache key next to the source of the draw function; bump it when code the draw functions share
+# (e.g. FILE_TYPES, COLORS) changes
+RENDER_VERSION = 1
+
+FILE_TYPES = ['no_extension', 'original', 'protected']
+COLORS = ['#D7191C', '#2C7BB6', '#FABE2C']
+
+
+def draw_comparison(metric, comparison_data):
+    """
+    Bar chart of the given metric per file name and file type, annotated with the degradation percentages.
+    The y-axis is displayed on a logarithmic scale.
+    """
+    file_names = list(comparison_data.index)
+    bar_width = 0.25
+
+    fig = Figure(figsize=(14, 8))
+    ax = fig.add_subplot()
+    indices = np.arange(len(comparison_data))
+    ax.bar(indices - bar_width, comparison_data['No_Extension'], width=bar_width, label='No Extension', alpha=0.8)
+    ax.bar(indices, comparison_data['Original'], width=bar_width, label='Original', alpha=0.8)
+    ax.bar(indices + bar_width, comparison_data['Protected'], width=bar_width, label='Protected', alpha=0.8)
+
+    # Annotate performance degradation percentage
+    for idx, (index, row) in enumerate(comparison_data.iterrows()):
+        base_height = max(row[['No_Extension', 'Original', 'Protected']].dropna())
+        if not pd.isnull(row['Degradation (%) No_Extension vs Original']):
+            ax.text(idx - bar_width, base_height * 1.10, f'{row["Degradation (%) No_Extension vs Original"]:.2f}%', ha='center', va='bottom', color='blue', rotation=75)
+        if not pd.isnull(row['Degradation (%) No_Extension vs Protected']):
+            ax.text(idx + bar_width, base_height * 1.15, f'{row["Degradation (%) No_Extension vs Protected"]:.2f}%', ha='center', va='bottom', color='red', rotation=75)
+
+    ax.set_yscale('log')
+
+    # Determine the position for the static annotation on a log scale
+    y_min, y_max = ax.get_ylim()
+    log_range = np.log10(y_max) - np.log10(y_min)
+    red_base_position = 10 ** (np.log10(y_max) - log_range * 0.03)
+    blue_base_position = 10 ** (np.log10(y_max) - log_range * 0.06)
+
+    ax.text(-1, red_base_position, 'Red %: Degradation from No Extension to Protected', color='red', fontsize=10, verticalalignment='top')
+    ax.text(-1, blue_base_position, 'Blue %: Degradation from No Extension to Original', color='blue', fontsize=10, verticalalignment='top')
+
+    ax.set_title(f'Comparison of {metric} Between Original and Protected Files')
+    ax.set_xlabel('File Name')
+    ax.set_ylabel(metric)
+    ax.set_xticks(indices, file_names, rotation=45, ha="right")
+    ax.legend()
+    ax.grid(True, which='both', axis='y', linestyle='--', linewidth=0.5)
+    fig.tight_layout()
+    return fig
+
+
+def draw_boxplot(metric, file_names, samples):
+    """
+    Box plot of the given metric for every file name and file type.
+
+    :param samples: Dictionary mapping (file_name, file_type) to the array of per-iteration values.
+    """
+    fig = Figure(figsize=(len(file_names) * 2, 6))
+    ax = fig.add_subplot()
+    positions = np.arange(len(file_names)) * 4  # Spacing between groups of box plots
+
+    for i, file_name in enumerate(file_names):
+        for j, file_type in enumerate(FILE_TYPES):
+            if (file_name, file_type) not in samples:
+                continue
+            ax.boxplot(samples[(file_name, file_type)], positions=[positions[i] + j], widths=0.5, patch_artist=True,
+                       boxprops=dict(facecolor=COLORS[j], color=COLORS[j]),
+                       medianprops=dict(color='black'),
+                       whiskerprops=dict(color=COLORS[j]),
+                       capprops=dict(color=COLORS[j]),
+                       flierprops=dict(markeredgecolor=COLORS[j], marker='o', markersize=5))
+
+    ax.set_xticks(positions + 1, file_names, rotation=45, ha="right")
+    ax.set_ylabel(metric)
+    ax.set_title(f'Comparison of {metric} Across File Types')
+    ax.set_yscale('log')
+
+    # Adding legend manually
+    for i, file_type in enumerate(FILE_TYPES):
+        ax.plot([], c=COLORS[i], label=file_type.capitalize(), marker='s', linestyle='None', markersize=10)
+    ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+def draw_loss_distribution(performance_loss_df):
+    """
+    Histogram and density plot of the performance loss percentages, with the median of each file type annotated.
+    """
+    fig = Figure(figsize=(12, 6))
+    hist_ax, density_ax = fig.subplots(1, 2)
+
+    sns.histplot(data=performance_loss_df, x='Loss Percentage', hue='File Type', kde=False, bins=20, ax=hist_ax)
+    hist_ax.set_title('Histogram of Loss Percentage')
+    hist_ax.set_xlabel('Loss Percentage')
+    hist_ax.set_ylabel('Frequency')
+
+    # Annotations of medians
+    medians_text = "Medium:\n"
+    for file_type, median_val in performance_loss_df.groupby('File Type', sort=False)['Loss Percentage'].median().items():
+        medians_text += f"{file_type}: {median_val:.2f}%\n"
+    fig.text(0.2, 0.75, medians_text, fontsize=9, verticalalignment='center', bbox=dict(boxstyle="round,pad=0.5", fc="lightyellow", ec="black", lw=1, alpha=0.5))
+
+    sns.kdeplot(data=performance_loss_df, x='Loss Percentage', hue='File Type', fill=True, ax=density_ax)
+    density_ax.set_title('Density Plot of Loss Percentage')
+    density_ax.set_xlabel('Loss Percentage')
+    density_ax.set_ylabel('Density')
+    fig.tight_layout()
+    return fig
+
+
+def draw_scaling(metric, summary, fits, cache_sizes):
+    """
+    One panel per benchmark: overhead of original and protected against working set (log scale), the protected
+    Cache Misses ratio on a second axis, cache sizes as dashed lines and the fitted breakpoint as a dotted line.
+    """
+    file_names = sorted(summary['File Name'].unique())
+    columns = 3
+    rows = max(1, -(-len(file_names) // columns))
+    fig = Figure(figsize=(6 * columns, 4 * rows))
+    axes = fig.subplots(rows, columns, squeeze=False).flatten()
+    breakpoints = fits.set_index('File Name')['Breakpoint Working Set (bytes)'] if len(fits) else pd.Series(dtype=float)
+
+    for ax, file_name in zip(axes, file_names):
+        group = summary[summary['File Name'] == file_name].sort_values('Working Set (bytes)')
+        ax.plot(group['Working Set (bytes)'], group['Overhead (%) original'], marker='o', color=COLORS[1], label='Original')
+        ax.plot(group['Working Set (bytes)'], group['Overhead (%) protected'], marker='o', color=COLORS[2], label='Protected')
+        ax.set_xscale('log', base=2)
+        ax.set_title(file_name)
+        ax.set_xlabel('Working Set (bytes)')
+        ax.set_ylabel(f'{metric} Overhead (%)')
+        if 'Miss Ratio protected' in group:
+            ratio_ax = ax.twinx()
+            ratio_ax.plot(group['Working Set (bytes)'], group['Miss Ratio protected'], linestyle='--', color='gray', label='Miss Ratio')
+            ratio_ax.set_ylabel('Cache Misses / References')
+        for level, size in cache_sizes.items():
+            ax.axvline(size, color='black', linestyle='--', linewidth=0.5)
+            ax.text(size, ax.get_ylim()[1], level, fontsize=8, va='top')
+        if file_name in breakpoints and not pd.isnull(breakpoints[file_name]):
+            ax.axvline(breakpoints[file_name], color='red', linestyle=':')
+        ax.legend(fontsize=8)
+    for ax in axes[len(file_names):]:
+        ax.set_visible(False)
+    fig.tight_layout()
+    return fig
+
+
+def draw_timeline(file_name, timelines):
+    """
+    One panel per series, stacked on a shared time axis: the median over iterations of every file type as a line and
+    the interquartile range as a band, so no_extension, original and protected can be compared over the run.
+
+    :param timelines: Dictionary series name -> {file_type: DataFrame with Time, q25, median and q75 columns}.
+    """
+    fig = Figure(figsize=(12, 3 * len(timelines)))
+    axes = fig.subplots(len(timelines), 1, sharex=True, squeeze=False)[:, 0]
+    for ax, (series, by_file_type) in zip(axes, timelines.items()):
+        for color, file_type in zip(COLORS, FILE_TYPES):
+            if file_type not in by_file_type:
+                continue
+            timeline = by_file_type[file_type]
+            ax.plot(timeline['Time'], timeline['median'], color=color, label=file_type.capitalize())
+            ax.fill_between(timeline['Time'], timeline['q25'], timeline['q75'], color=color, alpha=0.25, linewidth=0)
+        ax.set_ylabel(series)
+        ax.grid(True, linestyle='--', linewidth=0.5)
+        ax.legend(fontsize=8)
+    axes[0].set_title(f'Timeline of {file_name}')
+    axes[-1].set_xlabel('Time (s)')
+    fig.tight_layout()
+    return fig
+
+
+def _source(draw):
+    # Edited plotting code must not be served from the cache; fall back to the bytecode without a source file
+    try:
+        return inspect.getsource(draw)
+    except (OSError, TypeError):
+        return draw.__code__.co_code
+
+
+def _render(job):
+    name, draw, args, path, digest, settings = job
+    fig = draw(*args)
+    fig.savefig(path, dpi=settings["dpi"], format=settings["format"])
+    return path, digest
+
+
+def render_figures(figures, profile="publication", output_dir="data/plt", processes=None):
+    """
+    Renders figures in a process pool. Figures whose input data, profile and draw function source hash to the same
+    value as in the last render, and whose output still exists, are skipped.
+
+    :param figures: List of (name, draw_function, args) tuples; the output is written to <output_dir>/<name>.<format>.
+    :param profile: One of PROFILES ('preview', 'svg' or 'publication').
+    :param output_dir: Directory receiving the figures.
+    :param processes: Number of worker processes. Defaults to the number of cores.
+    """
+    settings = PROFILES[profile]
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, ".render_cache.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    jobs = []
+    for name, draw, args in figures:
+        path = os.path.join(output_dir, f"{name}.{settings['format']}")
+        digest = hashlib.sha256(pickle.dumps((draw.__name__, _source(draw), RENDER_VERSION, args, settings))).hexdigest()
+        if manifest.get(path) == digest and os.path.exists(path):
+            print("[Cached] " + name)
+            continue
+        jobs.append((name, draw, args, path, digest, settings))
+
+    if processes == 1 or len(jobs) <= 1:
+        results = [_render(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_render, jobs))
+    for path, digest in results:
+        print("[Rendered] " + path)
+        manifest[path] = digest
+
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(manifest_path + ".tmp", manifest_path)
@@ -0,0 +1,283 @@
+import hashlib
+import html
+import json
+import math
+import os
+import numpy as np
+import pandas as pd
+from robust_stats import *
+
+
+# Bumped when the content of the cached sections changes, so old cache entries are recomputed
+REPORT_VERSION = 2
+
+# Same palette as rendering.COLORS, without importing matplotlib
+FILE_TYPE_COLORS = {"no_extension": "#D7191C", "original": "#2C7BB6", "protected": "#FABE2C"}
+
+
+def _clean(value):
+    # NaN and numpy scalars are not valid JSON; values are rounded so reports diff cleanly between runs
+    if isinstance(value, dict):
+        return {key: _clean(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(item) for item in value]
+    if isinstance(value, (float, np.floating)):
+        return None if math.isnan(value) else round(float(value), 6)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def data_hash(frame, settings):
+    """
+    Content hash of one benchmark's per-iteration data and the report settings; row order does not matter.
+    """
+    keys = [column for column in ["Run ID", "Host", "File Type", "Iteration"] if column in frame.columns]
+    frame = frame.sort_values(keys).reset_index(drop=True)
+    digest = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+    digest.update(",".join(frame.columns).encode())
+    digest.update(pd.util.hash_pandas_object(frame.astype({column: str for column in keys}), index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class ReportGenerator:
+    def __init__(self, analyser, output_dir="../data/report/", metrics=("Cycles", "Instructions", "Elapsed Time"),
+                 baseline="no_extension", confidence=0.95, resamples=2000):
+        """
+        Writes a self-contained HTML report and a JSON summary of the overhead of every file type over the baseline:
+        per-benchmark tables with confidence intervals (ratio of medians and paired), the suite-wide geometric mean,
+        and interval charts. Each benchmark's section is cached under output_dir/.cache by the hash of its data, so
+        after adding a benchmark only its section is computed again.
+
+        :param analyser: PerformanceComparison providing the per-iteration data and overhead statistics.
+        :param output_dir: Directory receiving report.html and report.json.
+        :param metrics: Metrics to report on.
+        :param baseline: File type the others are compared with.
+        :param confidence: Confidence level of the intervals.
+        :param resamples: Number of bootstrap resamples.
+        """
+        self.analyser = analyser
+        self.script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.work_dir = os.path.join(self.script_dir)
+        self.output_dir = os.path.join(self.work_dir, output_dir)
+        self.cache_dir = os.path.join(self.output_dir, ".cache")
+        self.metrics = list(metrics)
+        self.baseline = baseline
+        self.confidence = confidence
+        self.resamples = resamples
+        self.computed = []
+        self.cached = []
+
+
+    def generate(self):
+        """
+        Builds (or takes from the cache) every benchmark's section, then writes report.json and report.html.
+        Returns the report as a dictionary.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.computed = []
+        self.cached = []
+        data = self.analyser.iteration_data(self.metrics)
+        sections = {}
+        resampled = {}
+        for file_name, frame in data.groupby("File Name", observed=True):
+            sections[file_name], resampled[file_name] = self.section(file_name, frame)
+        report = {
+            "version": REPORT_VERSION,
+            "settings": self.__settings(),
+            "summary": self.summary(sections, resampled),
+            "benchmarks": sections,
+        }
+        with open(os.path.join(self.output_dir, "report.json"), "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        with open(os.path.join(self.output_dir, "report.html"), "w") as f:
+            f.write(self.render_html(report))
+        print(f"[Success] report: {len(self.computed)} sections computed, {len(self.cached)} cached")
+        return report
+
+
+    def section(self, file_name, frame):
+        """
+        Returns (section, resamples) of one benchmark, from the cache if its data hash matches. The resamples map
+        "<metric>|<file_type>" to the bootstrap ratios the suite-wide interval is built from.
+        """
+        digest = data_hash(frame, self.__settings())
+        json_path = os.path.join(self.cache_dir, f"{file_name}.json")
+        npz_path = os.path.join(self.cache_dir, f"{file_name}.npz")
+        if os.path.exists(json_path) and os.path.exists(npz_path):
+            with open(json_path) as f:
+                cached = json.load(f)
+            if cached["hash"] == digest:
+                self.cached.append(file_name)
+                with np.load(npz_path) as resamples:
+                    return cached["section"], dict(resamples)
+
+        section = {"iterations": frame.groupby("File Type", observed=True).size().to_dict(), "metrics": {}}
+        resamples = {}
+        for metric in self.metrics:
+            values = frame.groupby("File Type", observed=True)[metric]
+            ratios, distributions = self.analyser.ratio_overhead(metric, self.baseline, self.confidence, self.resamples, frame)
+            paired = self.analyser.paired_overhead(metric, self.baseline, self.confidence, frame)
+            section["metrics"][metric] = {
+                "quartiles": {file_type: dict(zip(["min", "q25", "median", "q75", "max"], np.quantile(group.dropna(), [0, 0.25, 0.5, 0.75, 1])))
+                              for file_type, group in values if group.notna().any()},
+                "overhead": ratios.drop(columns="File Name").to_dict("records"),
+                "paired": paired.drop(columns="File Name").to_dict("records") if len(paired) else [],
+            }
+            for (_, file_type), distribution in distributions.items():
+                resamples[f"{metric}|{file_type}"] = distribution
+        section = _clean(section)
+
+        # Written next to the targets and renamed, so an interrupted run never leaves a half-written entry;
+        # the JSON carrying the hash goes last
+        np.savez(npz_path + ".tmp.npz", **resamples)
+        os.replace(npz_path + ".tmp.npz", npz_path)
+        with open(json_path + ".tmp", "w") as f:
+            json.dump({"hash": digest, "section": section}, f, sort_keys=True)
+        os.replace(json_path + ".tmp", json_path)
+        self.computed.append(file_name)
+        return section, resamples
+
+
+    def summary(self, sections, resampled):
+        """
+        Suite-wide geometric mean overhead per metric and file type, with its interval built from the cached
+        per-benchmark resamples.
+        """
+        summary = {}
+        for metric in self.metrics:
+            summary[metric] = []
+            file_types = sorted({row["File Type"] for section in sections.values() for row in section["metrics"][metric]["overhead"]})
+            for file_type in file_types:
+                ratios, distributions = [], []
+                for file_name, section in sections.items():
+                    for row in section["metrics"][metric]["overhead"]:
+                        if row["File Type"] == file_type:
+                            ratios.append(row["Ratio"])
+                            distributions.append(resampled[file_name][f"{metric}|{file_type}"])
+                overhead, low, high = geometric_mean_overhead(ratios, np.array(distributions), self.confidence)
+                summary[metric].append({"File Type": file_type, "Benchmarks": len(ratios), "Overhead (%)": overhead,
+                                        "CI Low (%)": low, "CI High (%)": high})
+        return _clean(summary)
+
+
+    def render_html(self, report):
+        """
+        Renders the report as one HTML file with inline CSS, SVG interval charts (hover for values) and sortable
+        tables; it needs no network access or external files.
+        """
+        panels = []
+        for metric in self.metrics:
+            rows = []
+            for file_name, section in report["benchmarks"].items():
+                paired = {row["File Type"]: row for row in section["metrics"][metric]["paired"]}
+                for row in section["metrics"][metric]["overhead"]:
+                    rows.append((file_name, row, paired.get(row["File Type"], {}), section["iterations"].get(row["File Type"])))
+            summary = report["summary"][metric]
+            panels.append(f"""
+<section class="metric" data-metric="{html.escape(metric)}">
+<h2>{html.escape(metric)}</h2>
+{self.__summary_table(summary)}
+{self.__interval_chart(metric, rows, summary)}
+{self.__benchmark_table(rows)}
+</section>""")
+        options = "".join(f'<option>{html.escape(metric)}</option>' for metric in self.metrics)
+        settings = html.escape(json.dumps(report["settings"], sort_keys=True))
+        return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>xsec performance report</title>
+<style>
+body {{ font-family: sans-serif; margin: 2em; color: #222; }}
+table {{ border-collapse: collapse; margin: 1em 0; font-size: 13px; }}
+th, td {{ border: 1px solid #ccc; padding: 3px 8px; text-align: right; }}
+th {{ background: #eee; cursor: pointer; user-select: none; }}
+td:first-child, th:first-child {{ text-align: left; }}
+.significant {{ font-weight: bold; }}
+svg text {{ font-size: 11px; }}
+</style></head><body>
+<h1>xsec performance report</h1>
+<p>Overhead over {html.escape(self.baseline)}, {self.confidence:.0%} bootstrap intervals. Settings: <code>{settings}</code></p>
+<label>Metric: <select id="metric">{options}</select></label>
+{"".join(panels)}
+<script>
+const select = document.getElementById("metric");
+function show() {{
+  document.querySelectorAll("section.metric").forEach(s => s.style.display = s.dataset.metric === select.value ? "" : "none");
+}}
+select.addEventListener("change", show);
+show();
+document.querySelectorAll("th").forEach(th => th.addEventListener("click", () => {{
+  const table = th.closest("table"), body = table.tBodies[0], index = th.cellIndex;
+  const ascending = th.dataset.order !== "ascending";
+  th.dataset.order = ascending ? "ascending" : "descending";
+  const key = row => {{ const text = row.cells[index].dataset.value ?? row.cells[index].textContent; const number = parseFloat(text); return isNaN(number) ? text : number; }};
+  [...body.rows].sort((a, b) => (key(a) > key(b) ? 1 : key(a) < key(b) ? -1 : 0) * (ascending ? 1 : -1)).forEach(row => body.appendChild(row));
+}}));
+</script>
+</body></html>
+"""
+
+
+    def __settings(self):
+        return {"version": REPORT_VERSION, "metrics": self.metrics, "baseline": self.baseline,
+                "confidence": self.confidence, "resamples": self.resamples}
+
+
+    def __summary_table(self, summary):
+        rows = "".join(f"<tr><td>{html.escape(row['File Type'])}</td><td>{row['Benchmarks']}</td>{self.__interval_cells(row)}</tr>"
+                       for row in summary)
+        return f"""<table><thead><tr><th>Geometric mean</th><th>Benchmarks</th><th>Overhead (%)</th><th>CI (%)</th></tr></thead>
+<tbody>{rows}</tbody></table>"""
+
+
+    def __benchmark_table(self, rows):
+        body = []
+        for file_name, row, paired, iterations in rows:
+            paired_cells = self.__interval_cells(paired) if paired else "<td></td><td></td>"
+            body.append(f"<tr><td>{html.escape(file_name)}</td><td>{html.escape(row['File Type'])}</td><td>{iterations}</td>"
+                        f"{self.__interval_cells(row)}{paired_cells}</tr>")
+        return f"""<table><thead><tr><th>Benchmark</th><th>File Type</th><th>Iterations</th><th>Overhead (%)</th><th>CI (%)</th>
+<th>Paired Overhead (%)</th><th>Paired CI (%)</th></tr></thead>
+<tbody>{"".join(body)}</tbody></table>"""
+
+
+    def __interval_cells(self, row):
+        overhead, low, high = row.get("Overhead (%)"), row.get("CI Low (%)"), row.get("CI High (%)")
+        if overhead is None:
+            return "<td></td><td></td>"
+        significant = ' class="significant"' if low is not None and high is not None and (low > 0 or high < 0) else ""
+        return (f'<td data-value="{overhead}"{significant}>{overhead:.2f}</td>'
+                f'<td data-value="{low}">[{low:.2f}, {high:.2f}]</td>')
+
+
+    def __interval_chart(self, metric, rows, summary):
+        """
+        Forest plot: one line per benchmark and file type with the overhead as a dot and its interval as a bar,
+        the geometric means at the bottom.
+        """
+        entries = [(f"{file_name} ({row['File Type']})", row) for file_name, row, _, _ in rows]
+        entries += [(f"Geometric mean ({row['File Type']})", row) for row in summary]
+        entries = [(label, row) for label, row in entries if row.get("CI Low (%)") is not None]
+        if not entries:
+            return ""
+        low = min(0.0, min(row["CI Low (%)"] for _, row in entries))
+        high = max(0.0, max(row["CI High (%)"] for _, row in entries))
+        span = (high - low) or 1.0
+        left, width, line = 260, 520, 16
+
+        def x(value):
+            return left + (value - low) / span * width
+
+        items = [f'<line x1="{x(0):.1f}" y1="0" x2="{x(0):.1f}" y2="{len(entries) * line}" stroke="#999" stroke-dasharray="3"/>']
+        for i, (label, row) in enumerate(entries):
+            y = i * line + line / 2
+            color = FILE_TYPE_COLORS.get(row["File Type"], "#555")
+            tooltip = html.escape(f"{label}: {row['Overhead (%)']:.2f}% [{row['CI Low (%)']:.2f}, {row['CI High (%)']:.2f}]")
+            items.append(f'<g><title>{tooltip}</title>'
+                         f'<text x="{left - 6}" y="{y + 4:.1f}" text-anchor="end">{html.escape(label)}</text>'
+                         f'<line x1="{x(row["CI Low (%)"]):.1f}" y1="{y:.1f}" x2="{x(row["CI High (%)"]):.1f}" y2="{y:.1f}" stroke="{color}" stroke-width="3"/>'
+                         f'<circle cx="{x(row["Overhead (%)"]):.1f}" cy="{y:.1f}" r="4" fill="{color}" stroke="#222"/></g>')
+        axis_y = len(entries) * line + 14
+        items.append(f'<text x="{left}" y="{axis_y}">{low:.1f}%</text>'
+                     f'<text x="{left + width}" y="{axis_y}" text-anchor="end">{high:.1f}%</text>'
+                     f'<text x="{left + width / 2}" y="{axis_y}" text-anchor="middle">{html.escape(metric)} overhead (%)</text>')
+        return f'<svg width="{left + width + 20}" height="{axis_y + 6}">{"".join(items)}</svg>'
@@ -0,0 +1,400 @@
+import datetime
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from perf_events import EVENTS
+
+
+METRIC_TYPES = {
+    "Cycles": pa.int64(),
+    "Instructions": pa.int64(),
+    "Cache Misses": pa.int64(),
+    "Cache References": pa.int64(),
+    "Elapsed Time": pa.float64(),
+    "User Time": pa.float64(),
+    "System Time": pa.float64(),
+    "CPU Percentage": pa.float64(),
+    "Maximum resident set size (kbytes)": pa.int64(),
+    "Involuntary Context Switches": pa.int64(),
+    "CPU Migrations": pa.int64(),
+    "Noise Score": pa.float64(),
+    # Share of the run the perf_event backend's counters were scheduled on the PMU; below 1 they were multiplexed
+    "Multiplexing Ratio": pa.float64(),
+}
+# Every other event the backends can count (PerformanceTester events=...) gets its own column, null when not counted.
+# perf stat -x reports task-clock and cpu-clock in fractional milliseconds.
+METRIC_TYPES.update({metric: pa.float64() if metric.endswith("Clock") else pa.int64()
+                     for _, _, metric in EVENTS.values() if metric not in METRIC_TYPES})
+
+SCHEMA = pa.schema([
+    ("Run ID", pa.string()),
+    ("Timestamp", pa.timestamp("us", tz="UTC")),
+    ("Host", pa.string()),
+    ("Git Commit", pa.string()),
+    ("Binary Hash", pa.string()),
+    ("Config", pa.string()),
+    ("Backend", pa.string()),
+    ("File Name", pa.string()),
+    ("File Type", pa.string()),
+    ("Iteration", pa.int32()),
+] + list(METRIC_TYPES.items()))
+
+# Time series of sampled runs (PerformanceTester(sample_interval=...)): one row per iteration in series/, every series
+# an Arrow list column. Counter series hold the count within each interval, RSS series the sampled values.
+SERIES_TYPES = {
+    "Counter Time": pa.list_(pa.float32()),
+    "Cycles": pa.list_(pa.float64()),
+    "Instructions": pa.list_(pa.float64()),
+    "Cache Misses": pa.list_(pa.float64()),
+    "Cache References": pa.list_(pa.float64()),
+    "CPU Migrations": pa.list_(pa.float64()),
+    "RSS Time": pa.list_(pa.float32()),
+    "RSS (kbytes)": pa.list_(pa.int64()),
+}
+
+SERIES_SCHEMA = pa.schema([
+    ("Run ID", pa.string()),
+    ("Host", pa.string()),
+    ("Config", pa.string()),
+    ("File Name", pa.string()),
+    ("File Type", pa.string()),
+    ("Iteration", pa.int32()),
+    ("Interval (ms)", pa.float32()),
+] + list(SERIES_TYPES.items()))
+
+SERIES_DIR = "series"
+
+# Run-level information (save_metadata) is kept apart from the Parquet files, so the directory stays a plain dataset
+METADATA_DIR = "metadata"
+
+CSV_IMPORT_RUN_ID = "csv-import"
+
+# The per-iteration CSVs were measured through /bin/sh and /usr/bin/time, with perf's own elapsed time
+CSV_IMPORT_BACKEND = "shell"
+
+# Measurement backend of rows written before the Backend column existed
+UNKNOWN_BACKEND = "unknown"
+
+# Rows of the default build have a null Config, like rows written before build configurations existed
+DEFAULT_CONFIG = "default"
+
+
+class ResultStore:
+    def __init__(self, path, batch_size=1000, compact_threshold=64, run_id=None):
+        """
+        Opens (or creates) a Parquet result store holding one row per benchmark iteration.
+
+        :param path: Directory holding the Parquet files.
+        :param batch_size: Number of buffered rows that triggers a write.
+        :param compact_threshold: Number of Parquet files after which flush() compacts the store.
+        :param run_id: Run to write to, e.g. when resuming a campaign. Defaults to a new run.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.compact_threshold = compact_threshold
+        self.run_id = run_id or uuid.uuid4().hex
+        self.host = socket.gethostname()
+        self.git_commit = self.__git_commit()
+        self.buffer = []
+        self.series_buffer = []
+        self.binary_hashes = {}
+        self.written_files = 0
+        self.written_series_files = 0
+        os.makedirs(self.path, exist_ok=True)
+
+
+    def append(self, file_name, file_type, iteration, metrics, binary_path=None, config=None, host=None, backend=None):
+        """
+        Buffers the metrics of one iteration; the buffer is written out once it reaches batch_size rows.
+
+        :param file_name: Name of the tested file.
+        :param file_type: Type of the tested file.
+        :param iteration: The iteration number.
+        :param metrics: A dictionary containing the performance metrics of the iteration.
+        :param binary_path: Path of the tested binary, hashed to identify the exact build.
+        :param config: Build configuration of the binary; None for the default build.
+        :param host: Host the iteration ran on, for results merged from remote workers. Defaults to this host.
+        :param backend: Measurement backend of the PerformanceTester; backends measure Elapsed Time differently.
+        """
+        row = {
+            "Run ID": self.run_id,
+            "Timestamp": datetime.datetime.now(datetime.timezone.utc),
+            "Host": host or self.host,
+            "Git Commit": self.git_commit,
+            "Binary Hash": self.binary_hash(binary_path) if binary_path else None,
+            "Config": config if config != DEFAULT_CONFIG else None,
+            "Backend": backend,
+            "File Name": file_name,
+            "File Type": file_type,
+            "Iteration": iteration,
+        }
+        for metric in METRIC_TYPES:
+            row[metric] = metrics.get(metric)
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+
+    def append_series(self, file_name, file_type, iteration, series, interval, config=None, host=None):
+        """
+        Buffers the time series of one sampled iteration; they are written with the rows by flush().
+
+        :param series: Dictionary of series name (see SERIES_TYPES) -> array.
+        :param interval: Sampling interval in milliseconds.
+        """
+        row = {
+            "Run ID": self.run_id,
+            "Host": host or self.host,
+            "Config": config if config != DEFAULT_CONFIG else None,
+            "File Name": file_name,
+            "File Type": file_type,
+            "Iteration": iteration,
+            "Interval (ms)": interval,
+        }
+        for name in SERIES_TYPES:
+            row[name] = series.get(name)
+        self.series_buffer.append(row)
+
+
+    def load_series(self, file_names=None, file_types=None, run_ids=None, configs=None):
+        """
+        Loads the time series of sampled iterations as a DataFrame with one row per iteration and one array per
+        series cell. Takes the same row filters as load().
+        """
+        files = self.__series_files()
+        if not files:
+            return pd.DataFrame(columns=SERIES_SCHEMA.names)
+        dataset = ds.dataset([os.path.join(self.path, SERIES_DIR, name) for name in files], format="parquet", schema=SERIES_SCHEMA)
+        frame = dataset.to_table(filter=self.__filter(file_names, file_types, run_ids, configs)).to_pandas()
+        frame["Config"] = frame["Config"].fillna(DEFAULT_CONFIG)
+        return frame
+
+
+    def flush(self):
+        """
+        Writes buffered rows to a new Parquet file, sorted so row-group statistics allow predicate pushdown.
+        Buffered time series go to their own file in series/.
+        """
+        if self.series_buffer:
+            table = pa.table({name: pa.array([row[name] for row in self.series_buffer], type=field_type)
+                              for name, field_type in zip(SERIES_SCHEMA.names, SERIES_SCHEMA.types)}, schema=SERIES_SCHEMA)
+            os.makedirs(os.path.join(self.path, SERIES_DIR), exist_ok=True)
+            self.__write_table(table, os.path.join(SERIES_DIR, f"{self.run_id}-{self.written_series_files:05d}.parquet"))
+            self.written_series_files += 1
+            self.series_buffer = []
+        if not self.buffer:
+            return
+        frame = pd.DataFrame(self.buffer).sort_values(["File Name", "File Type", "Iteration"])
+        self.__write_table(self.__to_table(frame), f"{self.run_id}-{self.written_files:05d}.parquet")
+        self.written_files += 1
+        self.buffer = []
+        if len(self.__parquet_files()) > self.compact_threshold:
+            self.compact()
+
+
+    def load(self, columns=None, file_names=None, file_types=None, run_ids=None, configs=None, backends=None):
+        """
+        Loads iterations as a DataFrame, reading only the requested columns and row groups.
+
+        :param columns: Columns to read. Defaults to every column.
+        :param file_names: Only return these file names.
+        :param file_types: Only return these file types.
+        :param run_ids: Only return these runs.
+        :param configs: Only return these build configurations ('default' for the default build).
+        :param backends: Only return rows measured with these backends ('unknown' for rows without one).
+        """
+        dataset = self.__dataset()
+        expression = self.__filter(file_names, file_types, run_ids, configs, backends)
+        return self.__fill_defaults(dataset.to_table(columns=columns, filter=expression).to_pandas())
+
+
+    def iter_batches(self, columns=None, batch_size=100000, file_names=None, file_types=None, run_ids=None, configs=None,
+                     backends=None):
+        """
+        Yields the iterations as DataFrames of at most batch_size rows, so callers can aggregate histories that do
+        not fit in memory. Takes the same column and row filters as load().
+        """
+        dataset = self.__dataset()
+        expression = self.__filter(file_names, file_types, run_ids, configs, backends)
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+            if batch.num_rows:
+                yield self.__fill_defaults(batch.to_pandas())
+
+
+    def latest_backend(self, configs=None):
+        """
+        Returns the measurement backend of the most recent row (of the given build configurations), or None if there
+        is none. Analyses default to it, since Elapsed Time is not comparable between backends.
+        """
+        if self.is_empty():
+            return None
+        frame = self.load(columns=["Timestamp", "Backend"], configs=configs)
+        if frame.empty:
+            return None
+        return frame.loc[frame["Timestamp"].idxmax(), "Backend"]
+
+
+    def is_empty(self):
+        return not self.__parquet_files()
+
+
+    def compact(self):
+        """
+        Rewrites all Parquet files into a single sorted file, so that load time stays flat as runs accumulate.
+        Files of the run being written stay separate so that it can still be discarded and resumed.
+        """
+        files = [name for name in self.__parquet_files() if not name.startswith(self.run_id)]
+        if len(files) <= 1:
+            return
+        table = ds.dataset([os.path.join(self.path, name) for name in files], format="parquet", schema=SCHEMA).to_table()
+        table = table.sort_by([("File Name", "ascending"), ("File Type", "ascending"), ("Timestamp", "ascending")])
+        self.__write_table(table, f"compacted-{uuid.uuid4().hex}.parquet")
+        for name in files:
+            os.remove(os.path.join(self.path, name))
+
+
+    def discard_run(self, run_id):
+        """
+        Deletes the files written by run_id (not yet compacted) and its buffered rows.
+        """
+        self.buffer = [row for row in self.buffer if row["Run ID"] != run_id]
+        self.series_buffer = [row for row in self.series_buffer if row["Run ID"] != run_id]
+        for name in self.__parquet_files():
+            if name.startswith(run_id):
+                os.remove(os.path.join(self.path, name))
+        for name in self.__series_files():
+            if name.startswith(run_id):
+                os.remove(os.path.join(self.path, SERIES_DIR, name))
+        if run_id == self.run_id:
+            self.written_files = 0
+            self.written_series_files = 0
+
+
+    def save_metadata(self, kind, data):
+        """
+        Records run-level information of the current run, e.g. its environment or schedule, in
+        metadata/<run_id>.<kind>.json.
+        """
+        os.makedirs(os.path.join(self.path, METADATA_DIR), exist_ok=True)
+        path = os.path.join(self.path, METADATA_DIR, f"{self.run_id}.{kind}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(path + ".tmp", path)
+
+
+    def load_metadata(self, kind, run_id):
+        """
+        Returns the information of the given kind recorded for run_id, or None.
+        """
+        for path in (os.path.join(self.path, METADATA_DIR, f"{run_id}.{kind}.json"),
+                     os.path.join(self.path, f"{run_id}.{kind}.json")):  # Stores written before metadata/ existed
+            if os.path.exists(path):
+                with open(path) as f:
+                    return json.load(f)
+        return None
+
+
+    def import_csv_history(self, csv_dir):
+        """
+        One-shot import of the per-iteration CSVs written to data/csv (<file_name>-<file_type>.csv).
+        Does nothing if the history has already been imported.
+
+        :param csv_dir: Directory containing the per-iteration CSV files.
+        """
+        if not self.is_empty() and len(self.load(columns=["Run ID"], run_ids=[CSV_IMPORT_RUN_ID])) > 0:
+            print("CSV history already imported.")
+            return
+        frames = []
+        for file in sorted(os.listdir(csv_dir)):
+            if file.endswith(".csv"):
+                file_path = os.path.join(csv_dir, file)
+                file_name, file_type = file[:-4].rsplit('-', 1)
+                frame = pd.read_csv(file_path)
+                frame["File Name"] = file_name
+                frame["File Type"] = file_type
+                frame["Timestamp"] = datetime.datetime.fromtimestamp(os.path.getmtime(file_path), datetime.timezone.utc)
+                frames.append(frame)
+        if not frames:
+            return
+        frame = pd.concat(frames, ignore_index=True)
+        frame["Run ID"] = CSV_IMPORT_RUN_ID
+        frame["Host"] = None
+        frame["Git Commit"] = None
+        frame["Binary Hash"] = None
+        frame["Backend"] = CSV_IMPORT_BACKEND
+        self.__write_table(self.__to_table(frame), f"{CSV_IMPORT_RUN_ID}.parquet")
+        print(f"Imported {len(frame)} iterations from {len(frames)} CSV files.")
+
+
+    def binary_hash(self, binary_path):
+        if binary_path not in self.binary_hashes:
+            digest = hashlib.sha256()
+            with open(binary_path, "rb") as f:
+                digest.update(f.read())
+            self.binary_hashes[binary_path] = digest.hexdigest()
+        return self.binary_hashes[binary_path]
+
+
+    def __dataset(self):
+        # Listed explicitly so nothing but the Parquet files is read as data, e.g. metadata left by older stores
+        return ds.dataset([os.path.join(self.path, name) for name in self.__parquet_files()], format="parquet", schema=SCHEMA)
+
+
+    def __filter(self, file_names, file_types, run_ids, configs=None, backends=None):
+        expression = None
+        for column, values in (("File Name", file_names), ("File Type", file_types), ("Run ID", run_ids), ("Config", configs),
+                               ("Backend", backends)):
+            if values is not None:
+                condition = ds.field(column).isin(list(values))
+                if {"Config": DEFAULT_CONFIG, "Backend": UNKNOWN_BACKEND}.get(column) in values:
+                    condition = condition | ds.field(column).is_null()
+                expression = condition if expression is None else expression & condition
+        return expression
+
+
+    def __fill_defaults(self, frame):
+        if "Config" in frame.columns:
+            frame["Config"] = frame["Config"].fillna(DEFAULT_CONFIG)
+        if "Backend" in frame.columns:
+            frame["Backend"] = frame["Backend"].fillna(UNKNOWN_BACKEND)
+        return frame
+
+
+    def __parquet_files(self):
+        return sorted(name for name in os.listdir(self.path) if name.endswith(".parquet") and not name.startswith("."))
+
+
+    def __series_files(self):
+        series_dir = os.path.join(self.path, SERIES_DIR)
+        if not os.path.isdir(series_dir):
+            return []
+        return sorted(name for name in os.listdir(series_dir) if name.endswith(".parquet") and not name.startswith("."))
+
+
+    def __to_table(self, frame):
+        frame = frame.reindex(columns=SCHEMA.names)
+        for metric, metric_type in METRIC_TYPES.items():
+            frame[metric] = pd.to_numeric(frame[metric])
+            if pa.types.is_integer(metric_type):
+                frame[metric] = frame[metric].round().astype("Int64")
+        return pa.Table.from_pandas(frame, schema=SCHEMA, preserve_index=False)
+
+
+    def __write_table(self, table, file_name):
+        # Files starting with '.' are ignored by readers, so the rename makes the new file visible atomically
+        tmp_path = os.path.join(self.path, os.path.dirname(file_name), "." + os.path.basename(file_name))
+        pq.write_table(table, tmp_path, row_group_size=10000)
+        os.replace(tmp_path, os.path.join(self.path, file_name))
+
+
+    def __git_commit(self):
+        process = subprocess.run(["git", "rev-parse", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return process.stdout.strip() if process.returncode == 0 else None
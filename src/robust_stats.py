@@ -0,0 +1,140 @@
+import numpy as np
+
+
+# Named robust_stats rather than statistics so it does not shadow the standard library module
+
+
+def median(values):
+    return float(np.median(np.asarray(values, dtype=float)))
+
+
+def trimmed_mean(values, proportion=0.1):
+    """
+    Mean after dropping the proportion of smallest and of largest values.
+    """
+    values = np.sort(np.asarray(values, dtype=float))
+    cut = int(len(values) * proportion)
+    return float(values[cut:len(values) - cut].mean())
+
+
+def mad(values):
+    """
+    Median absolute deviation from the median.
+    """
+    values = np.asarray(values, dtype=float)
+    return float(np.median(np.abs(values - np.median(values))))
+
+
+def outlier_mask(values, threshold=3.5):
+    """
+    Flags values whose modified z-score 0.6745 * |x - median| / MAD exceeds threshold (Iglewicz and Hoaglin).
+    Nothing is flagged when the MAD is 0.
+    """
+    values = np.asarray(values, dtype=float)
+    deviation = mad(values)
+    if deviation == 0:
+        return np.zeros(len(values), dtype=bool)
+    return 0.6745 * np.abs(values - np.median(values)) / deviation > threshold
+
+
+def summarize(samples, statistic="median"):
+    """
+    Combines per-iteration metric dictionaries into one dictionary with the given statistic ('median',
+    'trimmed_mean' or 'mean') of every metric.
+    """
+    function = {"median": median, "trimmed_mean": trimmed_mean, "mean": lambda values: float(np.mean(values))}[statistic]
+    metrics = []
+    for sample in samples:
+        metrics += [metric for metric in sample if metric not in metrics]
+    return {metric: function([sample[metric] for sample in samples if metric in sample]) for metric in metrics}
+
+
+def bootstrap_indices(size, resamples=2000, seed=0):
+    """
+    Returns a (resamples, size) array of indices drawn with replacement; indexing a sample with it yields all
+    bootstrap resamples at once.
+    """
+    return np.random.default_rng(seed).integers(0, size, size=(resamples, size))
+
+
+def row_medians(matrix):
+    """
+    Median of every row of a 2-D array; sorting the rows is several times faster than np.median(axis=1) on
+    bootstrap-sized arrays.
+    """
+    matrix = np.sort(matrix, axis=1)
+    middle = matrix.shape[1] // 2
+    return matrix[:, middle] if matrix.shape[1] % 2 else (matrix[:, middle - 1] + matrix[:, middle]) / 2
+
+
+def median_ci(samples, confidence=0.95, resamples=2000, seed=0):
+    """
+    Returns the (low, high) bootstrap confidence interval of the median of samples.
+    """
+    samples = np.asarray(samples, dtype=float)
+    medians = row_medians(samples[bootstrap_indices(len(samples), resamples, seed)])
+    alpha = (1 - confidence) / 2
+    return np.quantile(medians, alpha), np.quantile(medians, 1 - alpha)
+
+
+def ratio_resamples(numerator, denominator, resamples=2000, seed=0):
+    """
+    Bootstrap distribution of median(numerator) / median(denominator), each sample resampled on its own.
+    """
+    numerator, denominator = np.asarray(numerator, dtype=float), np.asarray(denominator, dtype=float)
+    numerator_medians = row_medians(numerator[bootstrap_indices(len(numerator), resamples, seed)])
+    denominator_medians = row_medians(denominator[bootstrap_indices(len(denominator), resamples, seed + 1)])
+    return numerator_medians / denominator_medians
+
+
+def ratio_ci(numerator, denominator, confidence=0.95, resamples=2000, seed=0):
+    """
+    Ratio of medians (e.g. protected / no_extension) with its bootstrap confidence interval. Returns (ratio, low, high).
+    """
+    ratios = ratio_resamples(numerator, denominator, resamples, seed)
+    alpha = (1 - confidence) / 2
+    return median(numerator) / median(denominator), np.quantile(ratios, alpha), np.quantile(ratios, 1 - alpha)
+
+
+def unpaired_overhead_ci(baseline, candidate, confidence=0.95, resamples=2000, seed=0):
+    """
+    Overhead (%) from the ratio of the two independent medians, with a bootstrap confidence interval that resamples
+    each sample on its own. Returns (overhead, low, high).
+    """
+    ratio, low, high = ratio_ci(candidate, baseline, confidence, resamples, seed)
+    return (ratio - 1) * 100, (low - 1) * 100, (high - 1) * 100
+
+
+def paired_overhead_ci(baseline, candidate, confidence=0.95, resamples=2000, seed=0, blocks=None):
+    """
+    Overhead (%) of candidate over baseline from paired samples, mean(candidate - baseline) / mean(baseline) * 100,
+    with a bootstrap confidence interval that resamples the pairs jointly, so drift shared by both runs of a pair cancels.
+    With blocks (e.g. the host of every pair), the overhead is computed per block and averaged weighted by the number
+    of pairs, and pairs are resampled within their block, so differences between blocks do not enter the estimate.
+    Returns (overhead, low, high).
+    """
+    baseline, candidate = np.asarray(baseline, dtype=float), np.asarray(candidate, dtype=float)
+    blocks = np.zeros(len(baseline)) if blocks is None else np.asarray(blocks)
+    overhead = 0.0
+    overheads = np.zeros(resamples)
+    for offset, block in enumerate(np.unique(blocks)):
+        block_baseline, block_candidate = baseline[blocks == block], candidate[blocks == block]
+        weight = len(block_baseline) / len(baseline)
+        indices = bootstrap_indices(len(block_baseline), resamples, seed + offset)
+        overhead += weight * (block_candidate - block_baseline).mean() / block_baseline.mean() * 100
+        overheads += weight * (block_candidate[indices] - block_baseline[indices]).mean(axis=1) / block_baseline[indices].mean(axis=1) * 100
+    alpha = (1 - confidence) / 2
+    return overhead, np.quantile(overheads, alpha), np.quantile(overheads, 1 - alpha)
+
+
+def geometric_mean_overhead(ratios, resampled=None, confidence=0.95):
+    """
+    Suite-wide overhead (%) as the geometric mean of per-benchmark ratios. With resampled, a (benchmarks, resamples)
+    array of bootstrap ratios (see ratio_resamples), returns (overhead, low, high) instead.
+    """
+    overhead = (np.exp(np.log(np.asarray(ratios, dtype=float)).mean()) - 1) * 100
+    if resampled is None:
+        return float(overhead)
+    overheads = (np.exp(np.log(np.asarray(resampled, dtype=float)).mean(axis=0)) - 1) * 100
+    alpha = (1 - confidence) / 2
+    return float(overhead), np.quantile(overheads, alpha), np.quantile(overheads, 1 - alpha)
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+import numpy as np
+from perf_events import EVENTS
+
+
+# Key of the time series in the metrics returned by PerformanceTester.run_once in sampling mode
+SERIES_KEY = "Series"
+
+
+def parse_interval_csv(output):
+    """
+    Parses `perf stat -I <ms> -x ,` output (time,value,unit,event,...) into arrays: "Counter Time" holds the end of
+    every interval in seconds and each metric the count within the interval. Hybrid CPUs report one line per core
+    type, which are summed; intervals where an event was not counted are 0.
+    """
+    columns = {}
+    for line in output.splitlines():
+        fields = line.split(",")
+        if len(fields) < 4:
+            continue
+        event = fields[3].split(":")[0]
+        if "/" in event:
+            event = event.strip("/").split("/")[-1]
+        if event not in EVENTS:
+            continue
+        try:
+            interval_end = float(fields[0])
+        except ValueError:
+            continue
+        try:
+            value = float(fields[1])
+        except ValueError:
+            value = 0.0  # <not counted> or <not supported>
+        column = columns.setdefault(EVENTS[event][2], {})
+        column[interval_end] = column.get(interval_end, 0.0) + value
+    times = sorted(set().union(*columns.values())) if columns else []
+    series = {"Counter Time": np.array(times, dtype=np.float32)}
+    for metric, column in columns.items():
+        series[metric] = np.array([column.get(interval_end, 0.0) for interval_end in times], dtype=np.float64)
+    return series
+
+
+def read_rss(pid):
+    """
+    Returns the resident set size (VmRSS) of pid in kB, or None if the process is gone.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+def children_supported():
+    """
+    Whether the kernel lists the children of a task in /proc/<pid>/task/<tid>/children (CONFIG_PROC_CHILDREN).
+    """
+    return os.path.exists(f"/proc/self/task/{os.getpid()}/children")
+
+
+def child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+class RssSampler:
+    def __init__(self, pid, interval):
+        """
+        Samples the RSS of the children of pid (QEMU when pid is the perf running it) every interval seconds in a
+        background thread, from start() until stop(). No sample is taken while pid has no children, e.g. before perf
+        has started QEMU, so the series never holds the RSS of perf itself.
+
+        :param pid: Process whose children are sampled.
+        :param interval: Sampling interval in seconds.
+        """
+        if not children_supported():
+            raise RuntimeError("RSS sampling needs /proc/<pid>/task/<tid>/children (kernel built with CONFIG_PROC_CHILDREN)")
+        self.pid = pid
+        self.interval = interval
+        self.times = []
+        self.values = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.__sample, daemon=True)
+
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        """
+        Stops sampling and returns {"RSS Time": seconds since start, "RSS (kbytes)": RSS of the sampled processes}.
+        """
+        self.stopped.set()
+        self.thread.join()
+        return {"RSS Time": np.array(self.times, dtype=np.float32), "RSS (kbytes)": np.array(self.values, dtype=np.int64)}
+
+
+    def __sample(self):
+        while not self.stopped.is_set():
+            values = [value for value in map(read_rss, child_pids(self.pid)) if value is not None]
+            if values:
+                self.times.append(time.perf_counter() - self.start_time)
+                self.values.append(sum(values))
+            self.stopped.wait(self.interval)
@@ -0,0 +1,130 @@
+import os
+import numpy as np
+import pandas as pd
+from compiler import SWEEPS
+from rendering import *
+
+
+def cache_sizes():
+    """
+    Returns the data and unified cache sizes of cpu0 in bytes, e.g. {'L1d': 32768, 'L2': 1048576, 'L3': 33554432}.
+    """
+    base = "/sys/devices/system/cpu/cpu0/cache"
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    sizes = {}
+    if not os.path.isdir(base):
+        return sizes
+    for index in sorted(os.listdir(base)):
+        if not index.startswith("index"):
+            continue
+        fields = {}
+        for field in ("level", "type", "size"):
+            with open(os.path.join(base, index, field)) as f:
+                fields[field] = f.read().strip()
+        if fields["type"] == "Instruction":
+            continue
+        size = fields["size"]
+        sizes[f"L{fields['level']}" + ("d" if fields["type"] == "Data" else "")] = int(size[:-1]) * units[size[-1]] if size[-1] in units else int(size)
+    return sizes
+
+
+def segmented_fit(x, y):
+    """
+    Fits two straight lines joined at a breakpoint, trying every interior point as the breakpoint.
+    Returns (breakpoint, slope before, slope after), or None with fewer than four points.
+    """
+    order = np.argsort(x)
+    x, y = np.asarray(x, dtype=float)[order], np.asarray(y, dtype=float)[order]
+    if len(x) < 4:
+        return None
+    best = None
+    for breakpoint in x[1:-1]:
+        design = np.column_stack([np.ones_like(x), x, np.maximum(x - breakpoint, 0)])
+        coef = np.linalg.lstsq(design, y, rcond=None)[0]
+        sse = np.sum((design @ coef - y) ** 2)
+        if best is None or sse < best[0]:
+            best = (sse, breakpoint, coef[1], coef[1] + coef[2])
+    return best[1:]
+
+
+class ScalingAnalysis:
+    def __init__(self, csv_dir="../data/sweep/"):
+        """
+        Loads the per-iteration CSVs of a workload-size sweep (<name>-n<size>-<file_type>.csv), as written by
+        PerformanceTester with iteration_csv_dir pointing at the sweep directory.
+        """
+        self.script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.work_dir = os.path.join(self.script_dir)
+        self.csv_dir = os.path.join(self.work_dir, csv_dir)
+        self.cache_sizes = cache_sizes()
+
+        all_data = []
+        for file in os.listdir(self.csv_dir):
+            if file.endswith(".csv"):
+                binary_name, file_type = file[:-4].rsplit('-', 1)
+                file_name, size = binary_name.rsplit('-n', 1)
+                temp_df = pd.read_csv(os.path.join(self.csv_dir, file))
+                temp_df['File Name'] = file_name
+                temp_df['Size'] = int(size)
+                temp_df['File Type'] = file_type
+                all_data.append(temp_df)
+        self.data = pd.concat(all_data, ignore_index=True)
+
+
+    def summary(self, metric="Cycles"):
+        """
+        Returns one row per (file name, size) with the working set, the overhead (%) of original and protected over
+        no_extension from medians, and the Cache Misses / Cache References ratio of each file type.
+        """
+        medians = self.data.groupby(['File Name', 'Size', 'File Type'])[[metric, 'Cache Misses', 'Cache References']].median()
+        values = medians[metric].unstack('File Type')
+        miss_ratio = (medians['Cache Misses'] / medians['Cache References']).unstack('File Type')
+
+        summary = pd.DataFrame(index=values.index)
+        summary['Working Set (bytes)'] = [SWEEPS[name][2] * size ** SWEEPS[name][3] if name in SWEEPS else np.nan
+                                          for name, size in values.index]
+        for file_type in ['original', 'protected']:
+            summary[f'Overhead (%) {file_type}'] = (values[file_type] - values['no_extension']) / values['no_extension'] * 100
+        for file_type in miss_ratio.columns:
+            summary[f'Miss Ratio {file_type}'] = miss_ratio[file_type]
+        return summary.reset_index()
+
+
+    def fit(self, metric="Cycles"):
+        """
+        Fits, per benchmark, the protected overhead against log2(working set), and a segmented line to the protected
+        Cache Misses ratio to locate where the working set spills out of a cache level.
+        """
+        fits = []
+        for file_name, group in self.summary(metric).groupby('File Name'):
+            group = group.dropna(subset=['Working Set (bytes)', 'Overhead (%) protected'])
+            if len(group) < 2:
+                continue
+            log_working_set = np.log2(group['Working Set (bytes)'])
+            slope, intercept = np.polyfit(log_working_set, group['Overhead (%) protected'], 1)
+            row = {'File Name': file_name, 'Overhead Slope (% per doubling)': slope, 'Overhead Intercept (%)': intercept,
+                   'Breakpoint Working Set (bytes)': np.nan, 'Spills Out Of': None}
+            miss_ratio = group.get('Miss Ratio protected')
+            segments = segmented_fit(log_working_set, miss_ratio) if miss_ratio is not None and miss_ratio.notna().all() else None
+            if segments is not None:
+                breakpoint_bytes = 2 ** segments[0]
+                row['Breakpoint Working Set (bytes)'] = breakpoint_bytes
+                row['Miss Ratio Slope Before'] = segments[1]
+                row['Miss Ratio Slope After'] = segments[2]
+                # The largest cache level that the working set at the breakpoint no longer fits below
+                spilled = [level for level, size in sorted(self.cache_sizes.items(), key=lambda item: item[1]) if size <= breakpoint_bytes]
+                row['Spills Out Of'] = spilled[-1] if spilled else None
+            fits.append(row)
+        return pd.DataFrame(fits)
+
+
+    def plot(self, metric="Cycles", profile="publication", output_csv="../data/sweep_fits.csv"):
+        """
+        Plots overhead and miss ratio against working set for every benchmark and saves the fitted curves.
+        """
+        summary = self.summary(metric)
+        fits = self.fit(metric)
+        fits.to_csv(os.path.join(self.work_dir, output_csv), index=False)
+        render_figures([(f"Scaling of {metric}", draw_scaling, (metric, summary, fits, self.cache_sizes))], profile,
+                       os.path.join(self.work_dir, "../data/plt"), processes=1)
+        return fits
@@ -0,0 +1,88 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+
+from analysis import PerformanceComparison
+from result_store import ResultStore
+
+# Cycles are stored as integers, so the overheads below are exact
+BASELINE = [100, 120, 90, 110, 150, 80]
+
+
+@pytest.fixture
+def averages(tmp_path):
+    path = tmp_path / "averages.csv"
+    path.write_text("File Name,File Type,Cycles\n")
+    return str(path)
+
+
+def store_with_pairs(path, overhead=10, host=None):
+    store = ResultStore(str(path))
+    for iteration, value in enumerate(BASELINE, 1):
+        store.append("a", "no_extension", iteration, {"Cycles": value}, host=host, backend="direct")
+        store.append("a", "protected", iteration, {"Cycles": round(value * (1 + overhead / 100))}, host=host, backend="direct")
+    store.flush()
+    return store
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_paired_overhead_of_constant_ratio(tmp_path, averages, lazy):
+    store = store_with_pairs(tmp_path / "store")
+    table = PerformanceComparison(averages, store, lazy=lazy).paired_overhead("Cycles")
+    row = table.set_index("File Type").loc["protected"]
+    assert row["Pairs"] == len(BASELINE)
+    assert row["Overhead (%)"] == pytest.approx(10)
+    assert (row["CI Low (%)"], row["CI High (%)"]) == (pytest.approx(10), pytest.approx(10))
+
+
+def test_paired_overhead_pairs_first_duplicate(tmp_path, averages, capsys):
+    store = store_with_pairs(tmp_path / "store")
+    analyser = PerformanceComparison(averages, store)
+    data = analyser.metric_data("Cycles")
+    # A repeated protected iteration with a wildly different value is reported and not paired
+    duplicate = data[(data["File Type"] == "protected") & (data["Iteration"] == 1)].assign(Cycles=1e6)
+    table = analyser.paired_overhead("Cycles", data=pd.concat([data, duplicate], ignore_index=True))
+    assert "[Duplicates] 1 iterations" in capsys.readouterr().out
+    assert table.set_index("File Type").loc["protected", "Overhead (%)"] == pytest.approx(10)
+
+
+def test_paired_overhead_blocks_by_host(tmp_path, averages):
+    # Two hosts, one of them unknown (as in the imported history), with different overheads: pooled by pair count
+    store_with_pairs(tmp_path / "store", overhead=10, host="h1")
+    store = ResultStore(str(tmp_path / "store"))
+    store.host = None
+    for iteration, value in enumerate(BASELINE[:3], 1):
+        store.append("a", "no_extension", iteration, {"Cycles": value}, backend="direct")
+        store.append("a", "protected", iteration, {"Cycles": round(value * 1.4)}, backend="direct")
+    store.flush()
+    row = PerformanceComparison(averages, store).paired_overhead("Cycles").set_index("File Type").loc["protected"]
+    assert row["Pairs"] == len(BASELINE) + 3
+    assert row["Hosts"] == 2
+    assert row["Overhead (%)"] == pytest.approx((6 * 10 + 3 * 40) / 9)
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_cube_without_rows_for_the_config(tmp_path, averages, lazy):
+    store = ResultStore(str(tmp_path / "store"))
+    store.append("a", "protected", 1, {"Cycles": 100}, config="O3", backend="direct")
+    store.flush()
+    analyser = PerformanceComparison(averages, store, lazy=lazy)
+    cube = analyser.aggregate()
+    assert cube.empty
+    assert ("Cycles", "median") in cube.columns and ("Elapsed Time", "q75") in cube.columns
+    assert list(cube.index.names) == ["File Name", "File Type"]
+    assert analyser.metric_table("Cycles").empty
+
+
+def test_streaming_cube_matches_eager_cube(tmp_path, averages):
+    store = store_with_pairs(tmp_path / "store")
+    eager = PerformanceComparison(averages, store).aggregate()
+    lazy = PerformanceComparison(averages, store, lazy=True, chunk_size=4).aggregate()
+    for statistic in ["count", "mean"]:
+        assert lazy[("Cycles", statistic)].to_dict() == pytest.approx(eager[("Cycles", statistic)].to_dict())
+    # Streaming quantiles are nearest-rank values within the bucket error, not interpolated
+    assert lazy[("Cycles", "median")].to_dict() == pytest.approx({("a", "no_extension"): 100, ("a", "protected"): 110}, rel=0.002)
@@ -0,0 +1,126 @@
+import csv
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+
+import campaign
+from campaign import CampaignJournal
+from performance_test import PerformanceTester
+from result_store import ResultStore
+
+FILE_TYPES = ["no_extension", "protected"]
+BENCHMARKS = ["a", "b"]
+ITERATIONS = 5
+
+# Number of run_once calls after which the campaign crashes; counted per worker process
+interrupt_after = None
+calls = 0
+
+
+def fake_run_once(self, file_name, file_type):
+    global calls
+    calls += 1
+    if interrupt_after is not None and calls > interrupt_after:
+        raise RuntimeError("interrupted")
+    return {"Cycles": 1000.0 + calls, "Instructions": 2000.0, "Elapsed Time": 0.5}
+
+
+@pytest.fixture
+def build_dir(tmp_path, monkeypatch):
+    for file_type in FILE_TYPES:
+        os.makedirs(tmp_path / "build" / file_type)
+        for file_name in BENCHMARKS:
+            (tmp_path / "build" / file_type / file_name).touch()
+    monkeypatch.setattr(PerformanceTester, "run_once", fake_run_once)
+    monkeypatch.setattr(PerformanceTester, "warm_up", lambda self, file_name, file_type, iterations: None)
+    return tmp_path / "build"
+
+
+def make_tester(tmp_path, build_dir, journal, result_store=None):
+    return PerformanceTester(str(tmp_path / "averages.csv"), result_store, build_dir=str(build_dir) + "/",
+                             iteration_csv_dir=str(tmp_path / "csv") + "/", journal=journal)
+
+
+def interrupted_campaign(tmp_path, build_dir, result_store=None):
+    global interrupt_after
+    journal = CampaignJournal(str(tmp_path / "campaign.journal"))
+    journal.start(result_store.run_id if result_store is not None else None)
+    first = make_tester(tmp_path, build_dir, journal, result_store)
+    first.reset_and_prepare_csv()
+    interrupt_after = 9
+    try:
+        with pytest.raises(RuntimeError, match="interrupted"):
+            first.test_all_benchmarks_parallel(FILE_TYPES, ITERATIONS, cores=[0], seed=1)
+    finally:
+        interrupt_after = None
+    # A crash in the middle of a journal write leaves a partial last line
+    with open(journal.path, "a") as f:
+        f.write('{"type": "iteration", "file_na')
+    return journal
+
+
+def csv_iterations(tmp_path, file_name, file_type):
+    with open(tmp_path / "csv" / f"{file_name}-{file_type}.csv", newline="") as f:
+        return [int(row["Iteration"]) for row in csv.DictReader(f)]
+
+
+def test_journal_drops_partial_last_line(tmp_path):
+    journal = CampaignJournal(str(tmp_path / "campaign.journal"))
+    journal.start("run")
+    journal.record_iteration("a", "protected", 1, {"Cycles": 1.0})
+    size = os.path.getsize(journal.path)
+    with open(journal.path, "a") as f:
+        f.write('{"type": "iteration", "file_name": "a", "file_type": "protected", "itera')
+    reloaded = CampaignJournal(journal.path)
+    assert os.path.getsize(journal.path) == size
+    assert reloaded.run_id == "run"
+    assert reloaded.iterations("a", "protected") == {1: {"Cycles": 1.0}}
+
+
+def test_journal_fsyncs_every_record(tmp_path, monkeypatch):
+    synced = []
+    fsync = os.fsync
+    monkeypatch.setattr(campaign.os, "fsync", lambda fd: synced.append(fd) or fsync(fd))
+    journal = CampaignJournal(str(tmp_path / "campaign.journal"))
+    journal.start("run")
+    journal.record_seed(1)
+    journal.record_iteration("a", "protected", 1, {"Cycles": 1.0})
+    journal.record_average("a", "protected")
+    assert len(synced) == 4
+
+
+def test_resume_restores_csvs_without_duplicates(tmp_path, build_dir):
+    journal = interrupted_campaign(tmp_path, build_dir)
+    # The row of the last journalled iteration was lost with the crash
+    path = tmp_path / "csv" / "a-no_extension.csv"
+    with open(path) as f:
+        lines = f.readlines()
+    with open(path, "w") as f:
+        f.writelines(lines[:-1])
+
+    resumed = make_tester(tmp_path, build_dir, CampaignJournal(journal.path))
+    assert 0 < sum(len(completed) for completed in resumed.journal.completed.values()) < len(FILE_TYPES) * len(BENCHMARKS) * ITERATIONS
+    resumed.resume()
+    resumed.test_all_benchmarks_parallel(FILE_TYPES, ITERATIONS, cores=[0])
+    for file_name in BENCHMARKS:
+        for file_type in FILE_TYPES:
+            assert csv_iterations(tmp_path, file_name, file_type) == list(range(1, ITERATIONS + 1))
+    assert sorted(set(resumed.success)) == BENCHMARKS
+
+
+def test_resume_rewrites_store_rows_without_duplicates(tmp_path, build_dir):
+    store = ResultStore(str(tmp_path / "store"), batch_size=3)
+    journal = interrupted_campaign(tmp_path, build_dir, store)
+
+    journal = CampaignJournal(journal.path)
+    resumed = make_tester(tmp_path, build_dir, journal, ResultStore(str(tmp_path / "store"), run_id=journal.run_id))
+    resumed.resume()
+    resumed.test_all_benchmarks_parallel(FILE_TYPES, ITERATIONS, cores=[0])
+    rows = ResultStore(str(tmp_path / "store")).load(columns=["Run ID", "File Name", "File Type", "Iteration"])
+    assert set(rows["Run ID"]) == {journal.run_id}
+    assert not rows.duplicated().any()
+    assert rows.groupby(["File Name", "File Type"]).size().to_dict() == {
+        (file_name, file_type): ITERATIONS for file_name in BENCHMARKS for file_type in FILE_TYPES}
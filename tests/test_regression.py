@@ -0,0 +1,101 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+
+from main import main
+from regression import *
+from result_store import ResultStore
+
+NOISE = [0, 7, -3, 12, -9, 4, -1, 9, -6, 2, 5, -4, 11, -8, 3, -2, 6, -7, 10, 1]
+
+
+def add_run(path, overhead, backend="direct"):
+    # One run of benchmark "a": protected is overhead percent slower than no_extension, with the same noise pattern
+    store = ResultStore(str(path))
+    for iteration, noise in enumerate(NOISE):
+        store.append("a", "no_extension", iteration, {"Cycles": 10000 + noise}, backend=backend)
+        store.append("a", "protected", iteration, {"Cycles": round(10000 * (1 + overhead / 100)) + noise}, backend=backend)
+    store.flush()
+    return store.run_id
+
+
+def check(path, tmp_path, *args):
+    output = tmp_path / "verdict.json"
+    code = main(["regression", "--store", str(path), "--baseline-file", str(tmp_path / "baseline.json"),
+                 "--output", str(output)] + list(args))
+    with open(output) as f:
+        return code, json.load(f)
+
+
+def test_mann_whitney_u_separated_samples():
+    u, p_value, effect_size = mann_whitney_u([1, 2, 3], [4, 5, 6])
+    assert u == 0
+    assert p_value == pytest.approx(0.0809, abs=1e-4)
+    assert effect_size == -1
+
+
+def test_mann_whitney_u_identical_samples():
+    assert mann_whitney_u([5, 5, 5], [5, 5, 5]) == (4.5, 1.0, 0.0)
+
+
+def test_change_points_single_shift():
+    assert change_points([0.0] * 10 + [10.0] * 10) == [10]
+    assert change_points([1.0] * 20) == []
+
+
+def test_exit_code_pass(tmp_path):
+    store = tmp_path / "store"
+    add_run(store, 10)
+    add_run(store, 10)
+    candidate = add_run(store, 10)
+    code, verdict = check(store, tmp_path)
+    assert code == EXIT_CODES["pass"] == 0
+    assert verdict["run_id"] == candidate
+    assert verdict["benchmarks"][0]["status"] == "ok"
+
+
+def test_exit_code_regression(tmp_path):
+    store = tmp_path / "store"
+    add_run(store, 10)
+    add_run(store, 10)
+    add_run(store, 30)
+    code, verdict = check(store, tmp_path)
+    assert code == EXIT_CODES["fail"] == 1
+    assert verdict["regressions"] == ["a"]
+    assert verdict["benchmarks"][0]["delta"] == pytest.approx(20, abs=0.1)
+
+
+def test_exit_code_no_baseline(tmp_path):
+    # The only earlier run was measured with another backend, so the candidate has nothing to compare with
+    store = tmp_path / "store"
+    add_run(store, 10, backend="shell")
+    add_run(store, 10)
+    code, verdict = check(store, tmp_path)
+    assert code == EXIT_CODES["no baseline"] == 3
+    assert verdict["benchmarks"][0]["status"] == "no baseline"
+
+
+def test_exit_code_unknown_run(tmp_path):
+    store = tmp_path / "store"
+    code, verdict = check(store, tmp_path)
+    assert code == EXIT_CODES["unknown run"] == 4
+    add_run(store, 10)
+    code, verdict = check(store, tmp_path, "--run-id", "missing")
+    assert code == 4
+    assert verdict["run_id"] == "missing"
+
+
+def test_pinned_baseline(tmp_path):
+    store = tmp_path / "store"
+    pinned = add_run(store, 30)
+    add_run(store, 10)
+    add_run(store, 30)
+    assert main(["regression", "--store", str(store), "--baseline-file", str(tmp_path / "baseline.json"),
+                 "--pin-baseline", pinned]) == 0
+    code, verdict = check(store, tmp_path)
+    assert code == EXIT_CODES["pass"]
+    assert verdict["benchmarks"][0]["baseline_runs"] == [pinned]
@@ -0,0 +1,63 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+
+from result_store import *
+
+
+def write_csv(path, rows):
+    with open(path, "w") as f:
+        f.write("Iteration,Cycles,Elapsed Time\n")
+        for iteration, cycles, elapsed in rows:
+            f.write(f"{iteration},{cycles},{elapsed}\n")
+
+
+def test_import_csv_history(tmp_path):
+    csv_dir = tmp_path / "csv"
+    csv_dir.mkdir()
+    # File names may contain dashes; the file type is the part after the last one
+    write_csv(csv_dir / "coulomb-double-protected.csv", [(1, 100, 0.5), (2, 110, 0.6)])
+    write_csv(csv_dir / "coulomb-double-no_extension.csv", [(1, 90, 0.4)])
+    store = ResultStore(str(tmp_path / "store"))
+    store.import_csv_history(str(csv_dir))
+    store.import_csv_history(str(csv_dir))  # Already imported: nothing is added
+
+    frame = store.load().sort_values(["File Type", "Iteration"])
+    assert len(frame) == 3
+    assert set(frame["Run ID"]) == {CSV_IMPORT_RUN_ID}
+    assert set(frame["File Name"]) == {"coulomb-double"}
+    assert frame["File Type"].tolist() == ["no_extension", "protected", "protected"]
+    assert frame["Cycles"].tolist() == [90, 100, 110]
+    assert set(frame["Backend"]) == {CSV_IMPORT_BACKEND}
+    assert set(frame["Config"]) == {DEFAULT_CONFIG}
+
+
+def test_load_filters_and_defaults(tmp_path):
+    store = ResultStore(str(tmp_path / "store"))
+    for iteration in range(1, 4):
+        store.append("a", "original", iteration, {"Cycles": iteration}, backend="direct")
+        store.append("a", "protected", iteration, {"Cycles": 10 * iteration}, config="O3")
+        store.append("b", "original", iteration, {"Cycles": 100 * iteration}, backend="shell")
+    store.flush()
+
+    assert store.load(columns=["Cycles"], file_names=["a"], file_types=["original"])["Cycles"].tolist() == [1, 2, 3]
+    assert store.load(columns=["File Name"], configs=["O3"])["File Name"].tolist() == ["a"] * 3
+    # Rows without a config or backend are matched and returned as 'default' and 'unknown'
+    assert len(store.load(configs=[DEFAULT_CONFIG])) == 6
+    assert store.load(columns=["File Type"], backends=[UNKNOWN_BACKEND])["File Type"].tolist() == ["protected"] * 3
+    assert set(store.load(columns=["Backend"], configs=["O3"])["Backend"]) == {UNKNOWN_BACKEND}
+    assert store.latest_backend(configs=[DEFAULT_CONFIG]) in {"direct", "shell"}
+    assert sum(len(batch) for batch in store.iter_batches(columns=["Cycles"], batch_size=2)) == 9
+
+
+def test_discard_run_keeps_other_runs(tmp_path):
+    path = str(tmp_path / "store")
+    kept = ResultStore(path)
+    kept.append("a", "original", 1, {"Cycles": 1})
+    kept.flush()
+    discarded = ResultStore(path)
+    discarded.append("a", "original", 1, {"Cycles": 2})
+    discarded.flush()
+    discarded.discard_run(discarded.run_id)
+    assert ResultStore(path).load(columns=["Run ID"])["Run ID"].tolist() == [kept.run_id]
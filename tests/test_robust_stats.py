@@ -0,0 +1,59 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+
+from robust_stats import *
+
+
+def test_median_and_mad():
+    assert median([3, 1, 2]) == 2
+    assert median([4, 1, 3, 2]) == 2.5
+    assert mad([1, 2, 3, 4, 100]) == 1
+
+
+def test_row_medians_odd():
+    matrix = np.array([[3, 1, 2], [9, 7, 8]], dtype=float)
+    assert row_medians(matrix).tolist() == [2, 8]
+
+
+def test_row_medians_even():
+    matrix = np.array([[4, 1, 3, 2], [10, 20, 30, 40]], dtype=float)
+    assert row_medians(matrix).tolist() == [2.5, 25]
+
+
+def test_row_medians_matches_numpy():
+    matrix = np.random.default_rng(0).normal(size=(50, 8))
+    assert np.allclose(row_medians(matrix), np.median(matrix, axis=1))
+
+
+def test_ratio_ci_constant_samples():
+    ratio, low, high = ratio_ci([150] * 10, [100] * 10, resamples=200)
+    assert ratio == pytest.approx(1.5)
+    assert low == pytest.approx(1.5)
+    assert high == pytest.approx(1.5)
+
+
+def test_unpaired_overhead_ci_constant_samples():
+    overhead, low, high = unpaired_overhead_ci([100] * 5, [110] * 5, resamples=200)
+    assert overhead == pytest.approx(10)
+    assert (low, high) == (pytest.approx(10), pytest.approx(10))
+
+
+def test_paired_overhead_ci_constant_difference():
+    overhead, low, high = paired_overhead_ci([100, 100, 100], [120, 120, 120], resamples=200)
+    assert overhead == pytest.approx(20)
+    assert (low, high) == (pytest.approx(20), pytest.approx(20))
+
+
+def test_outlier_mask():
+    assert outlier_mask([10, 11, 10, 12, 11, 100]).tolist() == [False] * 5 + [True]
+    assert not outlier_mask([5, 5, 5, 50]).any()
+
+
+def test_geometric_mean_overhead():
+    assert geometric_mean_overhead([2, 0.5]) == pytest.approx(0)
+    assert geometric_mean_overhead([1.1, 1.1]) == pytest.approx(10)
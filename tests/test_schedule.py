@@ -0,0 +1,55 @@
+import csv
+import itertools
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "../src"))
+
+from performance_test import PerformanceTester
+
+FILE_TYPES = ["no_extension", "original", "protected"]
+
+
+def test_blocks_hold_every_file_type_once():
+    jobs = PerformanceTester().schedule_jobs(["a", "b"], FILE_TYPES, 4, seed=3)
+    blocks = [list(block) for _, block in itertools.groupby(jobs, key=lambda job: (job[0], job[2]))]
+    assert len(blocks) == 2 * 4
+    for block in blocks:
+        assert sorted(file_type for _, file_type, _ in block) == FILE_TYPES
+    assert jobs == PerformanceTester().schedule_jobs(["a", "b"], FILE_TYPES, 4, seed=3)
+    assert jobs != PerformanceTester().schedule_jobs(["a", "b"], FILE_TYPES, 4, seed=4)
+
+
+def test_unseeded_blocks_rotate():
+    jobs = PerformanceTester().schedule_jobs(["a"], FILE_TYPES, 3)
+    firsts = [file_type for _, file_type, iteration in jobs[::3]]
+    assert firsts == ["original", "protected", "no_extension"]
+
+
+def pid_run_once(self, file_name, file_type):
+    # The worker process shows up in the results
+    return {"Cycles": float(os.getpid())}
+
+
+def test_each_block_runs_on_one_worker(tmp_path, monkeypatch):
+    for file_type in FILE_TYPES:
+        os.makedirs(tmp_path / "build" / file_type)
+        for file_name in ["a", "b", "c"]:
+            (tmp_path / "build" / file_type / file_name).touch()
+    monkeypatch.setattr(PerformanceTester, "run_once", pid_run_once)
+    monkeypatch.setattr(PerformanceTester, "warm_up", lambda self, file_name, file_type, iterations: None)
+    tester = PerformanceTester(str(tmp_path / "averages.csv"), build_dir=str(tmp_path / "build") + "/",
+                               iteration_csv_dir=str(tmp_path / "csv") + "/")
+    tester.reset_and_prepare_csv()
+    tester.test_all_benchmarks_parallel(FILE_TYPES, 6, cores=[0, 0, 0], seed=1)
+
+    workers = {}
+    for file_name in ["a", "b", "c"]:
+        for file_type in FILE_TYPES:
+            with open(tmp_path / "csv" / f"{file_name}-{file_type}.csv", newline="") as f:
+                for row in csv.DictReader(f):
+                    workers.setdefault((file_name, row["Iteration"]), set()).add(row["Cycles"])
+    assert len(workers) == 3 * 6
+    assert all(len(pids) == 1 for pids in workers.values())